@@ -1,10 +1,18 @@
 from flask import Flask, request, jsonify, render_template
 from flask_cors import CORS
 import os
+import uuid
+from app.utils.batch_search import BatchSearch
 from app.utils.database_operation import DatabaseOperation
 from app.utils.elastic_handler import ElasticHandler
+from app.utils.metrics import metrics
 from app.utils.openai_embedding import OpenAIEmbedding
+from app.utils.openai_resilience import OpenAIUnavailableError, retry_after_header
 from app.utils.prompt import Prompt
+from app.utils.query_categorizer import QueryCategorizer
+from app.utils.query_processor import QueryProcessor
+from app.utils.query_rewriter import QueryRewriter
+from app.utils.result_cache import SearchResultCache
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -20,6 +28,15 @@ db_operation = DatabaseOperation()
 elastic_handler = ElasticHandler()
 openai_embedding = OpenAIEmbedding()
 prompt_generator = Prompt()
+query_categorizer = QueryCategorizer(openai_embedding, prompt_generator)
+query_processor = QueryProcessor(query_categorizer, QueryRewriter())
+search_result_cache = SearchResultCache()
+
+# Cached rankings are dropped whenever tenders are indexed or deleted
+elastic_handler.add_index_listener(search_result_cache.invalidate)
+
+# Read the vector profile of the index now: missing PCA components stop the app here
+elastic_handler.load_vector_profile(strict=True)
 
 # Authentication middleware
 def authenticate(request):
@@ -30,6 +47,44 @@ def authenticate(request):
         return False
     return True
 
+# Time every request and its stages; optionally report them in a Server-Timing header
+@app.before_request
+def start_request_metrics():
+    metrics.start_request(request.endpoint)
+
+@app.after_request
+def finish_request_metrics(response):
+    timings = metrics.finish_request(response.status_code)
+    if timings and metrics.server_timing:
+        response.headers['Server-Timing'] = metrics.server_timing_header(timings)
+    return response
+
+@metrics.timed("feedback_fetch")
+def get_feedback(scope, scope_id):
+    """Fetch feedback for a query or client with optional per-item weights"""
+    feedback_combiner = openai_embedding.feedback_combiner
+    
+    # Without recency weighting the precomputed centroids are enough
+    if not feedback_combiner.recency_half_life_days:
+        if scope == 'query':
+            positive_feedback, negative_feedback = db_operation.get_feedback_centroids_by_query_id(scope_id)
+        else:
+            positive_feedback, negative_feedback = db_operation.get_feedback_centroids_by_client_id(scope_id)
+        return positive_feedback, negative_feedback, None, None
+    
+    # Recency weighting needs the individual feedback rows and their timestamps
+    if scope == 'query':
+        feedback = db_operation.get_feedback_by_query_id(scope_id, with_timestamps=True)
+    else:
+        feedback = db_operation.get_feedback_by_client_id(scope_id, with_timestamps=True)
+    positive_feedback, negative_feedback, positive_times, negative_times = feedback
+    return (
+        positive_feedback,
+        negative_feedback,
+        feedback_combiner.recency_weights(positive_times),
+        feedback_combiner.recency_weights(negative_times)
+    )
+
 @app.route('/')
 def index():
     """Serve the main application page"""
@@ -50,28 +105,112 @@ def tenders_search():
         date_to = data.get('date_to')
         page = data.get('page', 1)
         page_size = data.get('page_size', 10)
+        search_mode = data.get('search_mode')
+        lexical_weight = data.get('lexical_weight')
+        pagination_mode = data.get('pagination_mode')
+        cursor = data.get('cursor')
+        
+        # Cursor pagination: a point-in-time search continued with search_after
+        if cursor or pagination_mode == 'cursor':
+            query_embedding = openai_embedding.generate_embedding(query_processor.process(query))
+            search_results = elastic_handler.search_tenders_after(
+                query_embedding, 
+                result_columns, 
+                country_code, 
+                date_from, 
+                date_to, 
+                page_size, 
+                cursor
+            )
+            return jsonify(search_results)
         
-        # Generate categorization prompt
-        categorization_prompt = prompt_generator.generate_categorization_prompt(query)
+        # Serve pages of a recent identical search from its cached ranking, once index changes
+        # made by other processes have been picked up
+        elastic_handler.ensure_vector_profile()
+        cache_key = search_result_cache.make_key(query, result_columns, country_code, date_from, date_to, search_mode, lexical_weight)
+        cached_page = search_result_cache.get_page(cache_key, page, page_size)
+        if cached_page is not None:
+            return jsonify(elastic_handler.paginate(*cached_page, page, page_size))
+        generation = search_result_cache.generation
         
-        # Get categorized response from OpenAI
-        categorized_response = openai_embedding.get_categorized_response(categorization_prompt)
+        # Categorize or rewrite the query depending on QUERY_PROCESSING_MODE
+        processed_query = query_processor.process(query)
         
         # Generate embedding for the query
-        query_embedding = openai_embedding.generate_embedding(categorized_response)
+        query_embedding = openai_embedding.generate_embedding(processed_query)
         
-        # Search in Elasticsearch
-        search_results = elastic_handler.search_tenders(
+        # Search in Elasticsearch, ranking enough results to serve the following pages
+        ranked_results = elastic_handler.search_ranked_tenders(
             query_embedding, 
             result_columns, 
             country_code, 
             date_from, 
             date_to, 
-            page, 
-            page_size
+            search_result_cache.depth(page, page_size),
+            search_mode,
+            query,
+            lexical_weight
         )
+        if ranked_results is None:
+            # Elasticsearch failed: answer from the local index (if any) without caching
+            return jsonify(elastic_handler.search_local_page(
+                query_embedding, result_columns, country_code, date_from, date_to, page, page_size, search_mode
+            ))
         
-        return jsonify(search_results)
+        results, total_results = ranked_results
+        search_result_cache.put(cache_key, results, total_results, generation)
+        
+        start = (page - 1) * page_size
+        return jsonify(elastic_handler.paginate(results[start:start + page_size], total_results, page, page_size))
+    
+    except OpenAIUnavailableError as e:
+        return jsonify({"error": str(e)}), 503, retry_after_header(e)
+    
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/tenders_search_batch', methods=['POST'])
+def tenders_search_batch():
+    # Authenticate request
+    if not authenticate(request):
+        return jsonify({"error": "Unauthorized access"}), 401
+    
+    try:
+        data = request.json
+        elastic_handler.ensure_vector_profile()
+        batch = BatchSearch(data.get('searches'), search_result_cache)
+        
+        # Process the distinct queries (LLM calls run concurrently) and embed them in one batched call
+        processed_queries = query_processor.process_many(batch.queries())
+        query_embeddings = openai_embedding.generate_embeddings(processed_queries)
+        
+        # Rank every distinct search in a single multi-search round-trip
+        searches = batch.ranked_searches(query_embeddings)
+        failed = batch.resolve(searches, elastic_handler.search_ranked_tenders_batch(searches))
+        
+        # Failed searches are answered from the local index (if any) without caching
+        for position, search, page, page_size in failed:
+            batch.results[position] = elastic_handler.search_local_page(
+                search["query_embedding"], 
+                search["result_columns"], 
+                search["country_code"], 
+                search["date_from"], 
+                search["date_to"], 
+                page, 
+                page_size, 
+                search["search_mode"]
+            )
+        
+        return jsonify({"results": batch.results})
+    
+    except OpenAIUnavailableError as e:
+        return jsonify({"error": str(e)}), 503, retry_after_header(e)
+    
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -87,6 +226,7 @@ def customer_feedback():
         query_id = data.get('query_id')
         search_query = data.get('search_query')
         feedback_list = data.get('feedback_list', [])
+        client_id = data.get('client_id')
         
         # Validate required fields
         if not query_id or not search_query or not feedback_list:
@@ -98,7 +238,7 @@ def customer_feedback():
                 return jsonify({"error": "Invalid feedback format"}), 400
         
         # Store feedback in database
-        db_operation.store_feedback(query_id, search_query, feedback_list)
+        db_operation.store_feedback(query_id, search_query, feedback_list, client_id)
         
         return jsonify({"success": True, "message": "Feedback submitted successfully"})
     
@@ -117,21 +257,18 @@ def tenders_search_with_feedback():
         query = data.get('query', '')
         result_columns = data.get('result_columns', [])
         
-        # Fetch feedback from database
-        positive_feedback, negative_feedback = db_operation.get_feedback_by_query_id(query_id)
+        # Fetch the feedback (precomputed centroids, or recency-weighted rows) from database
+        positive_feedback, negative_feedback, positive_weights, negative_weights = get_feedback('query', query_id)
         
         # Generate embeddings for query and feedback
         final_embedding = None
         
         if query:
-            # Generate categorization prompt
-            categorization_prompt = prompt_generator.generate_categorization_prompt(query)
-            
-            # Get categorized response from OpenAI
-            categorized_response = openai_embedding.get_categorized_response(categorization_prompt)
+            # Categorize or rewrite the query depending on QUERY_PROCESSING_MODE
+            processed_query = query_processor.process(query)
             
             # Generate embedding for the query
-            query_embedding = openai_embedding.generate_embedding(categorized_response)
+            query_embedding = openai_embedding.generate_embedding(processed_query)
             final_embedding = query_embedding
         
         # Combine with feedback embeddings (alpha=1.0, beta=0.5)
@@ -140,7 +277,9 @@ def tenders_search_with_feedback():
             positive_feedback, 
             negative_feedback, 
             alpha=1.0, 
-            beta=0.5
+            beta=0.5,
+            positive_weights=positive_weights,
+            negative_weights=negative_weights
         )
         
         # Search with combined embedding
@@ -151,6 +290,9 @@ def tenders_search_with_feedback():
         
         return jsonify(search_results)
     
+    except OpenAIUnavailableError as e:
+        return jsonify({"error": str(e)}), 503, retry_after_header(e)
+    
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -165,14 +307,16 @@ def tenders_search_by_feedback():
         client_id = data.get('client_id')
         result_columns = data.get('result_columns', [])
         
-        # Fetch feedback from database based on client ID
-        positive_feedback, negative_feedback = db_operation.get_feedback_by_client_id(client_id)
+        # Fetch the feedback (precomputed centroids, or recency-weighted rows) from database based on client ID
+        positive_feedback, negative_feedback, positive_weights, negative_weights = get_feedback('client', client_id)
         
         # Generate final embedding from feedback
         final_embedding = openai_embedding.combine_feedback_only(
             positive_feedback, 
             negative_feedback, 
-            beta=0.5
+            beta=0.5,
+            positive_weights=positive_weights,
+            negative_weights=negative_weights
         )
         
         # Search with feedback embedding
@@ -186,5 +330,127 @@ def tenders_search_by_feedback():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/saved_searches', methods=['POST'])
+def create_saved_search():
+    # Authenticate request
+    if not authenticate(request):
+        return jsonify({"error": "Unauthorized access"}), 401
+    
+    try:
+        data = request.json
+        client_id = data.get('client_id')
+        query = data.get('query')
+        
+        # Validate required fields
+        if not client_id or not query:
+            return jsonify({"error": "Missing required fields"}), 400
+        
+        # Embed the query like /tenders_search so that alerts match what a search would return
+        query_embedding = openai_embedding.generate_embedding(query_processor.process(query))
+        
+        search_id = data.get('search_id') or str(uuid.uuid4())
+        db_operation.store_saved_search(
+            search_id, 
+            client_id, 
+            query, 
+            query_embedding, 
+            data.get('country_code'), 
+            data.get('date_from'), 
+            data.get('date_to'), 
+            data.get('threshold')
+        )
+        
+        return jsonify({"success": True, "search_id": search_id})
+    
+    except OpenAIUnavailableError as e:
+        return jsonify({"error": str(e)}), 503, retry_after_header(e)
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/saved_searches', methods=['GET'])
+def list_saved_searches():
+    # Authenticate request
+    if not authenticate(request):
+        return jsonify({"error": "Unauthorized access"}), 401
+    
+    try:
+        client_id = request.args.get('client_id')
+        if not client_id:
+            return jsonify({"error": "Missing required fields"}), 400
+        
+        columns = ["search_id", "client_id", "query", "country_code", "date_from", "date_to", "threshold"]
+        return jsonify({"saved_searches": [dict(zip(columns, row)) for row in db_operation.get_saved_searches(client_id)]})
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/saved_searches/<search_id>', methods=['DELETE'])
+def delete_saved_search(search_id):
+    # Authenticate request
+    if not authenticate(request):
+        return jsonify({"error": "Unauthorized access"}), 401
+    
+    try:
+        if not db_operation.delete_saved_search(search_id):
+            return jsonify({"error": "Saved search not found"}), 404
+        return jsonify({"success": True})
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/saved_search_matches', methods=['GET'])
+def saved_search_matches():
+    # Authenticate request
+    if not authenticate(request):
+        return jsonify({"error": "Unauthorized access"}), 401
+    
+    try:
+        client_id = request.args.get('client_id')
+        if not client_id:
+            return jsonify({"error": "Missing required fields"}), 400
+        after_id = request.args.get('after_id', 0, type=int)
+        limit = min(request.args.get('limit', 100, type=int), 1000)
+        
+        # Matches are queued by the ingest process; clients poll with the last id they saw
+        rows = db_operation.get_saved_search_matches(client_id, after_id, limit)
+        matches = [
+            {"id": match_id, "search_id": search_id, "tender_id": tender_id, "score": score, "matched_at": str(matched_at)}
+            for match_id, search_id, tender_id, score, matched_at in rows
+        ]
+        return jsonify({"matches": matches, "last_id": matches[-1]["id"] if matches else after_id})
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/stats', methods=['GET'])
+def stats():
+    # Authenticate request
+    if not authenticate(request):
+        return jsonify({"error": "Unauthorized access"}), 401
+    
+    return jsonify({
+        "latency": metrics.stats(),
+        "categorization_cache": query_categorizer.stats(),
+        "query_processing": query_processor.stats(),
+        "embedding_cache": openai_embedding.embedding_cache.stats(),
+        "openai": openai_embedding.resilience.stats(),
+        "coalescing": {
+            "categorization": query_categorizer.single_flight.stats(),
+            "embedding": openai_embedding.single_flight.stats(),
+            "search": elastic_handler.single_flight.stats()
+        },
+        "search_result_cache": search_result_cache.stats(),
+        "mysql_pool": db_operation.pool.stats()
+    })
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    # Authenticate request
+    if not authenticate(request):
+        return jsonify({"error": "Unauthorized access"}), 401
+    
+    return metrics.render_prometheus(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True) 
\ No newline at end of file
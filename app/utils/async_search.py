@@ -0,0 +1,423 @@
+import os
+import asyncio
+import openai
+import aiomysql
+from elasticsearch import AsyncElasticsearch
+from app.utils.metrics import metrics
+from app.utils.openai_resilience import OpenAIUnavailableError
+from app.utils.query_processor import QueryProcessor
+from app.utils.query_rewriter import QueryRewriter
+from app.utils.single_flight import AsyncSingleFlight
+
+# Non-blocking counterpart of the search path used by asgi_app.py. Query building, caching
+# and feedback combination are shared with the sync components; only the network calls go
+# through async clients so that many searches can be in flight on one worker.
+class AsyncSearchService:
+    def __init__(self, db_operation, elastic_handler, openai_embedding, query_categorizer, query_processor=None):
+        self.db_operation = db_operation
+        self.elastic_handler = elastic_handler
+        self.openai_embedding = openai_embedding
+        self.query_categorizer = query_categorizer
+        self.query_processor = query_processor or QueryProcessor(query_categorizer, QueryRewriter())
+        
+        # Concurrent identical categorizations, embeddings and ranked searches share one call
+        self.categorization_flight = AsyncSingleFlight()
+        self.embedding_flight = AsyncSingleFlight()
+        self.search_flight = AsyncSingleFlight()
+        
+        # Async OpenAI client, retried and rate limited by the resilience layer of the sync client
+        self.openai_client = openai.AsyncOpenAI(api_key=openai_embedding.api_key, max_retries=0)
+        self.resilience = openai_embedding.resilience
+        
+        # The vector profile is read through the sync client, so it is refreshed in a worker thread
+        # (ensure_vector_profile) rather than inline on the event loop
+        elastic_handler.profile_refresh_inline = False
+        
+        # Async Elasticsearch client, configured like the sync one
+        es_url = f"http://{elastic_handler.es_host}:{elastic_handler.es_port}"
+        if elastic_handler.es_user and elastic_handler.es_password:
+            self.es = AsyncElasticsearch([es_url], basic_auth=(elastic_handler.es_user, elastic_handler.es_password))
+        else:
+            self.es = AsyncElasticsearch([es_url])
+        
+        # The MySQL pool is bound to an event loop, so it is created on first use
+        self.mysql_pool = None
+        self.mysql_pool_lock = None
+        self.mysql_pool_min_size = int(os.getenv('MYSQL_POOL_MIN_SIZE', '1'))
+        self.mysql_pool_max_size = int(os.getenv('MYSQL_POOL_MAX_SIZE', '10'))
+    
+    async def get_mysql_pool(self):
+        """Create the aiomysql pool lazily on the running event loop"""
+        if self.mysql_pool_lock is None:
+            self.mysql_pool_lock = asyncio.Lock()
+        
+        async with self.mysql_pool_lock:
+            if self.mysql_pool is None:
+                self.mysql_pool = await aiomysql.create_pool(
+                    host=self.db_operation.host,
+                    user=self.db_operation.user,
+                    password=self.db_operation.password,
+                    db=self.db_operation.database,
+                    minsize=self.mysql_pool_min_size,
+                    maxsize=self.mysql_pool_max_size,
+                    autocommit=True
+                )
+        return self.mysql_pool
+    
+    def coalescing_stats(self):
+        """Return the request coalescing counters per layer"""
+        return {
+            "categorization": self.categorization_flight.stats(),
+            "embedding": self.embedding_flight.stats(),
+            "search": self.search_flight.stats()
+        }
+    
+    async def close(self):
+        """Release the async clients"""
+        await self.es.close()
+        await self.openai_client.close()
+        if self.mysql_pool is not None:
+            self.mysql_pool.close()
+            await self.mysql_pool.wait_closed()
+    
+    async def categorize(self, query):
+        """Async variant of QueryCategorizer.categorize, sharing its cache"""
+        categorizer = self.query_categorizer
+        key = categorizer.normalize_query(query)
+        
+        # The SQLite tier is read in a worker thread, off the event loop
+        response = categorizer.cache.get(key)
+        if response is None and categorizer.has_persistent_cache():
+            response = await asyncio.to_thread(categorizer.load_persisted, key)
+        if response is not None:
+            return response
+        
+        return await self.categorization_flight.do(key, self.fetch_categorization, query, key)
+    
+    async def fetch_categorization(self, query, key):
+        """Call the LLM for a categorization cache miss and cache the response"""
+        categorizer = self.query_categorizer
+        prompt = categorizer.prompt_generator.generate_categorization_prompt(query.strip())
+        try:
+            completion = await self.resilience.acall(
+                "chat",
+                self.openai_embedding.estimate_tokens(prompt) + 150,
+                self.openai_client.chat.completions.create,
+                model=self.openai_embedding.model,
+                messages=[
+                    {"role": "system", "content": "You are a helpful assistant that categorizes tender queries."},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.1,
+                max_tokens=150
+            )
+            response = completion.choices[0].message.content.strip()
+        except Exception as e:
+            print(f"Error getting categorized response: {e}")
+            return ""
+        
+        if response:
+            if categorizer.has_persistent_cache():
+                await asyncio.to_thread(categorizer.store, key, response)
+            else:
+                categorizer.store(key, response)
+        return response
+    
+    @metrics.timed("embedding")
+    async def generate_embedding(self, text):
+        """Async variant of OpenAIEmbedding.generate_embedding, sharing its cache"""
+        model = self.openai_embedding.embedding_model
+        
+        cached_embedding = (await self.get_cached_embeddings([text]))[0]
+        if cached_embedding is not None:
+            return cached_embedding
+        
+        return await self.embedding_flight.do((model, text), self.fetch_embedding, text)
+    
+    async def get_cached_embeddings(self, texts):
+        """Look texts up in the shared embedding cache (None for misses), reading the SQLite tier in a worker thread"""
+        model = self.openai_embedding.embedding_model
+        cache = self.openai_embedding.embedding_cache
+        keys = [cache.make_key(model, text) for text in texts]
+        embeddings = [cache.get_memory(key) for key in keys]
+        
+        missing = [position for position, embedding in enumerate(embeddings) if embedding is None]
+        if missing and cache.has_disk_tier():
+            loaded = await asyncio.to_thread(lambda: [cache.load_disk(keys[position]) for position in missing])
+            for position, embedding in zip(missing, loaded):
+                embeddings[position] = embedding
+        return embeddings
+    
+    async def cache_embeddings(self, items):
+        """Store (text, embedding) pairs in the shared embedding cache, writing the SQLite tier in a worker thread"""
+        model = self.openai_embedding.embedding_model
+        cache = self.openai_embedding.embedding_cache
+        
+        def put_all():
+            for text, embedding in items:
+                cache.put(model, text, embedding)
+        
+        if cache.has_disk_tier():
+            await asyncio.to_thread(put_all)
+        else:
+            put_all()
+    
+    async def fetch_embedding(self, text):
+        """Embed a text missing from the cache and cache it"""
+        embedding = (await self.embed_batch([text]))[0]
+        
+        # Zero vectors come from rejected inputs and must not be cached
+        if any(embedding):
+            await self.cache_embeddings([(text, embedding)])
+        return embedding
+    
+    async def embed_batch(self, texts):
+        """Async variant of OpenAIEmbedding.embed_batch: rejected batches are halved until only the failing inputs get zero vectors"""
+        openai_embedding = self.openai_embedding
+        try:
+            response = await self.resilience.acall(
+                "embedding",
+                sum(openai_embedding.estimate_tokens(text) for text in texts),
+                self.openai_client.embeddings.create,
+                input=texts,
+                model=openai_embedding.embedding_model
+            )
+            return openai_embedding.response_embeddings(response, len(texts))
+        except OpenAIUnavailableError:
+            raise
+        except Exception as e:
+            halves = openai_embedding.split_failed_batch(texts, e)
+        
+        if halves is None:
+            return [[0] * 1536]  # Return a zero vector for an input that OpenAI rejects
+        return await self.embed_batch(halves[0]) + await self.embed_batch(halves[1])
+    
+    async def categorize_many(self, queries):
+        """Async variant of QueryCategorizer.categorize_many"""
+        categorizer = self.query_categorizer
+        distinct = {}
+        for query in queries:
+            distinct.setdefault(categorizer.normalize_query(query), query)
+        
+        # Bound the completions in flight like the sync thread pool
+        semaphore = asyncio.Semaphore(max(1, categorizer.batch_workers))
+        
+        async def categorize(query):
+            async with semaphore:
+                return await self.categorize(query)
+        
+        responses = dict(zip(distinct, await asyncio.gather(*(categorize(query) for query in distinct.values()))))
+        return [responses[categorizer.normalize_query(query)] for query in queries]
+    
+    @metrics.timed("embedding")
+    async def generate_embeddings(self, texts):
+        """Async variant of OpenAIEmbedding.generate_embeddings, sharing its cache and batching"""
+        embeddings = await self.get_cached_embeddings(texts)
+        
+        missing = {}
+        for position, text in enumerate(texts):
+            if embeddings[position] is None:
+                missing.setdefault(text, []).append(position)
+        
+        for batch in self.openai_embedding.pack_batches(list(missing)):
+            batch_embeddings = await self.embed_batch(batch)
+            
+            # Zero vectors come from failed inputs and must not be cached
+            await self.cache_embeddings([(text, embedding) for text, embedding in zip(batch, batch_embeddings) if any(embedding)])
+            for text, embedding in zip(batch, batch_embeddings):
+                for position in missing[text]:
+                    embeddings[position] = embedding
+        
+        return embeddings
+    
+    @metrics.timed("categorization")
+    async def process_query(self, query):
+        """Async variant of QueryProcessor.process"""
+        path, local_text = self.query_processor.plan(query)
+        llm_response = await self.categorize(query) if path == "llm" else None
+        return self.query_processor.complete(path, local_text, llm_response)
+    
+    @metrics.timed("categorization")
+    async def process_many(self, queries):
+        """Async variant of QueryProcessor.process_many"""
+        plans = [self.query_processor.plan(query) for query in queries]
+        llm_responses = iter(await self.categorize_many([
+            query for query, (path, _) in zip(queries, plans) if path == "llm"
+        ]))
+        return [
+            self.query_processor.complete(path, local_text, next(llm_responses) if path == "llm" else None) for path, local_text in plans
+        ]
+    
+    async def embed_query(self, query):
+        """Process a query (see QueryProcessor) and embed the result"""
+        processed_query = await self.process_query(query)
+        return await self.generate_embedding(processed_query)
+    
+    async def ensure_vector_profile(self):
+        """Refresh the index vector profile off the event loop when it is due"""
+        if self.elastic_handler.profile_is_stale():
+            await asyncio.to_thread(self.elastic_handler.ensure_vector_profile)
+    
+    async def execute_search(self, search_mode, body):
+        """Async variant of ElasticHandler.execute_search"""
+        if search_mode in ("knn", "hybrid"):
+            return await self.es.msearch(index=self.elastic_handler.index_name, body=body)
+        return await self.es.search(index=self.elastic_handler.index_name, body=body)
+    
+    @metrics.timed("search")
+    async def search_tenders(self, query_embedding, result_columns=None, country_code=None, date_from=None, date_to=None, page=1, page_size=10, search_mode=None, query_text=None, lexical_weight=None):
+        """Async variant of ElasticHandler.search_tenders"""
+        # The local index is searched in a worker thread (it is CPU bound)
+        if self.elastic_handler.uses_local_backend():
+            return await asyncio.to_thread(
+                self.elastic_handler.search_local_page,
+                query_embedding, result_columns, country_code, date_from, date_to, page, page_size, search_mode
+            )
+        
+        try:
+            await self.ensure_vector_profile()
+            search_mode, body = self.elastic_handler.build_search_request(
+                query_embedding, result_columns, country_code, date_from, date_to, page, page_size, search_mode, query_text, lexical_weight
+            )
+            
+            # Execute the search
+            response = await self.execute_search(search_mode, body)
+            
+            return self.elastic_handler.parse_search_response(search_mode, response, page, page_size, lexical_weight)
+            
+        except Exception as e:
+            print(f"Error searching tenders: {e}")
+            metrics.count_fallback("search_error")
+            return await asyncio.to_thread(
+                self.elastic_handler.search_local_page,
+                query_embedding, result_columns, country_code, date_from, date_to, page, page_size, search_mode
+            )
+    
+    @metrics.timed("search")
+    async def search_ranked_tenders(self, query_embedding, result_columns=None, country_code=None, date_from=None, date_to=None, top_k=100, search_mode=None, query_text=None, lexical_weight=None):
+        """Async variant of ElasticHandler.search_ranked_tenders"""
+        key = self.elastic_handler.search_key(query_embedding, result_columns, country_code, date_from, date_to, top_k, search_mode, query_text, lexical_weight)
+        return await self.search_flight.do(
+            key, self.run_ranked_search, query_embedding, result_columns, country_code, date_from, date_to, top_k, search_mode, query_text, lexical_weight
+        )
+    
+    async def run_ranked_search(self, query_embedding, result_columns=None, country_code=None, date_from=None, date_to=None, top_k=100, search_mode=None, query_text=None, lexical_weight=None):
+        """Async variant of ElasticHandler.run_ranked_search"""
+        try:
+            if self.elastic_handler.uses_local_backend():
+                return await asyncio.to_thread(
+                    self.elastic_handler.search_local,
+                    query_embedding, result_columns, country_code, date_from, date_to, top_k, search_mode
+                )
+            
+            await self.ensure_vector_profile()
+            search_mode, body = self.elastic_handler.build_search_request(
+                query_embedding, result_columns, country_code, date_from, date_to, 1, top_k, search_mode, query_text, lexical_weight
+            )
+            response = await self.execute_search(search_mode, body)
+            search_results = self.elastic_handler.parse_search_response(search_mode, response, 1, top_k, lexical_weight)
+            return search_results["tenders"], search_results["pagination"]["total_results"]
+            
+        except ValueError:
+            raise
+            
+        except Exception as e:
+            print(f"Error searching tenders: {e}")
+            metrics.count_fallback("search_error")
+            return None
+    
+    @metrics.timed("search")
+    async def search_ranked_tenders_batch(self, searches):
+        """Async variant of ElasticHandler.search_ranked_tenders_batch"""
+        elastic_handler = self.elastic_handler
+        if elastic_handler.uses_local_backend():
+            return await asyncio.to_thread(lambda: [elastic_handler.search_local_batch_entry(search) for search in searches])
+        
+        await self.ensure_vector_profile()
+        body, plans = elastic_handler.build_batch_search_request(searches)
+        try:
+            response = await self.es.msearch(index=elastic_handler.index_name, body=body) if body else {"responses": []}
+        except Exception as e:
+            print(f"Error searching tenders: {e}")
+            metrics.count_fallback("search_error", len(plans))
+            return [plan if isinstance(plan, ValueError) else None for plan in plans]
+        
+        return elastic_handler.batch_entries(elastic_handler.parse_batch_search_response(plans, searches, response))
+    
+    @metrics.timed("search")
+    async def search_tenders_after(self, query_embedding, result_columns=None, country_code=None, date_from=None, date_to=None, page_size=10, cursor=None):
+        """Async variant of ElasticHandler.search_tenders_after"""
+        pit_id, search_after, page = self.elastic_handler.decode_cursor(cursor) if cursor else (None, None, 1)
+        
+        try:
+            await self.ensure_vector_profile()
+            if pit_id is None:
+                response = await self.es.open_point_in_time(index=self.elastic_handler.index_name, keep_alive=self.elastic_handler.pit_keep_alive)
+                pit_id = response["id"]
+            
+            body = self.elastic_handler.build_cursor_request(
+                query_embedding, result_columns, country_code, date_from, date_to, page_size, pit_id, search_after
+            )
+            response = await self.es.search(body=body)
+            
+            search_results, exhausted = self.elastic_handler.parse_cursor_response(response, pit_id, page, page_size)
+            if exhausted:
+                try:
+                    await self.es.close_point_in_time(id=response.get("pit_id", pit_id))
+                except Exception as e:
+                    print(f"Error closing point in time: {e}")
+            return search_results
+            
+        except Exception as e:
+            print(f"Error searching tenders: {e}")
+            metrics.count_fallback("empty_search_results")
+            search_results = self.elastic_handler.empty_search_results(page, page_size)
+            search_results["pagination"]["next_cursor"] = None
+            return search_results
+    
+    async def fetch_feedback(self, sql, key, with_timestamps=False):
+        """Run a feedback query and split the embeddings by polarity"""
+        pool = await self.get_mysql_pool()
+        async with pool.acquire() as connection:
+            async with connection.cursor() as cursor:
+                await cursor.execute(sql, (key,))
+                return self.db_operation.split_feedback_rows(await cursor.fetchall(), with_timestamps)
+    
+    async def get_feedback_by_query_id(self, query_id, with_timestamps=False):
+        """Async variant of DatabaseOperation.get_feedback_by_query_id"""
+        return await self.fetch_feedback(self.db_operation.FEEDBACK_BY_QUERY_SQL, query_id, with_timestamps)
+    
+    async def get_feedback_by_client_id(self, client_id, with_timestamps=False):
+        """Async variant of DatabaseOperation.get_feedback_by_client_id"""
+        return await self.fetch_feedback(self.db_operation.FEEDBACK_BY_CLIENT_SQL, client_id, with_timestamps)
+    
+    async def fetch_feedback_centroids(self, scope, scope_id):
+        """Read the precomputed feedback centroids for a query or client"""
+        pool = await self.get_mysql_pool()
+        async with pool.acquire() as connection:
+            async with connection.cursor() as cursor:
+                await cursor.execute(self.db_operation.FEEDBACK_AGGREGATES_SQL, (scope, scope_id))
+                return self.db_operation.split_aggregate_rows(await cursor.fetchall())
+    
+    async def get_feedback_centroids_by_query_id(self, query_id):
+        """Async variant of DatabaseOperation.get_feedback_centroids_by_query_id"""
+        return await self.fetch_feedback_centroids('query', query_id)
+    
+    async def get_feedback_centroids_by_client_id(self, client_id):
+        """Async variant of DatabaseOperation.get_feedback_centroids_by_client_id"""
+        return await self.fetch_feedback_centroids('client', client_id)
+    
+    @metrics.timed("feedback_fetch")
+    async def get_feedback(self, scope, scope_id):
+        """Async variant of the feedback fetch in app.py: centroids, or recency-weighted rows when enabled"""
+        combiner = self.openai_embedding.feedback_combiner
+        if not combiner.recency_half_life_days:
+            if scope == 'query':
+                positive_feedback, negative_feedback = await self.get_feedback_centroids_by_query_id(scope_id)
+            else:
+                positive_feedback, negative_feedback = await self.get_feedback_centroids_by_client_id(scope_id)
+            return positive_feedback, negative_feedback, None, None
+        
+        fetch = self.get_feedback_by_query_id if scope == 'query' else self.get_feedback_by_client_id
+        positive_feedback, negative_feedback, positive_times, negative_times = await fetch(scope_id, with_timestamps=True)
+        return positive_feedback, negative_feedback, combiner.recency_weights(positive_times), combiner.recency_weights(negative_times)
@@ -0,0 +1,106 @@
+import os
+from app.utils.elastic_handler import ElasticHandler
+
+# Plans a /tenders_search_batch request, shared by app.py and asgi_app.py. Pages already in
+# the result cache are answered directly; the remaining searches are grouped by their cache
+# key so that identical searches are categorized, embedded and ranked once, deep enough to
+# serve every page requested for them. The caller runs the network calls in batches and
+# hands the rankings back to resolve().
+class BatchSearch:
+    def __init__(self, searches, result_cache, max_size=None):
+        self.max_size = int(os.getenv('SEARCH_BATCH_MAX_SIZE', '500')) if max_size is None else max_size
+        if not isinstance(searches, list) or not searches:
+            raise ValueError("searches must be a non-empty list")
+        if len(searches) > self.max_size:
+            raise ValueError(f"At most {self.max_size} searches per batch")
+        
+        self.result_cache = result_cache
+        self.results = [None] * len(searches)
+        
+        # Distinct searches still to run: cache key -> search arguments and requested pages
+        self.groups = {}
+        
+        # Rankings are only cached if the index did not change while the batch ran
+        self.generation = result_cache.generation
+        
+        for position, search in enumerate(searches):
+            try:
+                self.add(position, search)
+            except (ValueError, TypeError) as e:
+                # A malformed search only fails its own entry
+                self.results[position] = {"error": str(e)}
+    
+    def add(self, position, search):
+        """Answer one search from the cache or group it with identical searches"""
+        if not isinstance(search, dict):
+            raise ValueError("Each search must be an object")
+        if search.get('cursor') or search.get('pagination_mode') == 'cursor':
+            raise ValueError("Cursor pagination is not supported in batches")
+        
+        query = search.get('query', '')
+        result_columns = search.get('result_columns', [])
+        country_code = search.get('country_code')
+        date_from = search.get('date_from')
+        date_to = search.get('date_to')
+        page = search.get('page', 1)
+        page_size = search.get('page_size', 10)
+        search_mode = search.get('search_mode')
+        lexical_weight = search.get('lexical_weight')
+        
+        for name, value in (("page", page), ("page_size", page_size)):
+            if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+                raise ValueError(f"{name} must be a positive integer")
+        if not isinstance(query, str):
+            raise ValueError("query must be a string")
+        
+        cache_key = self.result_cache.make_key(query, result_columns, country_code, date_from, date_to, search_mode, lexical_weight)
+        cached_page = self.result_cache.get_page(cache_key, page, page_size)
+        if cached_page is not None:
+            self.results[position] = ElasticHandler.paginate(*cached_page, page, page_size)
+            return
+        
+        group = self.groups.setdefault(cache_key, {
+            "query": query,
+            "search": {
+                "result_columns": result_columns,
+                "country_code": country_code,
+                "date_from": date_from,
+                "date_to": date_to,
+                "top_k": 0,
+                "search_mode": search_mode,
+                "query_text": query,
+                "lexical_weight": lexical_weight
+            },
+            "pages": []
+        })
+        group["search"]["top_k"] = max(group["search"]["top_k"], self.result_cache.depth(page, page_size))
+        group["pages"].append((position, page, page_size))
+    
+    def queries(self):
+        """Query text of each distinct search, in group order"""
+        return [group["query"] for group in self.groups.values()]
+    
+    def ranked_searches(self, embeddings):
+        """search_ranked_tenders_batch arguments for each distinct search"""
+        return [dict(group["search"], query_embedding=embedding) for group, embedding in zip(self.groups.values(), embeddings)]
+    
+    def resolve(self, searches, ranked_results):
+        """Fill in the ranked searches and return the (position, search, page, page_size) that failed"""
+        failed = []
+        for (cache_key, group), search, entry in zip(self.groups.items(), searches, ranked_results):
+            if entry is None:
+                failed.extend((position, search, page, page_size) for position, page, page_size in group["pages"])
+                continue
+            
+            if isinstance(entry, Exception):
+                for position, _, _ in group["pages"]:
+                    self.results[position] = {"error": str(entry)}
+                continue
+            
+            results, total_results = entry
+            self.result_cache.put(cache_key, results, total_results, self.generation)
+            for position, page, page_size in group["pages"]:
+                start = (page - 1) * page_size
+                self.results[position] = ElasticHandler.paginate(results[start:start + page_size], total_results, page, page_size)
+        
+        return failed
@@ -0,0 +1,79 @@
+import threading
+import time
+from collections import OrderedDict
+
+class LRUCache:
+    def __init__(self, max_size=1000, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key, default=None):
+        """Return the cached value for key, or default if it is missing or expired"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self.entries[key]
+                self.misses += 1
+                return default
+            
+            # Mark as most recently used
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def contains(self, key):
+        """Check for a live entry without touching the hit/miss counters or LRU order"""
+        with self.lock:
+            entry = self.entries.get(key)
+            return entry is not None and (entry[1] is None or entry[1] >= time.monotonic())
+    
+    def put(self, key, value, ttl=None):
+        """Store a value, evicting the least recently used entries when full"""
+        if self.max_size <= 0:
+            return
+        
+        ttl = ttl if ttl is not None else self.ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        
+        with self.lock:
+            self.entries[key] = (value, expires_at)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+    
+    def delete(self, key):
+        """Remove a single entry if present"""
+        with self.lock:
+            self.entries.pop(key, None)
+    
+    def clear(self):
+        """Remove all entries"""
+        with self.lock:
+            self.entries.clear()
+    
+    def __len__(self):
+        return len(self.entries)
+    
+    def stats(self):
+        """Return hit/miss counters for monitoring"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
@@ -0,0 +1,174 @@
+import threading
+import time
+from contextlib import contextmanager
+from collections import deque
+
+class ConnectionPool:
+    def __init__(self, create_connection, min_size=1, max_size=10, timeout=10, health_check_interval=30):
+        self.create_connection = create_connection
+        self.min_size = min_size
+        self.max_size = max(max_size, 1)
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        
+        # Idle connections with the time they were returned to the pool
+        self.idle = deque()
+        self.size = 0
+        self.condition = threading.Condition()
+        self.warmed = False
+        
+        # Metrics
+        self.checkouts = 0
+        self.in_use = 0
+        self.created = 0
+        self.discarded = 0
+        self.timeouts = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+    
+    def warm(self):
+        """Open connections up to the minimum pool size"""
+        while True:
+            with self.condition:
+                if self.size >= self.min_size:
+                    self.warmed = True
+                    return
+                self.size += 1
+            
+            try:
+                connection = self.create_connection()
+            except Exception:
+                with self.condition:
+                    self.size -= 1
+                raise
+            
+            with self.condition:
+                self.created += 1
+                self.idle.append((connection, time.monotonic()))
+                self.condition.notify()
+    
+    def is_healthy(self, connection, idle_since):
+        """Ping connections that have been idle for longer than the health check interval"""
+        if time.monotonic() - idle_since < self.health_check_interval:
+            return True
+        try:
+            connection.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+    
+    def discard(self, connection):
+        """Close a broken connection and free its slot"""
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self.condition:
+            self.size -= 1
+            self.discarded += 1
+            self.condition.notify()
+    
+    def acquire(self):
+        """Check out a healthy connection, waiting up to the pool timeout if all are in use"""
+        if not self.warmed:
+            self.warm()
+        
+        start = time.monotonic()
+        deadline = start + self.timeout
+        while True:
+            create = False
+            with self.condition:
+                while not self.idle and self.size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise TimeoutError(f"Timed out waiting for a database connection after {self.timeout}s")
+                    self.condition.wait(remaining)
+                
+                if self.idle:
+                    connection, idle_since = self.idle.pop()
+                else:
+                    # Reserve a slot and open the connection outside the lock
+                    self.size += 1
+                    create = True
+            
+            if create:
+                try:
+                    connection = self.create_connection()
+                except Exception:
+                    with self.condition:
+                        self.size -= 1
+                        self.condition.notify()
+                    raise
+                with self.condition:
+                    self.created += 1
+            elif not self.is_healthy(connection, idle_since):
+                self.discard(connection)
+                continue
+            
+            wait_time = time.monotonic() - start
+            with self.condition:
+                self.checkouts += 1
+                self.in_use += 1
+                self.total_wait_time += wait_time
+                self.max_wait_time = max(self.max_wait_time, wait_time)
+            return connection
+    
+    def release(self, connection, broken=False):
+        """Return a connection to the pool, ending any open transaction"""
+        with self.condition:
+            self.in_use -= 1
+        
+        if not broken:
+            try:
+                # Do not leak an open transaction (or its read snapshot) to the next user
+                connection.rollback()
+            except Exception:
+                broken = True
+        
+        if broken:
+            self.discard(connection)
+            return
+        
+        with self.condition:
+            self.idle.append((connection, time.monotonic()))
+            self.condition.notify()
+    
+    @contextmanager
+    def connection(self):
+        """Context manager checking a connection out for the duration of a request"""
+        connection = self.acquire()
+        try:
+            yield connection
+        finally:
+            # A connection that was lost during the request fails the rollback in release()
+            self.release(connection)
+    
+    def close(self):
+        """Close all idle connections"""
+        with self.condition:
+            idle = list(self.idle)
+            self.idle.clear()
+            self.size -= len(idle)
+        for connection, _ in idle:
+            try:
+                connection.close()
+            except Exception:
+                pass
+    
+    def stats(self):
+        """Return pool metrics"""
+        with self.condition:
+            return {
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "size": self.size,
+                "in_use": self.in_use,
+                "idle": len(self.idle),
+                "checkouts": self.checkouts,
+                "created": self.created,
+                "discarded": self.discarded,
+                "timeouts": self.timeouts,
+                "average_wait_time": self.total_wait_time / self.checkouts if self.checkouts else 0.0,
+                "max_wait_time": self.max_wait_time
+            }
@@ -1,207 +1,829 @@
 import pymysql
 import os
 import json
+from app.utils.connection_pool import ConnectionPool
+import numpy as np
+from app.utils.vector_codec import encode_vector, decode_vector, decode_vectors
 
 class DatabaseOperation:
+    # Feedback embedding queries, shared with the async search path. Both polarities are
+    # fetched in one round-trip and split in Python.
+    FEEDBACK_BY_QUERY_SQL = """
+    SELECT f.feedback_value, t.tender_vector, UNIX_TIMESTAMP(f.timestamp)
+    FROM feedback f
+    JOIN tenders t ON f.tender_id = t.id
+    WHERE f.query_id = %s
+    """
+
+    FEEDBACK_BY_CLIENT_SQL = """
+    SELECT f.feedback_value, t.tender_vector, UNIX_TIMESTAMP(f.timestamp)
+    FROM search_queries sq
+    JOIN feedback f ON f.query_id = sq.query_id
+    JOIN tenders t ON f.tender_id = t.id
+    WHERE sq.client_id = %s
+    """
+
+    # Running sums of feedback vectors per query and per client, maintained by store_feedback
+    FEEDBACK_AGGREGATES_SQL = """
+    SELECT feedback_value, vector_sum, item_count
+    FROM feedback_aggregates
+    WHERE scope = %s AND scope_id = %s
+    """
+
+    # Secondary indexes supporting the feedback read path: (table, index name, columns)
+    SECONDARY_INDEXES = [
+        ("search_queries", "idx_search_queries_client", "client_id"),
+        ("feedback", "idx_feedback_query_value", "query_id, feedback_value, tender_id"),
+        ("feedback", "idx_feedback_tender", "tender_id"),
+    ]
+
     def __init__(self):
         self.host = os.getenv('MYSQL_HOST', 'localhost')
         self.user = os.getenv('MYSQL_USER', 'root')
         self.password = os.getenv('MYSQL_PASSWORD', '')
         self.database = os.getenv('MYSQL_DATABASE', 'tender_db')
-        self.connection = None
-        self.cursor = None
+        self.embedding_dtype = os.getenv('MYSQL_EMBEDDING_DTYPE', 'float32')
 
-    def connect(self):
+        # Thread-safe pool shared by all requests; each call checks out its own connection
+        self.pool = ConnectionPool(
+            self.create_connection,
+            min_size=int(os.getenv('MYSQL_POOL_MIN_SIZE', '1')),
+            max_size=int(os.getenv('MYSQL_POOL_MAX_SIZE', '10')),
+            timeout=float(os.getenv('MYSQL_POOL_TIMEOUT', '10')),
+            health_check_interval=float(os.getenv('MYSQL_POOL_HEALTH_CHECK_INTERVAL', '30'))
+        )
+
+    def create_connection(self):
+        """Open a new MySQL connection for the pool"""
         try:
-            self.connection = pymysql.connect(
+            return pymysql.connect(
                 host=self.host,
                 user=self.user,
                 password=self.password,
                 database=self.database,
                 cursorclass=pymysql.cursors.Cursor
             )
-            self.cursor = self.connection.cursor()
-            return True
         except pymysql.MySQLError as err:
             print(f"Error connecting to MySQL: {err}")
-            return False
+            raise Exception("Failed to connect to database")
 
-    def disconnect(self):
-        if self.cursor:
-            self.cursor.close()
-        if self.connection:
-            self.connection.close()
+    def store_feedback(self, query_id, search_query, feedback_list, client_id=None):
+        """Store customer feedback and update the per-query and per-client aggregates"""
+        with self.pool.connection() as connection:
+            try:
+                with connection.cursor() as cursor:
+                    # Lock the query to know whether it changes client
+                    cursor.execute("SELECT client_id FROM search_queries WHERE query_id = %s FOR UPDATE", (query_id,))
+                    row = cursor.fetchone()
+                    previous_client_id = row[0] if row else None
 
-    def store_feedback(self, query_id, search_query, feedback_list):
-        """Store customer feedback in the database"""
-        try:
-            if not self.connect():
-                raise Exception("Failed to connect to database")
-
-            # Insert query information
-            query = """
-            INSERT INTO search_queries (query_id, search_query) 
-            VALUES (%s, %s) 
-            ON DUPLICATE KEY UPDATE search_query = %s
-            """
-            self.cursor.execute(query, (query_id, search_query, search_query))
-
-            # Insert feedback items
-            for feedback in feedback_list:
-                tender_id = feedback['ID']
-                feedback_value = feedback['feedback']
+                    # Insert query information
+                    query = """
+                    INSERT INTO search_queries (query_id, client_id, search_query) 
+                    VALUES (%s, %s, %s) 
+                    ON DUPLICATE KEY UPDATE search_query = %s, client_id = COALESCE(VALUES(client_id), client_id)
+                    """
+                    cursor.execute(query, (query_id, client_id, search_query, search_query))
 
-                query = """
-                INSERT INTO feedback (query_id, tender_id, feedback_value) 
-                VALUES (%s, %s, %s)
-                ON DUPLICATE KEY UPDATE feedback_value = %s
-                """
-                self.cursor.execute(query, (query_id, tender_id, feedback_value, feedback_value))
+                    cursor.execute("SELECT client_id FROM search_queries WHERE query_id = %s", (query_id,))
+                    client_id = cursor.fetchone()[0]
+
+                    # The existing feedback of the query now counts for its new client
+                    if row and client_id != previous_client_id:
+                        self.move_query_aggregates(cursor, query_id, previous_client_id, client_id)
+
+                    # Lock the existing feedback of these tenders to know which values flip
+                    previous_values = {}
+                    tender_ids = list({feedback['ID'] for feedback in feedback_list})
+                    if tender_ids:
+                        placeholders = ", ".join(["%s"] * len(tender_ids))
+                        cursor.execute(
+                            f"SELECT tender_id, feedback_value FROM feedback WHERE query_id = %s AND tender_id IN ({placeholders}) FOR UPDATE",
+                            [query_id] + tender_ids
+                        )
+                        previous_values = dict(cursor.fetchall())
+
+                    # Insert feedback items, collecting (tender_id, old value, new value) changes
+                    changes = []
+                    for feedback in feedback_list:
+                        tender_id = feedback['ID']
+                        feedback_value = feedback['feedback']
+
+                        query = """
+                        INSERT INTO feedback (query_id, tender_id, feedback_value) 
+                        VALUES (%s, %s, %s)
+                        ON DUPLICATE KEY UPDATE feedback_value = %s
+                        """
+                        cursor.execute(query, (query_id, tender_id, feedback_value, feedback_value))
+
+                        previous_value = previous_values.get(tender_id)
+                        if previous_value != feedback_value:
+                            changes.append((tender_id, previous_value, feedback_value))
+                            previous_values[tender_id] = feedback_value
+
+                    self.apply_feedback_changes(cursor, query_id, client_id, changes)
+
+                connection.commit()
+                return True
 
-            self.connection.commit()
+            except Exception as e:
+                connection.rollback()
+                raise e
+
+    def apply_feedback_changes(self, cursor, query_id, client_id, changes):
+        """Add new feedback to (and remove flipped feedback from) the running aggregates"""
+        if not changes:
+            return
+
+        # Tenders without a stored vector are skipped, like in the feedback JOIN; store_tenders adds
+        # their feedback once they get one. The shared lock orders this with store_tenders.
+        tender_ids = list({tender_id for tender_id, _, _ in changes})
+        placeholders = ", ".join(["%s"] * len(tender_ids))
+        cursor.execute(f"SELECT id, tender_vector FROM tenders WHERE id IN ({placeholders}) LOCK IN SHARE MODE", tender_ids)
+        vectors = {tender_id: decode_vector(blob).astype(np.float64) for tender_id, blob in cursor.fetchall() if blob}
+
+        # Net change of the sum and count per polarity
+        deltas = {}
+        for tender_id, previous_value, feedback_value in changes:
+            vector = vectors.get(tender_id)
+            if vector is None:
+                continue
+            for value, sign in ((previous_value, -1), (feedback_value, 1)):
+                if value is None:
+                    continue
+                vector_sum, count = deltas.get(value, (np.zeros_like(vector), 0))
+                deltas[value] = (vector_sum + sign * vector, count + sign)
+
+        self.add_to_aggregates(cursor, 'query', query_id, deltas)
+        if client_id:
+            self.add_to_aggregates(cursor, 'client', client_id, deltas)
+
+    def move_query_aggregates(self, cursor, query_id, previous_client_id, client_id):
+        """Move the feedback sums of a query from its previous client to its new one"""
+        cursor.execute("""
+        SELECT feedback_value, vector_sum, item_count FROM feedback_aggregates
+        WHERE scope = 'query' AND scope_id = %s
+        FOR UPDATE
+        """, (query_id,))
+        deltas = {
+            feedback_value: (decode_vector(vector_sum).astype(np.float64), count)
+            for feedback_value, vector_sum, count in cursor.fetchall() if vector_sum and count
+        }
+        if not deltas:
+            return
+
+        if previous_client_id:
+            self.add_to_aggregates(cursor, 'client', previous_client_id, {
+                feedback_value: (-vector_sum, -count) for feedback_value, (vector_sum, count) in deltas.items()
+            })
+        if client_id:
+            self.add_to_aggregates(cursor, 'client', client_id, deltas)
+
+    def add_to_aggregates(self, cursor, scope, scope_id, deltas):
+        """Add {feedback_value: (vector sum, item count)} deltas to the aggregates of one scope"""
+        for feedback_value, (delta_sum, delta_count) in deltas.items():
+            cursor.execute("""
+            SELECT vector_sum, item_count FROM feedback_aggregates
+            WHERE scope = %s AND scope_id = %s AND feedback_value = %s
+            FOR UPDATE
+            """, (scope, scope_id, feedback_value))
+            row = cursor.fetchone()
+            if row and row[0]:
+                vector_sum = decode_vector(row[0]) + delta_sum
+                count = row[1] + delta_count
+            else:
+                vector_sum = delta_sum
+                count = delta_count
+
+            cursor.execute("""
+            INSERT INTO feedback_aggregates (scope, scope_id, feedback_value, vector_sum, item_count)
+            VALUES (%s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE vector_sum = VALUES(vector_sum), item_count = VALUES(item_count)
+            """, (scope, scope_id, feedback_value, encode_vector(vector_sum, "float64"), count))
+
+    @staticmethod
+    def split_feedback_rows(rows, with_timestamps=False):
+        """Decode (feedback_value, tender_vector[, timestamp]) rows into positive and negative (n, dims) matrices
+
+        With with_timestamps, the UNIX timestamps of the positive and negative rows are returned too.
+        """
+        rows = [row for row in rows if row[1]]
+        vectors = decode_vectors(row[1] for row in rows)
+        positive = np.fromiter((row[0] == 'positive' for row in rows), dtype=bool, count=len(rows))
+        if not with_timestamps:
+            return vectors[positive], vectors[~positive]
+
+        timestamps = np.fromiter((row[2] or 0 for row in rows), dtype=np.float64, count=len(rows))
+        return vectors[positive], vectors[~positive], timestamps[positive], timestamps[~positive]
+
+    def store_tender(self, tender_id, title, description, embedding):
+        """Insert or update a tender with its embedding in the binary storage format"""
+        return self.store_tenders([(tender_id, title, description, embedding)])
+
+    def store_tenders(self, tenders):
+        """Insert or update (tender_id, title, description, embedding) rows in one transaction
+
+        The feedback aggregates of every query and client with feedback on these tenders follow
+        the vector changes in the same transaction.
+        """
+        if not tenders:
             return True
 
-        except Exception as e:
-            if self.connection:
-                self.connection.rollback()
-            raise e
-        finally:
-            self.disconnect()
+        rows = {}
+        for tender_id, title, description, embedding in tenders:
+            rows[tender_id] = (tender_id, title, description, encode_vector(embedding, self.embedding_dtype))
 
-    def get_feedback_by_query_id(self, query_id):
+        with self.pool.connection() as connection:
+            try:
+                with connection.cursor() as cursor:
+                    previous_vectors = self.lock_tender_vectors(cursor, list(rows))
+
+                    query = """
+                    INSERT INTO tenders (id, tender_title, tender_description, tender_vector)
+                    VALUES (%s, %s, %s, %s)
+                    ON DUPLICATE KEY UPDATE tender_title = VALUES(tender_title),
+                        tender_description = VALUES(tender_description),
+                        tender_vector = VALUES(tender_vector)
+                    """
+                    cursor.executemany(query, list(rows.values()))
+
+                    self.apply_tender_vector_changes(cursor, {
+                        tender_id: (previous_vectors.get(tender_id), row[3])
+                        for tender_id, row in rows.items() if previous_vectors.get(tender_id) != row[3]
+                    })
+
+                connection.commit()
+                return True
+
+            except Exception as e:
+                connection.rollback()
+                raise e
+
+    def delete_tenders(self, tender_ids):
+        """Delete tenders and remove their vectors from the feedback aggregates in one transaction
+
+        Their feedback rows are kept; like in the feedback JOIN, feedback on a missing tender
+        does not count.
+        """
+        tender_ids = list(set(tender_ids))
+        if not tender_ids:
+            return 0
+
+        with self.pool.connection() as connection:
+            try:
+                with connection.cursor() as cursor:
+                    previous_vectors = self.lock_tender_vectors(cursor, tender_ids)
+                    placeholders = ", ".join(["%s"] * len(tender_ids))
+                    deleted = cursor.execute(f"DELETE FROM tenders WHERE id IN ({placeholders})", tender_ids)
+
+                    self.apply_tender_vector_changes(cursor, {
+                        tender_id: (blob, None) for tender_id, blob in previous_vectors.items() if blob
+                    })
+
+                connection.commit()
+                return deleted
+
+            except Exception as e:
+                connection.rollback()
+                raise e
+
+    def lock_tender_vectors(self, cursor, tender_ids):
+        """Lock existing tender rows and return their stored vectors by ID"""
+        placeholders = ", ".join(["%s"] * len(tender_ids))
+        cursor.execute(f"SELECT id, tender_vector FROM tenders WHERE id IN ({placeholders}) FOR UPDATE", tender_ids)
+        return dict(cursor.fetchall())
+
+    def apply_tender_vector_changes(self, cursor, changes):
+        """Move the feedback aggregates from old to new tender vectors
+
+        changes maps tender IDs to (previous blob, new blob), either of which may be None: a
+        tender getting its first vector adds its pending feedback, a removed vector takes it out.
+        """
+        if not changes:
+            return
+
+        tender_ids = list(changes)
+        placeholders = ", ".join(["%s"] * len(tender_ids))
+        cursor.execute(f"""
+        SELECT f.tender_id, f.query_id, sq.client_id, f.feedback_value
+        FROM feedback f
+        LEFT JOIN search_queries sq ON f.query_id = sq.query_id
+        WHERE f.tender_id IN ({placeholders})
+        LOCK IN SHARE MODE
+        """, tender_ids)
+        feedback_rows = cursor.fetchall()
+        if not feedback_rows:
+            return
+
+        # Change of each tender's contribution: (vector difference, count difference)
+        differences = {}
+        for tender_id, (previous_blob, blob) in changes.items():
+            previous_vector = decode_vector(previous_blob).astype(np.float64) if previous_blob else None
+            vector = decode_vector(blob).astype(np.float64) if blob else None
+            if previous_vector is None and vector is None:
+                continue
+            if previous_vector is None:
+                differences[tender_id] = (vector, 1)
+            elif vector is None:
+                differences[tender_id] = (-previous_vector, -1)
+            else:
+                differences[tender_id] = (vector - previous_vector, 0)
+
+        # Sum the differences per scope and polarity
+        deltas = {}
+        for tender_id, query_id, client_id, feedback_value in feedback_rows:
+            if tender_id not in differences:
+                continue
+            difference, count = differences[tender_id]
+            scopes = [('query', query_id)]
+            if client_id:
+                scopes.append(('client', client_id))
+            for scope in scopes:
+                scope_deltas = deltas.setdefault(scope, {})
+                vector_sum, item_count = scope_deltas.get(feedback_value, (np.zeros_like(difference), 0))
+                scope_deltas[feedback_value] = (vector_sum + difference, item_count + count)
+
+        # Sorted so that concurrent writers lock aggregate rows in the same order
+        for (scope, scope_id), scope_deltas in sorted(deltas.items()):
+            self.add_to_aggregates(cursor, scope, scope_id, scope_deltas)
+
+    def migrate_tender_embeddings(self, dtype=None, batch_size=1000, drop_json=False):
+        """Convert JSON tender embeddings into the binary tender_vector column
+
+        Safe to re-run: only rows without a binary vector are converted. Returns the number of
+        converted rows.
+        """
+        dtype = dtype or self.embedding_dtype
+        converted = 0
+
+        with self.pool.connection() as connection:
+            try:
+                with connection.cursor() as cursor:
+                    # Check which columns exist
+                    cursor.execute("""
+                    SELECT column_name FROM information_schema.columns
+                    WHERE table_schema = %s AND table_name = 'tenders'
+                    """, (self.database,))
+                    columns = {row[0].lower() for row in cursor.fetchall()}
+
+                    if 'tender_vector' not in columns:
+                        cursor.execute("ALTER TABLE tenders ADD COLUMN tender_vector BLOB")
+
+                    if 'tender_embedding' in columns:
+                        # Convert in batches using keyset pagination on the primary key
+                        last_id = ''
+                        while True:
+                            cursor.execute("""
+                            SELECT id, tender_embedding FROM tenders
+                            WHERE id > %s AND tender_vector IS NULL AND tender_embedding IS NOT NULL
+                            ORDER BY id
+                            LIMIT %s
+                            """, (last_id, batch_size))
+                            rows = cursor.fetchall()
+                            if not rows:
+                                break
+
+                            updates = []
+                            for tender_id, embedding_json in rows:
+                                embedding = json.loads(embedding_json) if embedding_json else []
+                                if embedding:
+                                    updates.append((encode_vector(embedding, dtype), tender_id))
+
+                            if updates:
+                                cursor.executemany("UPDATE tenders SET tender_vector = %s WHERE id = %s", updates)
+                            connection.commit()
+
+                            converted += len(updates)
+                            last_id = rows[-1][0]
+                            print(f"Converted {converted} tender embeddings")
+
+                        if drop_json:
+                            cursor.execute("ALTER TABLE tenders DROP COLUMN tender_embedding")
+
+                connection.commit()
+                return converted
+
+            except Exception as e:
+                connection.rollback()
+                raise e
+
+    def get_feedback_by_query_id(self, query_id, with_timestamps=False):
         """Get positive and negative feedback for a query"""
-        try:
-            if not self.connect():
-                raise Exception("Failed to connect to database")
-
-            positive_embeddings = []
-            negative_embeddings = []
-
-            # Get positive feedback
-            query = """
-            SELECT t.tender_embedding 
-            FROM feedback f
-            JOIN tenders t ON f.tender_id = t.id
-            WHERE f.query_id = %s AND f.feedback_value = 'positive'
-            """
-            self.cursor.execute(query, (query_id,))
-            for row in self.cursor.fetchall():
-                embedding = json.loads(row[0]) if row[0] else []
-                if embedding:
-                    positive_embeddings.append(embedding)
-
-            # Get negative feedback
-            query = """
-            SELECT t.tender_embedding 
-            FROM feedback f
-            JOIN tenders t ON f.tender_id = t.id
-            WHERE f.query_id = %s AND f.feedback_value = 'negative'
-            """
-            self.cursor.execute(query, (query_id,))
-            for row in self.cursor.fetchall():
-                embedding = json.loads(row[0]) if row[0] else []
-                if embedding:
-                    negative_embeddings.append(embedding)
-
-            return positive_embeddings, negative_embeddings
-
-        except Exception as e:
-            raise e
-        finally:
-            self.disconnect()
+        with self.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(self.FEEDBACK_BY_QUERY_SQL, (query_id,))
+                return self.split_feedback_rows(cursor.fetchall(), with_timestamps)
 
-    def get_feedback_by_client_id(self, client_id):
+    def get_feedback_by_client_id(self, client_id, with_timestamps=False):
         """Get positive and negative feedback for a client"""
+        with self.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(self.FEEDBACK_BY_CLIENT_SQL, (client_id,))
+                return self.split_feedback_rows(cursor.fetchall(), with_timestamps)
+
+    @staticmethod
+    def split_aggregate_rows(rows):
+        """Turn (feedback_value, vector_sum, item_count) rows into positive and negative centroids
+
+        Each centroid is returned as a (1, dims) matrix, or (0, dims) without feedback, so the
+        result can be passed to the feedback combiners like the full feedback matrices.
+        """
+        centroids = {}
+        dims = 1536
+        for feedback_value, vector_sum, item_count in rows:
+            if vector_sum and item_count > 0:
+                centroids[feedback_value] = (decode_vector(vector_sum) / item_count).astype(np.float32)[np.newaxis, :]
+                dims = centroids[feedback_value].shape[1]
+        empty = np.empty((0, dims), dtype=np.float32)
+        return centroids.get('positive', empty), centroids.get('negative', empty)
+
+    def get_feedback_centroids_by_query_id(self, query_id):
+        """Get the positive and negative feedback centroids for a query from the aggregates"""
+        with self.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(self.FEEDBACK_AGGREGATES_SQL, ('query', query_id))
+                return self.split_aggregate_rows(cursor.fetchall())
+
+    def get_feedback_centroids_by_client_id(self, client_id):
+        """Get the positive and negative feedback centroids for a client from the aggregates"""
+        with self.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(self.FEEDBACK_AGGREGATES_SQL, ('client', client_id))
+                return self.split_aggregate_rows(cursor.fetchall())
+
+    def iter_expected_aggregates(self):
+        """Recompute the aggregates from the feedback table
+
+        Streams feedback ordered by query so that only one query's sums and the per-client sums
+        are held in memory. Yields ((scope, scope_id, feedback_value), vector_sum, item_count).
+        """
+        client_sums = {}
+
+        # Streamed over a dedicated connection rather than a pooled one: the callers hold a
+        # pooled connection meanwhile (a pool of one would deadlock), and an unbuffered cursor
+        # blocks its connection until the whole result is read
+        connection = self.create_connection()
         try:
-            if not self.connect():
-                raise Exception("Failed to connect to database")
-
-            positive_embeddings = []
-            negative_embeddings = []
-
-            # Get positive feedback
-            query = """
-            SELECT t.tender_embedding 
-            FROM feedback f
-            JOIN tenders t ON f.tender_id = t.id
-            JOIN search_queries sq ON f.query_id = sq.query_id
-            WHERE sq.client_id = %s AND f.feedback_value = 'positive'
-            """
-            self.cursor.execute(query, (client_id,))
-            for row in self.cursor.fetchall():
-                embedding = json.loads(row[0]) if row[0] else []
-                if embedding:
-                    positive_embeddings.append(embedding)
-
-            # Get negative feedback
-            query = """
-            SELECT t.tender_embedding 
-            FROM feedback f
-            JOIN tenders t ON f.tender_id = t.id
-            JOIN search_queries sq ON f.query_id = sq.query_id
-            WHERE sq.client_id = %s AND f.feedback_value = 'negative'
-            """
-            self.cursor.execute(query, (client_id,))
-            for row in self.cursor.fetchall():
-                embedding = json.loads(row[0]) if row[0] else []
-                if embedding:
-                    negative_embeddings.append(embedding)
-
-            return positive_embeddings, negative_embeddings
-
-        except Exception as e:
-            raise e
+            with connection.cursor(pymysql.cursors.SSCursor) as cursor:
+                cursor.execute("""
+                SELECT f.query_id, sq.client_id, f.feedback_value, t.tender_vector
+                FROM feedback f
+                JOIN tenders t ON f.tender_id = t.id
+                LEFT JOIN search_queries sq ON f.query_id = sq.query_id
+                WHERE t.tender_vector IS NOT NULL
+                ORDER BY f.query_id
+                """)
+
+                current_query = None
+                query_sums = {}
+                for query_id, client_id, feedback_value, blob in cursor:
+                    if query_id != current_query:
+                        for key, (vector_sum, count) in query_sums.items():
+                            yield key, vector_sum, count
+                        current_query = query_id
+                        query_sums = {}
+
+                    vector = decode_vector(blob).astype(np.float64)
+                    keys = [('query', query_id, feedback_value)]
+                    if client_id:
+                        keys.append(('client', client_id, feedback_value))
+                    for key in keys:
+                        sums = query_sums if key[0] == 'query' else client_sums
+                        vector_sum, count = sums.get(key, (None, 0))
+                        sums[key] = (vector if vector_sum is None else vector_sum + vector, count + 1)
+
+                for key, (vector_sum, count) in query_sums.items():
+                    yield key, vector_sum, count
         finally:
-            self.disconnect()
+            connection.close()
+
+        for key, (vector_sum, count) in client_sums.items():
+            yield key, vector_sum, count
+
+    def rebuild_feedback_aggregates(self, batch_size=1000):
+        """Backfill the feedback_aggregates table from the feedback table"""
+        rebuilt = 0
+        with self.pool.connection() as connection:
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute("DELETE FROM feedback_aggregates")
+
+                    batch = []
+                    for (scope, scope_id, feedback_value), vector_sum, count in self.iter_expected_aggregates():
+                        batch.append((scope, scope_id, feedback_value, encode_vector(vector_sum, "float64"), count))
+                        if len(batch) >= batch_size:
+                            cursor.executemany("""
+                            INSERT INTO feedback_aggregates (scope, scope_id, feedback_value, vector_sum, item_count)
+                            VALUES (%s, %s, %s, %s, %s)
+                            """, batch)
+                            rebuilt += len(batch)
+                            batch = []
+
+                    if batch:
+                        cursor.executemany("""
+                        INSERT INTO feedback_aggregates (scope, scope_id, feedback_value, vector_sum, item_count)
+                        VALUES (%s, %s, %s, %s, %s)
+                        """, batch)
+                        rebuilt += len(batch)
+
+                # Swap in the rebuilt aggregates in one transaction
+                connection.commit()
+                return rebuilt
+
+            except Exception as e:
+                connection.rollback()
+                raise e
+
+    def check_feedback_aggregates(self, tolerance=1e-4, batch_size=1000):
+        """Compare the stored aggregates with ones recomputed from the feedback table
+
+        Returns a report with the number of checked aggregates and the mismatching keys.
+        """
+        report = {"checked": 0, "missing": [], "count_mismatch": [], "sum_mismatch": [], "unexpected": 0}
+
+        def compare(cursor, expected):
+            conditions = " OR ".join(["(scope = %s AND scope_id = %s AND feedback_value = %s)"] * len(expected))
+            cursor.execute(
+                f"SELECT scope, scope_id, feedback_value, vector_sum, item_count FROM feedback_aggregates WHERE {conditions}",
+                [value for key in expected for value in key]
+            )
+            stored = {(scope, scope_id, feedback_value): (vector_sum, count) for scope, scope_id, feedback_value, vector_sum, count in cursor.fetchall()}
+            for key, (vector_sum, count) in expected.items():
+                report["checked"] += 1
+                if key not in stored:
+                    report["missing"].append(key)
+                elif stored[key][1] != count:
+                    report["count_mismatch"].append(key)
+                elif not np.allclose(decode_vector(stored[key][0]), vector_sum, atol=tolerance):
+                    report["sum_mismatch"].append(key)
+
+        with self.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                expected = {}
+                for key, vector_sum, count in self.iter_expected_aggregates():
+                    expected[key] = (vector_sum, count)
+                    if len(expected) >= batch_size:
+                        compare(cursor, expected)
+                        expected = {}
+                if expected:
+                    compare(cursor, expected)
+
+                # Stored non-empty aggregates without any matching feedback (empty ones are left behind by flips)
+                cursor.execute("SELECT COUNT(*) FROM feedback_aggregates WHERE item_count <> 0")
+                matched = report["checked"] - len(report["missing"])
+                report["unexpected"] = max(0, cursor.fetchone()[0] - matched)
+
+        report["consistent"] = not (report["missing"] or report["count_mismatch"] or report["sum_mismatch"] or report["unexpected"])
+        return report
+
+    def get_popular_search_queries(self, limit=1000):
+        """Get the most frequently submitted search queries"""
+        with self.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                query = """
+                SELECT search_query, COUNT(*) AS query_count
+                FROM search_queries
+                WHERE search_query IS NOT NULL AND search_query <> ''
+                GROUP BY search_query
+                ORDER BY query_count DESC
+                LIMIT %s
+                """
+                cursor.execute(query, (limit,))
+                return [row[0] for row in cursor.fetchall()]
+
+    def get_feedback_judgments(self, limit=None):
+        """Get (query_id, search_query, tender_id, feedback_value) rows for offline relevance evaluation"""
+        with self.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                query = """
+                SELECT sq.query_id, sq.search_query, f.tender_id, f.feedback_value
+                FROM search_queries sq
+                JOIN feedback f ON f.query_id = sq.query_id
+                WHERE sq.search_query IS NOT NULL AND sq.search_query <> ''
+                ORDER BY sq.query_id
+                """
+                if limit:
+                    query += " LIMIT %s"
+                    cursor.execute(query, (limit,))
+                else:
+                    cursor.execute(query)
+                return cursor.fetchall()
+
+    def store_saved_search(self, search_id, client_id, search_query, embedding, country_code=None, date_from=None, date_to=None, threshold=None):
+        """Insert or update a client's saved search with its query embedding and filters"""
+        with self.pool.connection() as connection:
+            try:
+                with connection.cursor() as cursor:
+                    query = """
+                    INSERT INTO saved_searches (search_id, client_id, search_query, query_vector, country_code, date_from, date_to, threshold)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                    ON DUPLICATE KEY UPDATE client_id = VALUES(client_id),
+                        search_query = VALUES(search_query),
+                        query_vector = VALUES(query_vector),
+                        country_code = VALUES(country_code),
+                        date_from = VALUES(date_from),
+                        date_to = VALUES(date_to),
+                        threshold = VALUES(threshold)
+                    """
+                    cursor.execute(query, (
+                        search_id, client_id, search_query, encode_vector(embedding, self.embedding_dtype),
+                        country_code, date_from, date_to, threshold
+                    ))
+
+                connection.commit()
+                return True
+
+            except Exception as e:
+                connection.rollback()
+                raise e
+
+    def delete_saved_search(self, search_id):
+        """Delete a saved search and its pending matches"""
+        with self.pool.connection() as connection:
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute("DELETE FROM saved_search_matches WHERE search_id = %s", (search_id,))
+                    cursor.execute("DELETE FROM saved_searches WHERE search_id = %s", (search_id,))
+                    deleted = cursor.rowcount > 0
+
+                connection.commit()
+                return deleted
+
+            except Exception as e:
+                connection.rollback()
+                raise e
+
+    def get_saved_searches(self, client_id=None):
+        """Get (search_id, client_id, search_query, country_code, date_from, date_to, threshold) rows, for one client or all"""
+        with self.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                query = """
+                SELECT search_id, client_id, search_query, country_code, date_from, date_to, threshold
+                FROM saved_searches
+                """
+                if client_id:
+                    cursor.execute(query + " WHERE client_id = %s ORDER BY created_at", (client_id,))
+                else:
+                    cursor.execute(query + " ORDER BY created_at")
+                return cursor.fetchall()
+
+    def get_saved_search_vectors(self):
+        """Get every saved search as (search_id, query_vector, country_code, date_from, date_to, threshold) rows"""
+        with self.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute("""
+                SELECT search_id, query_vector, country_code, date_from, date_to, threshold
+                FROM saved_searches
+                WHERE query_vector IS NOT NULL
+                """)
+                return cursor.fetchall()
+
+    def store_saved_search_matches(self, matches):
+        """Queue (search_id, tender_id, score) matches, ignoring tenders already matched by a search"""
+        if not matches:
+            return 0
+
+        with self.pool.connection() as connection:
+            try:
+                with connection.cursor() as cursor:
+                    query = """
+                    INSERT IGNORE INTO saved_search_matches (search_id, tender_id, score)
+                    VALUES (%s, %s, %s)
+                    """
+                    cursor.executemany(query, matches)
+                    stored = cursor.rowcount
+
+                connection.commit()
+                return stored
+
+            except Exception as e:
+                connection.rollback()
+                raise e
+
+    def get_saved_search_matches(self, client_id, after_id=0, limit=100):
+        """Get a client's queued matches with an id above after_id, oldest first
+
+        Returns (id, search_id, tender_id, score, matched_at) rows; pass the last id back as
+        after_id to read the queue incrementally.
+        """
+        with self.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                query = """
+                SELECT m.id, m.search_id, m.tender_id, m.score, m.matched_at
+                FROM saved_search_matches m
+                JOIN saved_searches s ON s.search_id = m.search_id
+                WHERE s.client_id = %s AND m.id > %s
+                ORDER BY m.id
+                LIMIT %s
+                """
+                cursor.execute(query, (client_id, after_id, limit))
+                return cursor.fetchall()
 
     def initialize_database(self):
         """Initialize database tables if they don't exist"""
-        try:
-            if not self.connect():
-                raise Exception("Failed to connect to database")
-
-            # Create search_queries table
-            query = """
-            CREATE TABLE IF NOT EXISTS search_queries (
-                query_id VARCHAR(36) PRIMARY KEY,
-                client_id VARCHAR(36),
-                search_query TEXT,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            """
-            self.cursor.execute(query)
-
-            # Create feedback table
-            query = """
-            CREATE TABLE IF NOT EXISTS feedback (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                query_id VARCHAR(36),
-                tender_id VARCHAR(36),
-                feedback_value ENUM('positive', 'negative'),
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE KEY unique_feedback (query_id, tender_id)
-            )
-            """
-            self.cursor.execute(query)
-
-            # Create tenders table
-            query = """
-            CREATE TABLE IF NOT EXISTS tenders (
-                id VARCHAR(36) PRIMARY KEY,
-                tender_title TEXT,
-                tender_description TEXT,
-                tender_embedding JSON,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            """
-            self.cursor.execute(query)
+        with self.pool.connection() as connection:
+            try:
+                with connection.cursor() as cursor:
+                    # Create search_queries table
+                    query = """
+                    CREATE TABLE IF NOT EXISTS search_queries (
+                        query_id VARCHAR(36) PRIMARY KEY,
+                        client_id VARCHAR(36),
+                        search_query TEXT,
+                        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        KEY idx_search_queries_client (client_id)
+                    )
+                    """
+                    cursor.execute(query)
 
-            self.connection.commit()
-            return True
+                    # Create feedback table
+                    query = """
+                    CREATE TABLE IF NOT EXISTS feedback (
+                        id INT AUTO_INCREMENT PRIMARY KEY,
+                        query_id VARCHAR(36),
+                        tender_id VARCHAR(36),
+                        feedback_value ENUM('positive', 'negative'),
+                        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        UNIQUE KEY unique_feedback (query_id, tender_id),
+                        KEY idx_feedback_query_value (query_id, feedback_value, tender_id),
+                        KEY idx_feedback_tender (tender_id)
+                    )
+                    """
+                    cursor.execute(query)
 
-        except Exception as e:
-            if self.connection:
-                self.connection.rollback()
-            raise e
-        finally:
-            self.disconnect()
+                    # Create tenders table
+                    query = """
+                    CREATE TABLE IF NOT EXISTS tenders (
+                        id VARCHAR(36) PRIMARY KEY,
+                        tender_title TEXT,
+                        tender_description TEXT,
+                        tender_vector BLOB,
+                        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                    """
+                    cursor.execute(query)
+
+                    # Create feedback aggregates table
+                    query = """
+                    CREATE TABLE IF NOT EXISTS feedback_aggregates (
+                        scope ENUM('query', 'client') NOT NULL,
+                        scope_id VARCHAR(36) NOT NULL,
+                        feedback_value ENUM('positive', 'negative') NOT NULL,
+                        vector_sum BLOB,
+                        item_count INT NOT NULL DEFAULT 0,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                        PRIMARY KEY (scope, scope_id, feedback_value)
+                    )
+                    """
+                    cursor.execute(query)
+
+                    # Create saved searches table (percolated against newly indexed tenders)
+                    query = """
+                    CREATE TABLE IF NOT EXISTS saved_searches (
+                        search_id VARCHAR(36) PRIMARY KEY,
+                        client_id VARCHAR(36),
+                        search_query TEXT,
+                        query_vector BLOB,
+                        country_code VARCHAR(64),
+                        date_from VARCHAR(32),
+                        date_to VARCHAR(32),
+                        threshold FLOAT,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        KEY idx_saved_searches_client (client_id)
+                    )
+                    """
+                    cursor.execute(query)
+
+                    # Create saved search matches table (queue of alerts per saved search)
+                    query = """
+                    CREATE TABLE IF NOT EXISTS saved_search_matches (
+                        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+                        search_id VARCHAR(36) NOT NULL,
+                        tender_id VARCHAR(36) NOT NULL,
+                        score FLOAT,
+                        matched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        UNIQUE KEY unique_saved_search_match (search_id, tender_id)
+                    )
+                    """
+                    cursor.execute(query)
+
+                    # Add secondary indexes missing from tables created by older versions
+                    for table, index_name, columns in self.SECONDARY_INDEXES:
+                        self.ensure_index(cursor, table, index_name, columns)
+
+                connection.commit()
+                return True
+
+            except Exception as e:
+                connection.rollback()
+                raise e
+
+    def ensure_index(self, cursor, table, index_name, columns):
+        """Create an index unless it already exists (MySQL has no CREATE INDEX IF NOT EXISTS)"""
+        cursor.execute("""
+        SELECT 1 FROM information_schema.statistics
+        WHERE table_schema = %s AND table_name = %s AND index_name = %s
+        LIMIT 1
+        """, (self.database, table, index_name))
+        if cursor.fetchone() is None:
+            cursor.execute(f"CREATE INDEX {index_name} ON {table} ({columns})")
@@ -1,9 +1,42 @@
-from elasticsearch import Elasticsearch
+from elasticsearch import Elasticsearch, NotFoundError, helpers
 import os
 import json
+import base64
+import copy
 import math
+import time
+import threading
+import uuid
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from app.utils.local_index import LocalIndexStore, LocalVectorIndex
+from app.utils.metrics import metrics
+from app.utils.single_flight import SingleFlight
+from app.utils.vector_projection import VectorProjection
 
 class ElasticHandler:
+    VECTOR_FIELDS = ["eMainCategoryName1_vector", "eMainCategoryName2_vector", "eMainCategoryName3_vector"]
+    
+    # Document layouts of the category vectors: one field per category ("separate"), one
+    # nested field holding every category vector ("nested", scored by max-sim), or a single
+    # mean of the category vectors ("pooled")
+    VECTOR_LAYOUTS = ["separate", "nested", "pooled"]
+    NESTED_VECTOR_PATH = "category_vectors"
+    NESTED_VECTOR_FIELD = "category_vectors.vector"
+    POOLED_VECTOR_FIELD = "category_vector"
+    
+    # Hashes of the embedding inputs and of the other fields of a tender, compared by incremental syncs
+    FINGERPRINT_MAPPINGS = {
+        "embedding_fingerprint": {"type": "keyword"},
+        "document_fingerprint": {"type": "keyword"}
+    }
+    
+    # Deepest result reachable by page number: index.max_result_window for from/size paging and
+    # the largest k of a kNN search
+    MAX_RESULT_WINDOW = 10000
+    
+    DEFAULT_RESULT_COLUMNS = ["ID", "eTitle", "eDescription", "ePublisherCountryName", "ePublicationDate", "eDeadlineDate"]
+    
     def __init__(self):
         self.es_host = os.getenv('ELASTICSEARCH_HOST', 'localhost')
         self.es_port = os.getenv('ELASTICSEARCH_PORT', '9200')
@@ -11,6 +44,85 @@ class ElasticHandler:
         self.es_password = os.getenv('ELASTICSEARCH_PASSWORD', '')
         self.index_name = os.getenv('ELASTICSEARCH_INDEX', 'tenders')
         
+        # Vector search settings ("exact" for script scoring, "knn" for approximate HNSW retrieval)
+        self.search_mode = os.getenv('ELASTICSEARCH_SEARCH_MODE', 'exact')
+        self.knn_k = int(os.getenv('ELASTICSEARCH_KNN_K', '100'))
+        self.knn_num_candidates = int(os.getenv('ELASTICSEARCH_KNN_NUM_CANDIDATES', '500'))
+        
+        # Rescore the kNN candidates with the exact cosine script (not for the nested layout)
+        self.knn_rescore = os.getenv('ELASTICSEARCH_KNN_RESCORE', 'false').lower() == 'true'
+        
+        # Hybrid search: BM25 on title/description fused with the kNN ranking ("rrf" or "weighted")
+        self.hybrid_fusion = os.getenv('HYBRID_FUSION', 'rrf')
+        self.hybrid_lexical_weight = float(os.getenv('HYBRID_LEXICAL_WEIGHT', '0.5'))
+        self.hybrid_rrf_k = int(os.getenv('HYBRID_RRF_K', '60'))
+        
+        # How long a point-in-time used for cursor pagination stays open between pages
+        self.pit_keep_alive = os.getenv('ELASTICSEARCH_PIT_KEEP_ALIVE', '5m')
+        
+        # Bulk ingest settings
+        self.bulk_chunk_size = int(os.getenv('ELASTICSEARCH_BULK_CHUNK_SIZE', '500'))
+        self.bulk_max_chunk_bytes = int(os.getenv('ELASTICSEARCH_BULK_MAX_BYTES', str(10 * 1024 * 1024)))
+        self.bulk_workers = int(os.getenv('ELASTICSEARCH_BULK_WORKERS', '4'))
+        self.bulk_max_retries = int(os.getenv('ELASTICSEARCH_BULK_MAX_RETRIES', '5'))
+        
+        # Vector profile used when creating an index: HNSW storage type ("hnsw", "int8_hnsw",
+        # "int4_hnsw") and an optional projection to fewer dimensions ("truncate" or "pca")
+        self.vector_index_type = os.getenv('ELASTICSEARCH_VECTOR_INDEX_TYPE', 'hnsw')
+        self.vector_projection_method = os.getenv('ELASTICSEARCH_VECTOR_PROJECTION', 'none')
+        self.vector_dims = int(os.getenv('ELASTICSEARCH_VECTOR_DIMS', '1536'))
+        self.vector_projection_path = os.getenv('ELASTICSEARCH_VECTOR_PROJECTION_PATH', '.cache/vector_projection.npz')
+        self.vector_layout = os.getenv('ELASTICSEARCH_VECTOR_LAYOUT', 'separate')
+        
+        # Projection and layout of the live index, read from its mapping _meta (PCA components
+        # from the profile index). They are rechecked every ELASTICSEARCH_PROFILE_CHECK_INTERVAL
+        # seconds so that workers follow an alias moved by reindex_tenders.py; a failed read is
+        # retried after ELASTICSEARCH_PROFILE_RETRY_INTERVAL seconds.
+        self.profile_index = os.getenv('ELASTICSEARCH_PROFILE_INDEX', 'tender_vector_profiles')
+        self.profile_check_interval = float(os.getenv('ELASTICSEARCH_PROFILE_CHECK_INTERVAL', '30'))
+        self.profile_retry_interval = float(os.getenv('ELASTICSEARCH_PROFILE_RETRY_INTERVAL', '5'))
+        self.profile_lock = threading.Lock()
+        self.profile_indices = None
+        self.profile_checked_at = None
+        self.profile_loaded = False
+        self.projection = None
+        self.layout = None
+        
+        # Concrete indices and index_version last seen in the mapping _meta: writers publish a
+        # new version (publish_index_version) and other processes drop cached results on change
+        self.index_version = None
+        
+        # Each publication rewrites every mapping, so changes within this many seconds of the
+        # last one are published together when the interval ends
+        self.index_version_interval = float(os.getenv('INDEX_VERSION_PUBLISH_INTERVAL', '5'))
+        self.index_version_published_at = None
+        self.index_version_timer = None
+        self.index_version_lock = threading.Lock()
+        
+        # The async app refreshes the profile off the event loop instead (AsyncSearchService)
+        self.profile_refresh_inline = True
+        
+        # Optional in-process vector index (LOCAL_INDEX_PATH): the search backend with
+        # SEARCH_BACKEND=local, otherwise a degraded-mode fallback when Elasticsearch fails
+        self.search_backend = os.getenv('SEARCH_BACKEND', 'elasticsearch')
+        self.local_index_path = os.getenv('LOCAL_INDEX_PATH', '')
+        self.local_index_store = None
+        if self.local_index_path:
+            self.local_index_store = LocalIndexStore(
+                self.local_index_path,
+                reload_interval=float(os.getenv('LOCAL_INDEX_RELOAD_INTERVAL', '30')),
+                nprobe=int(os.getenv('LOCAL_INDEX_NPROBE', '8'))
+            )
+        
+        # Concurrent identical ranked searches share one request
+        self.single_flight = SingleFlight()
+        
+        # Callbacks run after the index is modified (e.g. to invalidate cached results)
+        self.index_listeners = []
+        
+        # Callbacks receiving each batch of newly indexed tenders (e.g. saved-search matching)
+        self.ingest_listeners = []
+        
         # Initialize Elasticsearch client
         if self.es_user and self.es_password:
             self.es = Elasticsearch(
@@ -20,52 +132,138 @@ class ElasticHandler:
         else:
             self.es = Elasticsearch([f"http://{self.es_host}:{self.es_port}"])
     
+    def add_index_listener(self, listener):
+        """Register a callback invoked whenever tenders are indexed or deleted"""
+        self.index_listeners.append(listener)
+    
+    def notify_index_changed(self):
+        """Publish a new index version for the other processes and run the local index listeners"""
+        self.schedule_index_version()
+        self.run_index_listeners()
+    
+    def schedule_index_version(self):
+        """Publish a new index version now, or once the publish interval since the last one ends"""
+        with self.index_version_lock:
+            if self.index_version_timer is not None:
+                # Already pending: that publication covers this change too
+                return
+            now = time.monotonic()
+            if self.index_version_published_at is not None:
+                wait = self.index_version_published_at + self.index_version_interval - now
+                if wait > 0:
+                    self.index_version_timer = threading.Timer(wait, self.flush_index_version)
+                    self.index_version_timer.start()
+                    return
+            self.index_version_published_at = now
+        self.publish_index_version()
+    
+    def flush_index_version(self):
+        """Publish a pending index version right away (e.g. at the end of an ingest run)"""
+        with self.index_version_lock:
+            if self.index_version_timer is None:
+                return
+            self.index_version_timer.cancel()
+            self.index_version_timer = None
+            self.index_version_published_at = time.monotonic()
+        self.publish_index_version()
+    
+    def run_index_listeners(self):
+        """Run the index listeners"""
+        for listener in self.index_listeners:
+            try:
+                listener()
+            except Exception as e:
+                print(f"Error notifying index listener: {e}")
+    
+    def add_ingest_listener(self, listener):
+        """Register a callback invoked with every batch of tenders indexed, before projection"""
+        self.ingest_listeners.append(listener)
+    
+    def notify_tenders_indexed(self, tenders):
+        """Run the ingest listeners on newly indexed tenders"""
+        if not tenders:
+            return
+        for listener in self.ingest_listeners:
+            try:
+                listener(tenders)
+            except Exception as e:
+                print(f"Error notifying ingest listener: {e}")
+    
+    def default_projection(self):
+        """Projection configured through the environment for newly created indices"""
+        if self.vector_projection_method == "pca":
+            return VectorProjection.load(self.vector_projection_path)
+        if self.vector_projection_method == "truncate":
+            return VectorProjection("truncate", self.vector_dims)
+        return VectorProjection()
+    
+    def vector_mappings(self, dims, index_type, layout):
+        """Mapping properties of the category vectors for a layout"""
+        vector_mapping = {
+            "type": "dense_vector",
+            "dims": dims,
+            "index": True,
+            "similarity": "cosine"
+        }
+        # Quantized HNSW keeps int8/int4 copies of the vectors in memory
+        if index_type != "hnsw":
+            vector_mapping["index_options"] = {"type": index_type}
+        
+        if layout == "nested":
+            return {self.NESTED_VECTOR_PATH: {"type": "nested", "properties": {"vector": vector_mapping}}}
+        if layout == "pooled":
+            return {self.POOLED_VECTOR_FIELD: vector_mapping}
+        if layout == "separate":
+            return {field: dict(vector_mapping) for field in self.VECTOR_FIELDS}
+        raise ValueError(f"Unknown vector layout: {layout}")
+    
+    def index_body(self, index_type=None, projection=None, layout=None):
+        """Mappings and settings of a tender index with the given vector profile"""
+        index_type = index_type or self.vector_index_type
+        projection = projection or self.default_projection()
+        layout = layout or self.vector_layout
+        
+        properties = {
+            "ID": {"type": "keyword"},
+            "eMainCategoryName1": {"type": "text"},
+            "eMainCategoryName2": {"type": "text"},
+            "eMainCategoryName3": {"type": "text"},
+            "ePublisherCountryName": {"type": "keyword"},
+            "ePublicationDate": {"type": "date", "format": "yyyy-MM-dd HH:mm:ss||yyyy-MM-dd||epoch_millis"},
+            "eTitle": {"type": "text"},
+            "eDescription": {"type": "text"},
+            "eDeadlineDate": {"type": "date", "format": "yyyy-MM-dd HH:mm:ss||yyyy-MM-dd||epoch_millis"}
+        }
+        
+        # Change detection for incremental syncs
+        properties.update(self.FINGERPRINT_MAPPINGS)
+        
+        # Dense vectors for embeddings
+        properties.update(self.vector_mappings(projection.dims, index_type, layout))
+        
+        return {
+            "mappings": {
+                # The profile is stored with the index so that documents and queries are prepared the same way
+                "_meta": {"vector_profile": {"index_type": index_type, "layout": layout, "projection": projection.to_meta()}},
+                "properties": properties
+            },
+            "settings": {
+                "number_of_shards": 1,
+                "number_of_replicas": 0
+            }
+        }
+    
     def create_index(self):
         """Create the Elasticsearch index with mappings if it doesn't exist"""
         try:
             if not self.es.indices.exists(index=self.index_name):
-                # Define index mappings
-                mappings = {
-                    "mappings": {
-                        "properties": {
-                            "ID": {"type": "keyword"},
-                            "eMainCategoryName1": {"type": "text"},
-                            "eMainCategoryName2": {"type": "text"},
-                            "eMainCategoryName3": {"type": "text"},
-                            "ePublisherCountryName": {"type": "keyword"},
-                            "ePublicationDate": {"type": "date", "format": "yyyy-MM-dd HH:mm:ss||yyyy-MM-dd||epoch_millis"},
-                            "eTitle": {"type": "text"},
-                            "eDescription": {"type": "text"},
-                            "eDeadlineDate": {"type": "date", "format": "yyyy-MM-dd HH:mm:ss||yyyy-MM-dd||epoch_millis"},
-                            # Dense vectors for embeddings
-                            "eMainCategoryName1_vector": {
-                                "type": "dense_vector",
-                                "dims": 1536,
-                                "index": True,
-                                "similarity": "cosine"
-                            },
-                            "eMainCategoryName2_vector": {
-                                "type": "dense_vector",
-                                "dims": 1536,
-                                "index": True,
-                                "similarity": "cosine"
-                            },
-                            "eMainCategoryName3_vector": {
-                                "type": "dense_vector",
-                                "dims": 1536,
-                                "index": True,
-                                "similarity": "cosine"
-                            }
-                        }
-                    },
-                    "settings": {
-                        "number_of_shards": 1,
-                        "number_of_replicas": 0
-                    }
-                }
+                projection = self.default_projection()
                 
                 # Create the index
-                self.es.indices.create(index=self.index_name, body=mappings)
+                self.es.indices.create(index=self.index_name, body=self.index_body(projection=projection))
+                self.store_projection(self.index_name, projection)
+                self.projection = projection
+                self.layout = self.vector_layout
                 return True
             return False
             
@@ -73,6 +271,188 @@ class ElasticHandler:
             print(f"Error creating index: {e}")
             return False
     
+    def store_projection(self, index, projection):
+        """Keep the PCA components of an index in the profile index, next to its mapping _meta"""
+        if projection.method != "pca":
+            return
+        if not self.es.indices.exists(index=self.profile_index):
+            self.es.indices.create(index=self.profile_index, body={"mappings": {"enabled": False}})
+        self.es.index(index=self.profile_index, id=index, document=projection.to_document(), refresh=True)
+    
+    def read_projection(self, index, meta):
+        """Rebuild the projection of an index from its _meta and, for PCA, the profile index"""
+        if meta.get("method") != "pca" or meta.get("path"):
+            return VectorProjection.from_meta(meta)
+        try:
+            document = self.es.get(index=self.profile_index, id=index)["_source"]
+        except NotFoundError:
+            raise ValueError(f"PCA components of {index} are missing from {self.profile_index}")
+        return VectorProjection.from_meta(meta, document)
+    
+    def profile_is_stale(self):
+        """Whether the vector profile is due for a (re)check"""
+        if self.profile_checked_at is None:
+            return True
+        interval = self.profile_check_interval if self.profile_loaded else self.profile_retry_interval
+        return time.monotonic() - self.profile_checked_at >= interval
+    
+    def ensure_vector_profile(self):
+        """Reload the vector profile and index version if they are due, once for all threads"""
+        if not self.profile_is_stale():
+            return
+        with self.profile_lock:
+            if self.profile_is_stale():
+                self._read_vector_profile()
+    
+    def load_vector_profile(self, strict=False):
+        """Read the projection and layout of the live index from its mapping _meta
+        
+        Indices without a vector profile use the original layout: separate full-dimension fields.
+        Returns False if the profile could not be read; the previous profile is then kept. With
+        strict (at startup), a profile that cannot be rebuilt raises ValueError.
+        """
+        with self.profile_lock:
+            return self._read_vector_profile(strict)
+    
+    def _read_vector_profile(self, strict=False):
+        """load_vector_profile with the profile lock held"""
+        self.profile_checked_at = time.monotonic()
+        try:
+            try:
+                mappings = self.es.indices.get_mapping(index=self.index_name)
+            except NotFoundError:
+                # The index will be created with the configured profile
+                self.projection = self.default_projection()
+                self.layout = self.vector_layout
+                self.profile_indices = None
+                self.check_index_version({})
+                self.profile_loaded = True
+                return True
+            
+            # Drop cached results when another process changed the index or moved the alias
+            self.check_index_version(mappings)
+            
+            # The components only need to be read again when the alias moved to another index
+            indices = sorted(mappings)
+            if indices != self.profile_indices or self.projection is None:
+                profile = mappings[indices[-1]]["mappings"].get("_meta", {}).get("vector_profile", {}) if indices else {}
+                self.projection = self.read_projection(indices[-1] if indices else None, profile.get("projection", {}))
+                self.layout = profile.get("layout", "separate")
+                self.profile_indices = indices
+            self.profile_loaded = True
+            return True
+            
+        except ValueError as e:
+            print(f"Error loading index profile: {e}")
+            self.profile_loaded = False
+            if strict:
+                raise
+            return False
+        except Exception as e:
+            print(f"Error reading index profile: {e}")
+            self.profile_loaded = False
+            return False
+    
+    @staticmethod
+    def index_version_of(mappings):
+        """Version of the live index: its concrete indices and the index_version in their _meta"""
+        return tuple((index, mappings[index]["mappings"].get("_meta", {}).get("index_version")) for index in sorted(mappings))
+    
+    def publish_index_version(self):
+        """Store a new random index_version in the mapping _meta (keeping the vector profile)
+        
+        Serving processes compare it on their periodic profile check and drop their cached
+        results when it changed. Random versions cannot collide when two writers race.
+        """
+        try:
+            mappings = self.es.indices.get_mapping(index=self.index_name)
+            version = uuid.uuid4().hex
+            for index, mapping in mappings.items():
+                meta = dict(mapping["mappings"].get("_meta", {}), index_version=version)
+                self.es.indices.put_mapping(index=index, meta=meta)
+                mapping["mappings"]["_meta"] = meta
+            
+            # This process already knows about its own change
+            self.index_version = self.index_version_of(mappings)
+        except Exception as e:
+            print(f"Error publishing index version: {e}")
+    
+    def check_index_version(self, mappings):
+        """Run the index listeners if the index version differs from the last one seen"""
+        version = self.index_version_of(mappings)
+        if self.index_version is not None and version != self.index_version:
+            self.run_index_listeners()
+        self.index_version = version
+    
+    def get_projection(self):
+        """Return the projection of the live index"""
+        if self.profile_refresh_inline:
+            self.ensure_vector_profile()
+        if self.projection is None:
+            # Nothing could be read yet: assume the configured profile
+            try:
+                return self.default_projection()
+            except Exception:
+                return VectorProjection()
+        return self.projection
+    
+    def get_layout(self):
+        """Return the vector layout of the live index"""
+        if self.profile_refresh_inline:
+            self.ensure_vector_profile()
+        if self.layout is None:
+            return self.vector_layout
+        return self.layout
+    
+    def vector_search_fields(self, layout=None):
+        """Fields searched with kNN for a layout"""
+        layout = layout or self.get_layout()
+        if layout == "nested":
+            return [self.NESTED_VECTOR_FIELD]
+        if layout == "pooled":
+            return [self.POOLED_VECTOR_FIELD]
+        return self.VECTOR_FIELDS
+    
+    def project_query(self, query_embedding):
+        """Project a query embedding into the vector space of the index"""
+        projection = self.get_projection()
+        if projection.method == "none":
+            return query_embedding
+        return projection.project(query_embedding)
+    
+    def project_tender(self, tender_data):
+        """Return the tender with its category vectors projected and laid out for the index"""
+        projection = self.get_projection()
+        layout = self.get_layout()
+        if projection.method == "none" and layout == "separate":
+            return tender_data
+        
+        tender_data = dict(tender_data)
+        fields = [field for field in self.VECTOR_FIELDS if tender_data.get(field) is not None]
+        if not fields:
+            return tender_data
+        vectors = projection.project([tender_data.pop(field) for field in fields])
+        
+        if layout == "separate":
+            for field, vector in zip(fields, vectors):
+                tender_data[field] = vector.tolist()
+            return tender_data
+        
+        # The other layouts replace the per-category fields
+        for field in self.VECTOR_FIELDS:
+            tender_data.pop(field, None)
+        
+        if layout == "nested":
+            tender_data[self.NESTED_VECTOR_PATH] = [{"vector": vector.tolist()} for vector in vectors]
+        else:
+            # Mean of the category vectors, re-normalized for cosine similarity
+            pooled = vectors.mean(axis=0)
+            norm = np.linalg.norm(pooled)
+            if norm > 0:
+                pooled /= norm
+            tender_data[self.POOLED_VECTOR_FIELD] = pooled.tolist()
+        return tender_data
+    
     def index_tender(self, tender_data):
         """Index a tender document with its embeddings"""
         try:
@@ -83,139 +463,987 @@ class ElasticHandler:
             self.es.index(
                 index=self.index_name,
                 id=tender_data['ID'],
-                document=tender_data
+                document=self.project_tender(tender_data)
             )
+            self.notify_index_changed()
+            self.notify_tenders_indexed([tender_data])
             return True
             
         except Exception as e:
             print(f"Error indexing tender: {e}")
             return False
     
-    def search_tenders(self, query_embedding, result_columns=None, country_code=None, date_from=None, date_to=None, page=1, page_size=10):
-        """Search for tenders using vector similarity and filters"""
-        try:
-            # Default result columns if none provided
-            if not result_columns:
-                result_columns = ["ID", "eTitle", "eDescription", "ePublisherCountryName", "ePublicationDate", "eDeadlineDate"]
-            
-            # Build the query
+    def _build_filters(self, country_code=None, date_from=None, date_to=None):
+        """Build the country and publication date filters shared by all search modes"""
+        filters = []
+        
+        # Add country filter if provided
+        if country_code:
+            filters.append({"term": {"ePublisherCountryName": country_code}})
+        
+        # Add date range filter if provided
+        if date_from or date_to:
+            date_filter = {"range": {"ePublicationDate": {}}}
+            if date_from:
+                date_filter["range"]["ePublicationDate"]["gte"] = date_from
+            if date_to:
+                date_filter["range"]["ePublicationDate"]["lte"] = date_to
+            filters.append(date_filter)
+        
+        return filters
+    
+    def _max_cosine_script(self, fields, knn_scale=False):
+        """Painless source returning the highest cosine similarity over the vector fields (0 if none is set)
+        
+        With knn_scale the score is reported like a kNN hit, (1 + cosine) / 2, so that rescored
+        hits are merged like plain kNN ones.
+        """
+        source = "double max_score = 0;\n"
+        for field in fields:
+            source += (
+                f"if (doc.containsKey('{field}') && !doc['{field}'].empty) {{\n"
+                f"    max_score = Math.max(max_score, cosineSimilarity(params.query_vector, '{field}'));\n"
+                f"}}\n"
+            )
+        if knn_scale:
+            return source + "return (1 + max_score) / 2;"
+        return source + "return max_score;"
+    
+    def _build_script_query(self, query_embedding, result_columns, filters, page, page_size):
+        """Build the exact (brute-force) script_score query over all category vectors"""
+        if self.get_layout() == "nested":
+            # Max-sim over the nested category vectors; documents without any still match the filters
             query = {
-                "size": page_size,
-                "from": (page - 1) * page_size,
-                "query": {
-                    "function_score": {
-                        "query": {
-                            "bool": {
-                                "must": [],
-                                "filter": []
-                            }
-                        },
-                        "functions": [
-                            {
-                                "script_score": {
-                                    "script": {
-                                        "source": """
-                                        double max_score = 0;
-                                        if (doc.containsKey('eMainCategoryName1_vector') && !doc['eMainCategoryName1_vector'].empty) {
-                                            double score = cosineSimilarity(params.query_vector, 'eMainCategoryName1_vector');
-                                            max_score = Math.max(max_score, score);
-                                        }
-                                        if (doc.containsKey('eMainCategoryName2_vector') && !doc['eMainCategoryName2_vector'].empty) {
-                                            double score = cosineSimilarity(params.query_vector, 'eMainCategoryName2_vector');
-                                            max_score = Math.max(max_score, score);
-                                        }
-                                        if (doc.containsKey('eMainCategoryName3_vector') && !doc['eMainCategoryName3_vector'].empty) {
-                                            double score = cosineSimilarity(params.query_vector, 'eMainCategoryName3_vector');
-                                            max_score = Math.max(max_score, score);
-                                        }
-                                        return max_score;
-                                        """,
-                                        "params": {
-                                            "query_vector": query_embedding
+                "bool": {
+                    "should": [
+                        {
+                            "nested": {
+                                "path": self.NESTED_VECTOR_PATH,
+                                "score_mode": "max",
+                                "query": {
+                                    "script_score": {
+                                        "query": {"match_all": {}},
+                                        "script": {
+                                            "source": f"Math.max(0, cosineSimilarity(params.query_vector, '{self.NESTED_VECTOR_FIELD}'))",
+                                            "params": {"query_vector": query_embedding}
                                         }
                                     }
                                 }
                             }
-                        ],
-                        "boost_mode": "replace"
-                    }
-                },
-                "_source": result_columns
+                        }
+                    ],
+                    "filter": filters
+                }
             }
+        else:
+            query = {
+                "function_score": {
+                    "query": {
+                        "bool": {
+                            "must": [],
+                            "filter": filters
+                        }
+                    },
+                    "functions": [
+                        {
+                            "script_score": {
+                                "script": {
+                                    "source": self._max_cosine_script(self.vector_search_fields()),
+                                    "params": {
+                                        "query_vector": query_embedding
+                                    }
+                                }
+                            }
+                        }
+                    ],
+                    "boost_mode": "replace"
+                }
+            }
+        
+        return {
+            "size": page_size,
+            "from": (page - 1) * page_size,
+            "query": query,
+            "_source": result_columns
+        }
+    
+    def _build_knn_searches(self, query_embedding, result_columns, filters, k):
+        """Build one approximate kNN search per vector field for a multi-search request
+        
+        The nested and pooled layouts need a single search: kNN on a nested field already
+        scores each tender by its closest category vector.
+        """
+        num_candidates = min(max(self.knn_num_candidates, k), self.MAX_RESULT_WINDOW)
+        
+        if self.knn_rescore and self.get_layout() != "nested":
+            return self._build_rescored_knn_search(query_embedding, result_columns, filters, k, num_candidates)
+        
+        searches = []
+        for field in self.vector_search_fields():
+            knn = {
+                "field": field,
+                "query_vector": query_embedding,
+                "k": k,
+                "num_candidates": num_candidates
+            }
+            # Filters are applied as a kNN pre-filter so that k results survive filtering
+            if filters:
+                knn["filter"] = filters
             
-            # Add country filter if provided
-            if country_code:
-                query["query"]["function_score"]["query"]["bool"]["filter"].append({
-                    "term": {"ePublisherCountryName": country_code}
-                })
-            
-            # Add date range filter if provided
-            if date_from or date_to:
-                date_filter = {"range": {"ePublicationDate": {}}}
-                if date_from:
-                    date_filter["range"]["ePublicationDate"]["gte"] = date_from
-                if date_to:
-                    date_filter["range"]["ePublicationDate"]["lte"] = date_to
+            searches.append({})
+            searches.append({
+                "size": k,
+                "knn": knn,
+                "_source": result_columns
+            })
+        
+        return searches
+    
+    def _build_rescored_knn_search(self, query_embedding, result_columns, filters, k, num_candidates):
+        """Build one search scoring the union of the per-field kNN candidates with the exact script
+        
+        The approximate HNSW scores only select the candidates; the top k are ranked by the same
+        max cosine similarity as the exact mode, in a single request.
+        """
+        fields = self.vector_search_fields()
+        candidates = []
+        for field in fields:
+            knn = {"field": field, "query_vector": query_embedding, "num_candidates": num_candidates}
+            if filters:
+                knn["filter"] = filters
+            candidates.append({"knn": knn})
+        
+        query = {
+            "script_score": {
+                "query": {"bool": {"should": candidates, "minimum_should_match": 1, "filter": filters}},
+                "script": {
+                    "source": self._max_cosine_script(fields, knn_scale=True),
+                    "params": {"query_vector": query_embedding}
+                }
+            }
+        }
+        return [{}, {"size": k, "query": query, "_source": result_columns}]
+    
+    def _build_lexical_search(self, query_text, result_columns, filters, k):
+        """Build the BM25 search on title and description that is fused with the kNN ranking"""
+        query = {
+            "bool": {
+                "must": {
+                    "multi_match": {
+                        "query": query_text,
+                        "fields": ["eTitle^2", "eDescription"]
+                    }
+                }
+            }
+        }
+        if filters:
+            query["bool"]["filter"] = filters
+        return [{}, {"size": k, "query": query, "_source": result_columns}]
+    
+    def _build_count_search(self, filters):
+        """Count the tenders matching the filters: kNN only returns k hits, so it has no total of its own"""
+        return [{}, {"size": 0, "track_total_hits": True, "query": {"bool": {"filter": filters}}}]
+    
+    def _fuse_rankings(self, vector_hits, lexical_hits, lexical_weight=None):
+        """Fuse the kNN and BM25 rankings, by reciprocal rank (rrf) or by weighted normalized scores
+        
+        lexical_weight is the share of the BM25 ranking (0 keeps the vector ranking, 1 the BM25 one).
+        """
+        lexical_weight = self.hybrid_lexical_weight if lexical_weight is None else float(lexical_weight)
+        weights = [1 - lexical_weight, lexical_weight]
+        
+        # BM25 scores are unbounded; scale them by the best one for weighted fusion
+        max_lexical_score = max((hit["_score"] for hit in lexical_hits), default=0) or 1
+        
+        fused = {}
+        for ranking, (hits, weight) in enumerate(zip([vector_hits, lexical_hits], weights)):
+            for rank, hit in enumerate(hits):
+                if self.hybrid_fusion == "rrf":
+                    score = weight / (self.hybrid_rrf_k + rank + 1)
+                else:
+                    score = weight * (hit["_score"] / max_lexical_score if ranking else hit["_score"])
                 
-                query["query"]["function_score"]["query"]["bool"]["filter"].append(date_filter)
+                current = fused.get(hit["_id"])
+                if current is None:
+                    fused[hit["_id"]] = {"_id": hit["_id"], "_score": score, "_source": hit["_source"]}
+                else:
+                    current["_score"] += score
+        
+        return sorted(fused.values(), key=lambda hit: hit["_score"], reverse=True)
+    
+    def _merge_knn_responses(self, responses):
+        """Merge per-vector kNN hits by taking the maximum cosine similarity for each tender"""
+        merged = {}
+        for response in responses:
+            if "error" in response:
+                raise Exception(response["error"])
             
-            # Execute the search
-            response = self.es.search(index=self.index_name, body=query)
+            for hit in response["hits"]["hits"]:
+                # The cosine similarity is reported as (1 + cosine) / 2, convert it back so
+                # that scores match the exact script (which clamps at 0)
+                score = max(0.0, 2 * hit["_score"] - 1)
+                current = merged.get(hit["_id"])
+                if current is None or score > current["_score"]:
+                    merged[hit["_id"]] = {"_id": hit["_id"], "_score": score, "_source": hit["_source"]}
+        
+        return sorted(merged.values(), key=lambda hit: hit["_score"], reverse=True)
+    
+    def _format_hits(self, hits):
+        """Flatten Elasticsearch hits into result dictionaries"""
+        results = []
+        for hit in hits:
+            result = hit["_source"]
+            result["_score"] = hit["_score"]
+            results.append(result)
+        return results
+    
+    def build_search_request(self, query_embedding, result_columns=None, country_code=None, date_from=None, date_to=None, page=1, page_size=10, search_mode=None, query_text=None, lexical_weight=None):
+        """Build the Elasticsearch request for a search, shared by the sync and async clients
+        
+        Returns (search_mode, body): a search body for "exact" and multi-search lines for "knn"
+        and "hybrid" (the kNN searches, then a BM25 search on query_text, then a count of the
+        tenders matching the filters).
+        """
+        # Default result columns if none provided
+        if not result_columns:
+            result_columns = self.DEFAULT_RESULT_COLUMNS
+        
+        search_mode = search_mode or self.search_mode
+        filters = self._build_filters(country_code, date_from, date_to)
+        query_embedding = self.project_query(query_embedding)
+        
+        if search_mode == "exact":
+            return search_mode, self._build_script_query(query_embedding, result_columns, filters, page, page_size)
+        
+        if search_mode in ("knn", "hybrid"):
+            # Retrieve enough neighbours per vector field to cover the requested page
+            k = min(max(self.knn_k, page * page_size), self.MAX_RESULT_WINDOW)
+            searches = self._build_knn_searches(query_embedding, result_columns, filters, k)
+            if search_mode == "hybrid":
+                if lexical_weight is not None and not 0 <= float(lexical_weight) <= 1:
+                    raise ValueError("lexical_weight must be between 0 and 1")
+                if not query_text or not query_text.strip():
+                    # Nothing to match lexically: plain kNN
+                    return "knn", searches + self._build_count_search(filters)
+                searches += self._build_lexical_search(query_text, result_columns, filters, k)
+            return search_mode, searches + self._build_count_search(filters)
+        
+        raise ValueError(f"Unknown search mode: {search_mode}")
+    
+    def parse_search_response(self, search_mode, response, page=1, page_size=10, lexical_weight=None):
+        """Turn an Elasticsearch response into results with pagination metadata"""
+        if search_mode in ("knn", "hybrid"):
+            # The count response comes last, after the BM25 one which follows the kNN ones
+            responses, count_response = response["responses"][:-1], response["responses"][-1]
+            if search_mode == "hybrid":
+                lexical_response = responses[-1]
+                if "error" in lexical_response:
+                    raise Exception(lexical_response["error"])
+                merged_hits = self._fuse_rankings(
+                    self._merge_knn_responses(responses[:-1]), lexical_response["hits"]["hits"], lexical_weight
+                )
+            else:
+                merged_hits = self._merge_knn_responses(responses)
+            start = (page - 1) * page_size
+            hits = merged_hits[start:start + page_size]
             
-            # Format the results
+            # Every tender matching the filters is ranked, like in exact mode; without a count
+            # the retrieved hits are a lower bound
+            if "error" in count_response:
+                print(f"Error counting tenders: {count_response['error']}")
+                total_results = len(merged_hits)
+            else:
+                total_results = max(count_response["hits"]["total"]["value"], len(merged_hits))
+        else:
             hits = response["hits"]["hits"]
             total_results = response["hits"]["total"]["value"]
-            total_pages = math.ceil(total_results / page_size)
-            
-            results = []
-            for hit in hits:
-                result = hit["_source"]
-                result["_score"] = hit["_score"]
-                results.append(result)
-            
-            # Return results with pagination metadata
-            return {
-                "tenders": results,
-                "pagination": {
-                    "total_results": total_results,
-                    "total_pages": total_pages,
-                    "current_page": page,
-                    "page_size": page_size
-                }
+        
+        # Format the results
+        return self.paginate(self._format_hits(hits), total_results, page, page_size)
+    
+    @classmethod
+    def paginate(cls, results, total_results, page=1, page_size=10, retrievable_results=None):
+        """Wrap one page of results with pagination metadata
+        
+        total_results counts every matching tender, while pages only go as deep as
+        retrievable_results (by default MAX_RESULT_WINDOW).
+        """
+        if retrievable_results is None:
+            retrievable_results = min(total_results, cls.MAX_RESULT_WINDOW)
+        total_pages = math.ceil(retrievable_results / page_size)
+        
+        # Return results with pagination metadata
+        return {
+            "tenders": results,
+            "pagination": {
+                "total_results": total_results,
+                "retrievable_results": retrievable_results,
+                "total_pages": total_pages,
+                "current_page": page,
+                "page_size": page_size
             }
+        }
+    
+    @staticmethod
+    def empty_search_results(page=1, page_size=10):
+        """Results returned when a search fails"""
+        return {"tenders": [], "pagination": {"total_results": 0, "retrievable_results": 0, "total_pages": 0, "current_page": page, "page_size": page_size}}
+    
+    def execute_search(self, search_mode, body):
+        """Send a request built by build_search_request"""
+        if search_mode in ("knn", "hybrid"):
+            return self.es.msearch(index=self.index_name, body=body)
+        return self.es.search(index=self.index_name, body=body)
+    
+    def get_local_index(self):
+        """Return the current local index, or None if none is configured or published"""
+        if self.local_index_store is None:
+            return None
+        return self.local_index_store.get()
+    
+    def uses_local_backend(self):
+        """Whether searches are served by the local index instead of Elasticsearch"""
+        return self.search_backend == "local" and self.get_local_index() is not None
+    
+    def search_local(self, query_embedding, result_columns=None, country_code=None, date_from=None, date_to=None, top_k=10, search_mode=None):
+        """Return (results, total_results) for the top_k tenders from the local index, or None without one"""
+        local_index = self.get_local_index()
+        if local_index is None:
+            return None
+        
+        docs, scores, total_results = local_index.rank(
+            query_embedding, country_code, date_from, date_to, top_k, search_mode or self.search_mode
+        )
+        return local_index.format_results(docs, scores, result_columns or self.DEFAULT_RESULT_COLUMNS), total_results
+    
+    @metrics.timed("search")
+    def search_local_page(self, query_embedding, result_columns=None, country_code=None, date_from=None, date_to=None, page=1, page_size=10, search_mode=None):
+        """Search the local index, returning empty results if it is missing or fails"""
+        try:
+            ranked_results = self.search_local(
+                query_embedding, result_columns, country_code, date_from, date_to, page * page_size, search_mode
+            )
+        except Exception as e:
+            print(f"Error searching local index: {e}")
+            ranked_results = None
+        
+        if ranked_results is None:
+            metrics.count_fallback("empty_search_results")
+            return self.empty_search_results(page, page_size)
+        
+        results, total_results = ranked_results
+        return self.paginate(results[(page - 1) * page_size:], total_results, page, page_size)
+    
+    @metrics.timed("search")
+    def search_tenders(self, query_embedding, result_columns=None, country_code=None, date_from=None, date_to=None, page=1, page_size=10, search_mode=None, query_text=None, lexical_weight=None):
+        """Search for tenders using vector similarity and filters
+        
+        search_mode is "knn" (approximate HNSW retrieval, one kNN clause per category vector
+        merged by max score), "exact" (brute-force script_score over every document) or
+        "hybrid" (knn fused with a BM25 match of query_text on title and description).
+        If Elasticsearch fails, the local index (when configured) answers in degraded mode.
+        """
+        # Serve from the in-process index when it is the configured backend
+        if self.uses_local_backend():
+            return self.search_local_page(
+                query_embedding, result_columns, country_code, date_from, date_to, page, page_size, search_mode
+            )
+        
+        try:
+            search_mode, body = self.build_search_request(
+                query_embedding, result_columns, country_code, date_from, date_to, page, page_size, search_mode, query_text, lexical_weight
+            )
+            
+            # Execute the search
+            response = self.execute_search(search_mode, body)
+            
+            return self.parse_search_response(search_mode, response, page, page_size, lexical_weight)
+            
+        except Exception as e:
+            print(f"Error searching tenders: {e}")
+            metrics.count_fallback("search_error")
+            return self.search_local_page(
+                query_embedding, result_columns, country_code, date_from, date_to, page, page_size, search_mode
+            )
+    
+    @metrics.timed("search")
+    def search_ranked_tenders(self, query_embedding, result_columns=None, country_code=None, date_from=None, date_to=None, top_k=100, search_mode=None, query_text=None, lexical_weight=None):
+        """Return (results, total_results) for the top_k tenders of a search, or None if it fails
+        
+        Failures are not answered from the local index here so that degraded results are not
+        cached; callers fall back to search_local_page. Invalid arguments raise ValueError.
+        Concurrent identical searches wait for the first one and share its result.
+        """
+        key = self.search_key(query_embedding, result_columns, country_code, date_from, date_to, top_k, search_mode, query_text, lexical_weight)
+        return self.single_flight.do(
+            key, self.run_ranked_search, query_embedding, result_columns, country_code, date_from, date_to, top_k, search_mode, query_text, lexical_weight
+        )
+    
+    def search_key(self, query_embedding, *arguments):
+        """Hashable key of a search on this index: the embedding bytes and the other arguments"""
+        arguments = tuple(tuple(argument) if isinstance(argument, list) else argument for argument in arguments)
+        return (self.index_name, np.asarray(query_embedding, dtype=np.float32).tobytes()) + arguments
+    
+    def run_ranked_search(self, query_embedding, result_columns=None, country_code=None, date_from=None, date_to=None, top_k=100, search_mode=None, query_text=None, lexical_weight=None):
+        """Run one ranked search (see search_ranked_tenders)"""
+        try:
+            if self.uses_local_backend():
+                return self.search_local(query_embedding, result_columns, country_code, date_from, date_to, top_k, search_mode)
+            
+            search_mode, body = self.build_search_request(
+                query_embedding, result_columns, country_code, date_from, date_to, 1, top_k, search_mode, query_text, lexical_weight
+            )
+            response = self.execute_search(search_mode, body)
+            search_results = self.parse_search_response(search_mode, response, 1, top_k, lexical_weight)
+            return search_results["tenders"], search_results["pagination"]["total_results"]
+            
+        except ValueError:
+            raise
+            
+        except Exception as e:
+            print(f"Error searching tenders: {e}")
+            metrics.count_fallback("search_error")
+            return None
+    
+    def build_batch_search_request(self, searches):
+        """Combine ranked searches into one multi-search body
+        
+        searches are dictionaries of search_ranked_tenders arguments. Returns (body, plans)
+        where each plan is (search_mode, first response, response count), or the exception
+        raised while building that search.
+        """
+        body = []
+        plans = []
+        for search in searches:
+            try:
+                search_mode, request = self.build_search_request(
+                    search["query_embedding"],
+                    search.get("result_columns"),
+                    search.get("country_code"),
+                    search.get("date_from"),
+                    search.get("date_to"),
+                    1,
+                    search.get("top_k", 100),
+                    search.get("search_mode"),
+                    search.get("query_text"),
+                    search.get("lexical_weight")
+                )
+            except Exception as e:
+                plans.append(e)
+                continue
+            
+            # kNN and hybrid searches are already multi-search lines; an exact search needs a header
+            lines = request if search_mode in ("knn", "hybrid") else [{}, request]
+            plans.append((search_mode, len(body) // 2, len(lines) // 2))
+            body.extend(lines)
+        
+        return body, plans
+    
+    def parse_batch_search_response(self, plans, searches, response):
+        """Split a batched multi-search response into (results, total_results), or an exception, per search"""
+        ranked_results = []
+        for plan, search in zip(plans, searches):
+            if isinstance(plan, Exception):
+                ranked_results.append(plan)
+                continue
             
+            search_mode, first, count = plan
+            responses = response["responses"][first:first + count]
+            top_k = search.get("top_k", 100)
+            try:
+                if search_mode in ("knn", "hybrid"):
+                    search_results = self.parse_search_response(search_mode, {"responses": responses}, 1, top_k, search.get("lexical_weight"))
+                else:
+                    if "error" in responses[0]:
+                        raise Exception(responses[0]["error"])
+                    search_results = self.parse_search_response(search_mode, responses[0], 1, top_k)
+                ranked_results.append((search_results["tenders"], search_results["pagination"]["total_results"]))
+            except Exception as e:
+                ranked_results.append(e)
+        
+        return ranked_results
+    
+    @metrics.timed("search")
+    def search_ranked_tenders_batch(self, searches):
+        """Run many ranked searches in one multi-search round-trip
+        
+        Returns one entry per search: (results, total_results), a ValueError for an invalid
+        search, or None if it failed (callers fall back to search_local_page, like
+        search_ranked_tenders).
+        """
+        if self.uses_local_backend():
+            return [self.search_local_batch_entry(search) for search in searches]
+        
+        body, plans = self.build_batch_search_request(searches)
+        try:
+            response = self.es.msearch(index=self.index_name, body=body) if body else {"responses": []}
         except Exception as e:
             print(f"Error searching tenders: {e}")
-            return {"tenders": [], "pagination": {"total_results": 0, "total_pages": 0, "current_page": page, "page_size": page_size}}
+            metrics.count_fallback("search_error", len(plans))
+            return [plan if isinstance(plan, ValueError) else None for plan in plans]
+        
+        return self.batch_entries(self.parse_batch_search_response(plans, searches, response))
+    
+    @staticmethod
+    def batch_entries(ranked_results):
+        """Keep invalid-search errors for the caller and turn search failures into None"""
+        entries = []
+        for entry in ranked_results:
+            if isinstance(entry, Exception) and not isinstance(entry, ValueError):
+                print(f"Error searching tenders: {entry}")
+                metrics.count_fallback("search_error")
+                entry = None
+            entries.append(entry)
+        return entries
+    
+    def search_local_batch_entry(self, search):
+        """Answer one batched search from the local index"""
+        try:
+            return self.search_local(
+                search["query_embedding"],
+                search.get("result_columns"),
+                search.get("country_code"),
+                search.get("date_from"),
+                search.get("date_to"),
+                search.get("top_k", 100),
+                search.get("search_mode")
+            )
+        except Exception as e:
+            print(f"Error searching local index: {e}")
+            return None
+    
+    @staticmethod
+    def encode_cursor(pit_id, search_after, page):
+        """Pack the point-in-time and sort values of the last hit into an opaque cursor"""
+        state = json.dumps({"pit_id": pit_id, "search_after": search_after, "page": page})
+        return base64.urlsafe_b64encode(state.encode("utf-8")).decode("ascii")
+    
+    @staticmethod
+    def decode_cursor(cursor):
+        """Unpack a cursor into (pit_id, search_after, page), raising ValueError if it is malformed"""
+        try:
+            state = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+            return state["pit_id"], state["search_after"], int(state["page"])
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            raise ValueError("Invalid cursor") from e
+    
+    def build_cursor_request(self, query_embedding, result_columns=None, country_code=None, date_from=None, date_to=None, page_size=10, pit_id=None, search_after=None):
+        """Build an exact search over a point-in-time that continues after the previous page
+        
+        Hits are sorted on (_score, ID) so that search_after resumes deterministically.
+        """
+        # Default result columns if none provided
+        if not result_columns:
+            result_columns = self.DEFAULT_RESULT_COLUMNS
+        
+        filters = self._build_filters(country_code, date_from, date_to)
+        body = self._build_script_query(self.project_query(query_embedding), result_columns, filters, 1, page_size)
+        del body["from"]
+        body["sort"] = [{"_score": "desc"}, {"ID": "asc"}]
+        body["pit"] = {"id": pit_id, "keep_alive": self.pit_keep_alive}
+        if search_after:
+            body["search_after"] = search_after
+        return body
+    
+    def parse_cursor_response(self, response, pit_id, page=1, page_size=10):
+        """Turn a point-in-time search response into results with a next_cursor
+        
+        Returns (search_results, exhausted): exhausted is True when no page follows and the
+        point-in-time can be closed.
+        """
+        hits = response["hits"]["hits"]
+        total = response["hits"]["total"]
+        pit_id = response.get("pit_id", pit_id)
+        
+        # search_after is not bounded by the result window
+        search_results = self.paginate(self._format_hits(hits), total["value"], page, page_size, total["value"])
+        
+        # Another page follows only if this one was full and more hits match
+        exhausted = len(hits) < page_size or (page * page_size >= total["value"] and total.get("relation") == "eq")
+        search_results["pagination"]["next_cursor"] = None if exhausted else self.encode_cursor(pit_id, hits[-1]["sort"], page + 1)
+        return search_results, exhausted
+    
+    def close_point_in_time(self, pit_id):
+        """Release a point-in-time, ignoring ones that already expired"""
+        try:
+            self.es.close_point_in_time(id=pit_id)
+        except Exception as e:
+            print(f"Error closing point in time: {e}")
+    
+    @metrics.timed("search")
+    def search_tenders_after(self, query_embedding, result_columns=None, country_code=None, date_from=None, date_to=None, page_size=10, cursor=None):
+        """Search for tenders with cursor pagination
+        
+        Without a cursor a point-in-time is opened and the first page is returned; the
+        next_cursor in the pagination block fetches the following page. Every page costs the
+        same as the first one, and results stay consistent while tenders are being indexed.
+        """
+        pit_id, search_after, page = self.decode_cursor(cursor) if cursor else (None, None, 1)
+        
+        try:
+            if pit_id is None:
+                pit_id = self.es.open_point_in_time(index=self.index_name, keep_alive=self.pit_keep_alive)["id"]
+            
+            body = self.build_cursor_request(
+                query_embedding, result_columns, country_code, date_from, date_to, page_size, pit_id, search_after
+            )
+            response = self.es.search(body=body)
+            
+            search_results, exhausted = self.parse_cursor_response(response, pit_id, page, page_size)
+            if exhausted:
+                self.close_point_in_time(response.get("pit_id", pit_id))
+            return search_results
+            
+        except Exception as e:
+            print(f"Error searching tenders: {e}")
+            metrics.count_fallback("empty_search_results")
+            search_results = self.empty_search_results(page, page_size)
+            search_results["pagination"]["next_cursor"] = None
+            return search_results
     
     def delete_tender(self, tender_id):
         """Delete a tender document from the index"""
         try:
             self.es.delete(index=self.index_name, id=tender_id)
+            self.notify_index_changed()
             return True
             
         except Exception as e:
             print(f"Error deleting tender: {e}")
             return False
     
+    def bulk_delete_tenders(self, tender_ids, chunk_size=None):
+        """Delete many tender documents with bulk requests; returns deleted/failed counts and sample errors"""
+        entries = (
+            (tender_id, json.dumps({"delete": {"_index": self.index_name, "_id": tender_id}}), None, None) for tender_id in tender_ids
+        )
+        stats = self._send_bulk_entries(entries, chunk_size)
+        stats["deleted"] = stats.pop("indexed")
+        return stats
+    
+    def bulk_update_tenders(self, tenders_data, chunk_size=None):
+        """Partially update many tender documents (fields without vectors) with bulk requests"""
+        entries = (
+            (
+                tender["ID"],
+                json.dumps({"update": {"_index": self.index_name, "_id": tender["ID"]}}),
+                json.dumps({"doc": tender}),
+                None
+            ) for tender in tenders_data
+        )
+        stats = self._send_bulk_entries(entries, chunk_size)
+        stats["updated"] = stats.pop("indexed")
+        return stats
+    
+    def _send_bulk_entries(self, entries, chunk_size=None):
+        """Send (ID, action, source, tender) entries in chunks of chunk_size and notify the index listeners once"""
+        chunk_size = chunk_size or self.bulk_chunk_size
+        stats = {"indexed": 0, "failed": 0, "retried": 0, "errors": []}
+        chunk = []
+        
+        def send():
+            chunk_stats = self._send_bulk_chunk(chunk, self.bulk_max_retries)
+            stats["indexed"] += chunk_stats["indexed"]
+            stats["failed"] += chunk_stats["failed"]
+            stats["retried"] += chunk_stats["retried"]
+            stats["errors"].extend(chunk_stats["errors"][:10 - len(stats["errors"])])
+        
+        try:
+            for entry in entries:
+                chunk.append(entry)
+                if len(chunk) >= chunk_size:
+                    send()
+                    chunk = []
+            if chunk:
+                send()
+        finally:
+            if stats["indexed"]:
+                self.notify_index_changed()
+        return stats
+    
+    def _chunk_bulk_actions(self, tenders_data, chunk_size, max_chunk_bytes):
+        """Serialize tenders into bulk action chunks bounded by document count and byte size
+        
+        Entries are (ID, action, source, tender); the original tender is only kept when ingest
+        listeners need it.
+        """
+        keep_tenders = bool(self.ingest_listeners)
+        chunk = []
+        chunk_bytes = 0
+        for original in tenders_data:
+            tender = self.project_tender(original)
+            action = json.dumps({"index": {"_index": self.index_name, "_id": tender["ID"]}})
+            source = json.dumps(tender)
+            item_bytes = len(action) + len(source) + 2
+            
+            if chunk and (len(chunk) >= chunk_size or chunk_bytes + item_bytes > max_chunk_bytes):
+                yield chunk
+                chunk = []
+                chunk_bytes = 0
+            
+            chunk.append((tender["ID"], action, source, original if keep_tenders else None))
+            chunk_bytes += item_bytes
+        
+        if chunk:
+            yield chunk
+    
+    def _send_bulk_chunk(self, chunk, max_retries):
+        """Send one bulk chunk, retrying rejected (429) items with exponential backoff
+        
+        Entries without a source are sent as a single action line (deletes). Deleting a
+        missing document counts as done.
+        """
+        stats = {"indexed": 0, "failed": 0, "retried": 0, "errors": [], "tenders": []}
+        backoff = 1
+        
+        for attempt in range(max_retries + 1):
+            body = "\n".join(action if source is None else f"{action}\n{source}" for _, action, source, _ in chunk) + "\n"
+            try:
+                response = self.es.bulk(body=body)
+            except Exception as e:
+                # The whole request was rejected or failed, retry it if the cluster is overloaded
+                if getattr(e, "status_code", None) == 429 and attempt < max_retries:
+                    stats["retried"] += len(chunk)
+                    time.sleep(backoff)
+                    backoff = min(backoff * 2, 60)
+                    continue
+                stats["failed"] += len(chunk)
+                stats["errors"].append(str(e))
+                return stats
+            
+            # Inspect per-item results
+            rejected = []
+            for item, entry in zip(response["items"], chunk):
+                operation, result = next(iter(item.items()))
+                status = result.get("status", 500)
+                if status < 300 or (operation == "delete" and status == 404):
+                    stats["indexed"] += 1
+                    if entry[3] is not None:
+                        stats["tenders"].append(entry[3])
+                elif status == 429 and attempt < max_retries:
+                    rejected.append(entry)
+                else:
+                    stats["failed"] += 1
+                    stats["errors"].append(f"{entry[0]}: {result.get('error')}")
+            
+            if not rejected:
+                break
+            
+            stats["retried"] += len(rejected)
+            chunk = rejected
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 60)
+        
+        return stats
+    
+    def stream_index_tenders(self, tenders_data, chunk_size=None, max_chunk_bytes=None, workers=None, max_retries=None):
+        """Index an iterable of tenders in bounded chunks through parallel bulk workers
+        
+        Memory stays constant because at most two chunks per worker are in flight. Refresh is
+        disabled during the load and the index is refreshed once at the end. Returns a stats
+        dictionary with indexed/failed/retried counts, sample errors and docs_per_second.
+        """
+        chunk_size = chunk_size or self.bulk_chunk_size
+        max_chunk_bytes = max_chunk_bytes or self.bulk_max_chunk_bytes
+        workers = workers or self.bulk_workers
+        max_retries = self.bulk_max_retries if max_retries is None else max_retries
+        
+        stats = {"indexed": 0, "failed": 0, "retried": 0, "errors": []}
+        start = time.perf_counter()
+        
+        # Make sure the index exists
+        self.create_index()
+        
+        # Disable refresh during the load, remembering the previous setting
+        refresh_interval = None
+        try:
+            settings = self.es.indices.get_settings(index=self.index_name)
+            for index_settings in settings.values():
+                refresh_interval = index_settings["settings"]["index"].get("refresh_interval")
+            self.es.indices.put_settings(index=self.index_name, body={"index": {"refresh_interval": "-1"}})
+        except Exception as e:
+            print(f"Error disabling refresh: {e}")
+        
+        def collect(future):
+            chunk_stats = future.result()
+            stats["indexed"] += chunk_stats["indexed"]
+            stats["failed"] += chunk_stats["failed"]
+            stats["retried"] += chunk_stats["retried"]
+            # Keep only a sample of the errors to bound memory
+            stats["errors"].extend(chunk_stats["errors"][:10 - len(stats["errors"])])
+            self.notify_tenders_indexed(chunk_stats["tenders"])
+        
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                in_flight = set()
+                for chunk in self._chunk_bulk_actions(tenders_data, chunk_size, max_chunk_bytes):
+                    in_flight.add(executor.submit(self._send_bulk_chunk, chunk, max_retries))
+                    
+                    # Apply backpressure so the producer never runs far ahead of the workers
+                    if len(in_flight) >= workers * 2:
+                        done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            collect(future)
+                
+                for future in in_flight:
+                    collect(future)
+        finally:
+            # Restore the refresh interval and make the new documents searchable
+            try:
+                self.es.indices.put_settings(index=self.index_name, body={"index": {"refresh_interval": refresh_interval}})
+                self.es.indices.refresh(index=self.index_name)
+            except Exception as e:
+                print(f"Error refreshing index: {e}")
+            self.notify_index_changed()
+        
+        stats["seconds"] = time.perf_counter() - start
+        stats["docs_per_second"] = stats["indexed"] / stats["seconds"] if stats["seconds"] > 0 else 0.0
+        return stats
+    
     def bulk_index_tenders(self, tenders_data):
         """Bulk index multiple tender documents"""
         try:
-            # Make sure the index exists
-            self.create_index()
-            
-            # Prepare bulk request
-            bulk_data = []
-            for tender in tenders_data:
-                bulk_data.append({"index": {"_index": self.index_name, "_id": tender["ID"]}})
-                bulk_data.append(tender)
+            stats = self.stream_index_tenders(tenders_data)
             
-            # Execute bulk request
-            if bulk_data:
-                self.es.bulk(body=bulk_data, refresh=True)
+            if stats["failed"]:
+                print(f"Error bulk indexing tenders: {stats['failed']} documents failed, e.g. {stats['errors'][:3]}")
+                return False
             
             return True
             
         except Exception as e:
             print(f"Error bulk indexing tenders: {e}")
-            return False 
\ No newline at end of file
+            return False 
+    
+    def resolve_indices(self):
+        """Return (concrete index names, is_alias) behind index_name"""
+        if self.es.indices.exists_alias(name=self.index_name):
+            return list(self.es.indices.get_alias(name=self.index_name).keys()), True
+        return [self.index_name], False
+    
+    def scan_tenders(self, indices=None, batch_size=500):
+        """Stream every tender document, vectors included, with a scroll"""
+        for hit in helpers.scan(self.es, index=indices or self.index_name, query={"query": {"match_all": {}}}, size=batch_size):
+            yield hit["_source"]
+    
+    def scan_category_names(self, batch_size=1000):
+        """Stream the category names of every tender, without the vectors"""
+        fields = ["eMainCategoryName1", "eMainCategoryName2", "eMainCategoryName3"]
+        for hit in helpers.scan(self.es, index=self.index_name, query={"query": {"match_all": {}}, "_source": fields}, size=batch_size):
+            for field in fields:
+                if hit["_source"].get(field):
+                    yield hit["_source"][field]
+    
+    def scan_fingerprints(self, batch_size=1000):
+        """Stream (ID, embedding_fingerprint, document_fingerprint) of every tender, without the vectors"""
+        fields = ["ID", "embedding_fingerprint", "document_fingerprint"]
+        for hit in helpers.scan(self.es, index=self.index_name, query={"query": {"match_all": {}}, "_source": fields}, size=batch_size):
+            source = hit["_source"]
+            yield source.get("ID", hit["_id"]), source.get("embedding_fingerprint"), source.get("document_fingerprint")
+    
+    def ensure_fingerprint_mapping(self):
+        """Add the fingerprint fields to an index created before change detection"""
+        try:
+            self.es.indices.put_mapping(index=self.index_name, properties=self.FINGERPRINT_MAPPINGS)
+            return True
+        except Exception as e:
+            print(f"Error adding fingerprint mapping: {e}")
+            return False
+    
+    def sample_vectors(self, sample_size=20000):
+        """Collect up to sample_size category vectors from the index, e.g. to fit a PCA projection"""
+        vectors = []
+        for tender in self.scan_tenders():
+            vectors.extend(tender[field] for field in self.VECTOR_FIELDS if tender.get(field) is not None)
+            if len(vectors) >= sample_size:
+                break
+        return vectors[:sample_size]
+    
+    def copy_to_index(self, target_index, index_type=None, projection=None, layout=None, sources=None):
+        """Create target_index with the given vector profile and copy every tender into it
+        
+        The source must hold full-dimension vectors in separate fields. Returns the bulk
+        indexing stats.
+        """
+        projection = projection or self.default_projection()
+        layout = layout or self.vector_layout
+        
+        if self.get_projection().method != "none" or self.get_layout() != "separate":
+            raise ValueError("Reindexing needs a source index with full-dimension vectors in separate fields")
+        
+        # Create the target index with the new profile
+        self.es.indices.create(index=target_index, body=self.index_body(index_type, projection, layout))
+        self.store_projection(target_index, projection)
+        
+        # Copy the documents, projecting and laying out the vectors on the way
+        target = copy.copy(self)
+        target.index_name = target_index
+        target.projection = projection
+        target.layout = layout
+        # Listeners belong to the source: a copy is neither a change for the result cache nor
+        # new tenders for the ingest listeners (saved-search alerts, tender storage)
+        target.index_listeners = []
+        target.ingest_listeners = []
+        stats = target.stream_index_tenders(self.scan_tenders(sources))
+        if stats["failed"]:
+            raise Exception(f"Reindexing failed for {stats['failed']} tenders, e.g. {stats['errors'][:3]}")
+        return stats
+    
+    def reindex_with_profile(self, target_index, index_type=None, projection=None, delete_source=False, layout=None):
+        """Copy the tenders into a new index with another vector profile and switch index_name to it
+        
+        Afterwards index_name is an alias of the target: an existing alias is moved atomically,
+        while a concrete index of that name is deleted and replaced by the alias in the same
+        request (only with delete_source). Returns the bulk indexing stats.
+        """
+        projection = projection or self.default_projection()
+        layout = layout or self.vector_layout
+        sources, is_alias = self.resolve_indices()
+        
+        if not is_alias and not delete_source:
+            raise ValueError(f"{self.index_name} is a concrete index, replacing it by an alias deletes it (use delete_source)")
+        
+        stats = self.copy_to_index(target_index, index_type, projection, layout, sources)
+        
+        # Point index_name at the target in one atomic request
+        if is_alias:
+            actions = [{"remove": {"index": index, "alias": self.index_name}} for index in sources]
+        else:
+            actions = [{"remove_index": {"index": self.index_name}}]
+        actions.append({"add": {"index": target_index, "alias": self.index_name}})
+        self.es.indices.update_aliases(body={"actions": actions})
+        
+        if is_alias and delete_source:
+            self.es.indices.delete(index=",".join(sources))
+        
+        self.projection = projection
+        self.layout = layout
+        self.notify_index_changed()
+        return stats
+    
+    def split_tender_vectors(self, tender):
+        """Split an indexed document of any layout into (document without vectors, category vectors)"""
+        document = dict(tender)
+        vectors = [document.pop(field) for field in self.VECTOR_FIELDS if document.get(field) is not None]
+        for field in self.VECTOR_FIELDS:
+            document.pop(field, None)
+        
+        vectors.extend(item["vector"] for item in document.pop(self.NESTED_VECTOR_PATH, None) or [])
+        pooled = document.pop(self.POOLED_VECTOR_FIELD, None)
+        if pooled is not None:
+            vectors.append(pooled)
+        return document, vectors
+    
+    def build_local_index(self, nlist=None):
+        """Snapshot the Elasticsearch index into a new local index, publish it and return it"""
+        if self.local_index_store is None:
+            raise ValueError("LOCAL_INDEX_PATH is not set")
+        
+        path = self.local_index_store.new_snapshot_path()
+        LocalVectorIndex.build(
+            path,
+            (self.split_tender_vectors(tender) for tender in self.scan_tenders()),
+            self.get_projection().to_document(),
+            nlist
+        )
+        return self.local_index_store.publish(path)
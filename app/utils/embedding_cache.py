@@ -0,0 +1,155 @@
+import os
+import sqlite3
+import hashlib
+import threading
+import time
+import numpy as np
+from app.utils.cache import LRUCache
+
+class EmbeddingCache:
+    def __init__(self):
+        self.memory_size = int(os.getenv('EMBEDDING_CACHE_MEMORY_SIZE', '10000'))
+        self.disk_path = os.getenv('EMBEDDING_CACHE_PATH', '.cache/embeddings.sqlite3')
+        self.disk_size = int(os.getenv('EMBEDDING_CACHE_DISK_SIZE', '500000'))
+        
+        # In-process tier
+        self.memory = LRUCache(max_size=self.memory_size)
+        
+        # On-disk tier (disabled when EMBEDDING_CACHE_PATH is empty)
+        self.lock = threading.Lock()
+        self.connection = None
+        self.disk_hits = 0
+        self.disk_misses = 0
+        self.disk_evictions = 0
+        self.writes_since_eviction = 0
+        if self.disk_path:
+            self.open_disk_cache()
+    
+    def open_disk_cache(self):
+        """Open (and create if needed) the SQLite file backing the disk tier"""
+        try:
+            directory = os.path.dirname(self.disk_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            
+            self.connection = sqlite3.connect(self.disk_path, timeout=30, check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                cache_key TEXT PRIMARY KEY,
+                embedding BLOB NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """)
+            self.connection.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings (last_access)")
+            self.connection.commit()
+        except sqlite3.Error as e:
+            print(f"Error opening embedding cache: {e}")
+            self.connection = None
+    
+    @staticmethod
+    def make_key(model, text):
+        """Content-addressed key: hash of the model name and whitespace-normalized text"""
+        normalized = " ".join((text or "").split())
+        return hashlib.sha256(f"{model}\n{normalized}".encode("utf-8")).hexdigest()
+    
+    def get(self, model, text):
+        """Return the cached embedding as a list of floats, or None on a miss"""
+        key = self.make_key(model, text)
+        
+        embedding = self.get_memory(key)
+        if embedding is not None:
+            return embedding
+        return self.load_disk(key)
+    
+    def has_disk_tier(self):
+        """Whether lookups and stores may touch the SQLite file"""
+        return self.connection is not None
+    
+    def get_memory(self, key):
+        """Look a key up in the in-process tier only"""
+        vector = self.memory.get(key)
+        return vector.tolist() if vector is not None else None
+    
+    def load_disk(self, key):
+        """Look a key up in the disk tier, promoting a hit to memory (blocking SQLite I/O)"""
+        if self.connection is None:
+            return None
+        
+        try:
+            with self.lock:
+                row = self.connection.execute(
+                    "SELECT embedding FROM embeddings WHERE cache_key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    self.disk_misses += 1
+                    return None
+                
+                self.disk_hits += 1
+                self.connection.execute(
+                    "UPDATE embeddings SET last_access = ? WHERE cache_key = ?", (time.time(), key)
+                )
+                self.connection.commit()
+        except sqlite3.Error as e:
+            print(f"Error reading embedding cache: {e}")
+            return None
+        
+        # Promote to the in-process tier
+        vector = np.frombuffer(row[0], dtype='<f4')
+        self.memory.put(key, vector)
+        return vector.tolist()
+    
+    def put(self, model, text, embedding):
+        """Store an embedding in both tiers"""
+        key = self.make_key(model, text)
+        vector = np.asarray(embedding, dtype='<f4')
+        self.memory.put(key, vector)
+        
+        if self.connection is None:
+            return
+        
+        try:
+            with self.lock:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO embeddings (cache_key, embedding, last_access) VALUES (?, ?, ?)",
+                    (key, vector.tobytes(), time.time())
+                )
+                self.writes_since_eviction += 1
+                
+                # Amortize the size check over many writes
+                if self.writes_since_eviction >= 1000:
+                    self.evict()
+                self.connection.commit()
+        except sqlite3.Error as e:
+            print(f"Error writing embedding cache: {e}")
+    
+    def evict(self):
+        """Delete the least recently used rows above the disk size bound (caller holds the lock)"""
+        self.writes_since_eviction = 0
+        count = self.connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = count - self.disk_size
+        if excess > 0:
+            self.connection.execute("""
+            DELETE FROM embeddings WHERE cache_key IN (
+                SELECT cache_key FROM embeddings ORDER BY last_access LIMIT ?
+            )
+            """, (excess,))
+            self.disk_evictions += excess
+    
+    def stats(self):
+        """Return hit/miss counters for both tiers"""
+        memory_stats = self.memory.stats()
+        disk_lookups = self.disk_hits + self.disk_misses
+        return {
+            "memory": memory_stats,
+            "disk": {
+                "enabled": self.connection is not None,
+                "path": self.disk_path,
+                "max_size": self.disk_size,
+                "hits": self.disk_hits,
+                "misses": self.disk_misses,
+                "evictions": self.disk_evictions,
+                "hit_rate": self.disk_hits / disk_lookups if disk_lookups else 0.0
+            },
+            "network_calls_saved": memory_stats["hits"] + self.disk_hits
+        }
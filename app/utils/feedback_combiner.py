@@ -0,0 +1,73 @@
+import os
+import time
+import numpy as np
+
+class FeedbackCombiner:
+    def __init__(self, dims=1536):
+        self.dims = dims
+        
+        # Half-life for recency-weighted feedback (0 disables recency weighting)
+        self.recency_half_life_days = float(os.getenv('FEEDBACK_RECENCY_HALF_LIFE_DAYS', '0'))
+    
+    def as_matrix(self, embeddings):
+        """View feedback embeddings as an (n, dims) float32 matrix without copying stacked input"""
+        if embeddings is None or len(embeddings) == 0:
+            return np.empty((0, self.dims), dtype=np.float32)
+        return np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dims)
+    
+    def weighted_mean(self, embeddings, weights=None):
+        """Weighted mean of the rows of a feedback matrix (zero vector without feedback)"""
+        matrix = self.as_matrix(embeddings)
+        if matrix.shape[0] == 0:
+            return np.zeros(self.dims, dtype=np.float32)
+        
+        if weights is None:
+            return matrix.mean(axis=0, dtype=np.float32)
+        
+        weights = np.asarray(weights, dtype=np.float32)
+        total = weights.sum()
+        if total <= 0:
+            return np.zeros(self.dims, dtype=np.float32)
+        
+        # One matrix-vector product instead of accumulating rows
+        mean = weights @ matrix
+        mean /= total
+        return mean
+    
+    def recency_weights(self, timestamps, half_life_days=None, now=None):
+        """Exponential decay weights from UNIX timestamps (1.0 for feedback given now)"""
+        half_life_days = half_life_days or self.recency_half_life_days
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        if not half_life_days or timestamps.size == 0:
+            return None
+        
+        age_days = ((now or time.time()) - timestamps) / 86400
+        return np.exp2(-np.maximum(age_days, 0) / half_life_days).astype(np.float32)
+    
+    def combine(self, query_embedding, positive_embeddings, negative_embeddings, alpha=1.0, beta=0.5, gamma=1.0,
+                positive_weights=None, negative_weights=None):
+        """Rocchio-style combination: alpha * query + gamma * mean(positive) - beta * mean(negative)
+        
+        Feedback is passed as (n, dims) matrices (lists of vectors are stacked once). The result
+        is an L2-normalized float32 vector.
+        """
+        if query_embedding is None:
+            combined = np.zeros(self.dims, dtype=np.float32)
+        else:
+            combined = np.array(query_embedding, dtype=np.float32)
+            combined *= alpha
+        
+        positive_vector = self.weighted_mean(positive_embeddings, positive_weights)
+        positive_vector *= gamma
+        combined += positive_vector
+        
+        negative_vector = self.weighted_mean(negative_embeddings, negative_weights)
+        negative_vector *= beta
+        combined -= negative_vector
+        
+        # Normalize the combined embedding
+        norm = np.linalg.norm(combined)
+        if norm > 0:
+            combined /= norm
+        
+        return combined
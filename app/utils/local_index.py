@@ -0,0 +1,299 @@
+import os
+import json
+import math
+import shutil
+import time
+import threading
+from datetime import datetime, timezone
+import numpy as np
+from app.utils.vector_projection import VectorProjection
+
+# Publication date of tenders without one
+MISSING_DATE = np.iinfo(np.int64).min
+
+def to_epoch_seconds(value):
+    """Parse a date in one of the index formats (yyyy-MM-dd HH:mm:ss, yyyy-MM-dd, epoch millis), UTC like Elasticsearch"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)) or str(value).isdigit():
+        return int(value) // 1000
+    
+    for date_format in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d"):
+        try:
+            return int(datetime.strptime(str(value), date_format).replace(tzinfo=timezone.utc).timestamp())
+        except ValueError:
+            pass
+    return None
+
+# In-process IVF index over a memory-mapped snapshot of the tender vectors. A snapshot
+# directory holds the unit category vectors (vectors.npy, one row per category vector), the
+# tender each row belongs to (owners.npy), the IVF centroids and inverted lists, columnar
+# country codes and publication dates used as filter bitmasks, and the tender documents
+# without their vectors. Tenders are scored by their best category vector, like the
+# Elasticsearch queries.
+class LocalVectorIndex:
+    def __init__(self, path, nprobe=8):
+        self.path = path
+        self.nprobe = nprobe
+        
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        with open(os.path.join(path, "documents.json"), encoding="utf-8") as f:
+            self.documents = json.load(f)
+        
+        self.projection = VectorProjection.from_meta(self.meta.get("projection", {}))
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        self.owners = np.load(os.path.join(path, "owners.npy"), mmap_mode="r")
+        self.centroids = np.load(os.path.join(path, "centroids.npy"))
+        self.list_rows = np.load(os.path.join(path, "list_rows.npy"), mmap_mode="r")
+        self.list_offsets = np.load(os.path.join(path, "list_offsets.npy"))
+        self.countries = np.load(os.path.join(path, "countries.npy"))
+        self.publication_dates = np.load(os.path.join(path, "publication_dates.npy"))
+        self.country_codes = {code: i for i, code in enumerate(self.meta["country_names"])}
+    
+    def __len__(self):
+        return len(self.documents)
+    
+    @staticmethod
+    def train_ivf(vectors, nlist, iterations=10, sample_size=50000, seed=0):
+        """Spherical k-means on a sample of the vectors, returning unit centroids"""
+        rng = np.random.default_rng(seed)
+        sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), min(len(vectors), sample_size), replace=False))])
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        
+        for _ in range(iterations):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            
+            # Keep the previous centroid for empty clusters
+            filled = np.bincount(assignments, minlength=nlist) > 0
+            norms = np.linalg.norm(sums[filled], axis=1, keepdims=True)
+            centroids[filled] = sums[filled] / np.maximum(norms, 1e-12)
+        
+        return centroids
+    
+    @classmethod
+    def build(cls, path, tenders, projection_meta=None, nlist=None, batch_size=65536):
+        """Write a snapshot from (document, category vectors) pairs and return its directory"""
+        documents = []
+        vectors = []
+        owners = []
+        countries = []
+        publication_dates = []
+        for document, tender_vectors in tenders:
+            for vector in tender_vectors:
+                vectors.append(np.asarray(vector, dtype=np.float32))
+                owners.append(len(documents))
+            countries.append(document.get("ePublisherCountryName") or "")
+            publication_date = to_epoch_seconds(document.get("ePublicationDate"))
+            publication_dates.append(MISSING_DATE if publication_date is None else publication_date)
+            documents.append(document)
+        
+        if not vectors:
+            raise ValueError("No tender vectors to build a local index from")
+        
+        # Unit vectors so that a dot product is the cosine similarity
+        vectors = np.stack(vectors)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        owners = np.asarray(owners, dtype=np.int32)
+        
+        # Train the inverted file and group the rows by list
+        nlist = nlist or max(1, int(math.sqrt(len(vectors))))
+        nlist = min(nlist, len(vectors))
+        centroids = cls.train_ivf(vectors, nlist)
+        assignments = np.concatenate([
+            np.argmax(vectors[start:start + batch_size] @ centroids.T, axis=1) for start in range(0, len(vectors), batch_size)
+        ])
+        list_rows = np.argsort(assignments, kind="stable").astype(np.int32)
+        list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=nlist))]).astype(np.int64)
+        
+        country_names, country_codes = np.unique(np.asarray(countries, dtype=str), return_inverse=True)
+        
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "vectors.npy"), vectors)
+        np.save(os.path.join(path, "owners.npy"), owners)
+        np.save(os.path.join(path, "centroids.npy"), centroids)
+        np.save(os.path.join(path, "list_rows.npy"), list_rows)
+        np.save(os.path.join(path, "list_offsets.npy"), list_offsets)
+        np.save(os.path.join(path, "countries.npy"), country_codes.astype(np.int32))
+        np.save(os.path.join(path, "publication_dates.npy"), np.asarray(publication_dates, dtype=np.int64))
+        with open(os.path.join(path, "documents.json"), "w", encoding="utf-8") as f:
+            json.dump(documents, f)
+        with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "tenders": len(documents),
+                "vectors": len(vectors),
+                "dims": vectors.shape[1],
+                "nlist": nlist,
+                "country_names": country_names.tolist(),
+                "projection": projection_meta or {"method": "none", "dims": vectors.shape[1]},
+                "built_at": time.time()
+            }, f)
+        return path
+    
+    def filter_mask(self, country_code=None, date_from=None, date_to=None):
+        """Bitmask of the tenders matching the filters, or None without filters"""
+        if not country_code and not date_from and not date_to:
+            return None
+        
+        mask = np.ones(len(self.documents), dtype=bool)
+        if country_code:
+            code = self.country_codes.get(country_code)
+            if code is None:
+                return np.zeros(len(self.documents), dtype=bool)
+            mask &= self.countries == code
+        
+        # Tenders without a publication date never match a date range
+        if date_from or date_to:
+            mask &= self.publication_dates != MISSING_DATE
+        if date_from:
+            mask &= self.publication_dates >= to_epoch_seconds(date_from)
+        if date_to:
+            mask &= self.publication_dates <= to_epoch_seconds(date_to)
+        return mask
+    
+    def candidate_rows(self, query, row_mask, exact):
+        """Vector rows to score: every (filtered) row for exact search, the probed IVF lists otherwise"""
+        if exact or self.nprobe >= len(self.centroids):
+            rows = np.arange(len(self.vectors))
+        else:
+            probes = np.argsort(-(self.centroids @ query))[:self.nprobe]
+            rows = np.concatenate([self.list_rows[self.list_offsets[probe]:self.list_offsets[probe + 1]] for probe in probes])
+        
+        if row_mask is not None:
+            rows = rows[row_mask[rows]]
+        return rows
+    
+    def rank(self, query_embedding, country_code=None, date_from=None, date_to=None, top_k=10, search_mode="knn"):
+        """Return (tender indices, scores, total_results) of the best top_k tenders"""
+        query = self.projection.project(query_embedding).astype(np.float32).ravel()
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+        
+        doc_mask = self.filter_mask(country_code, date_from, date_to)
+        row_mask = doc_mask[self.owners] if doc_mask is not None else None
+        matching = len(self.documents) if doc_mask is None else int(doc_mask.sum())
+        
+        exact = search_mode == "exact"
+        rows = self.candidate_rows(query, row_mask, exact)
+        scores, docs = self.score_rows(query, rows)
+        
+        # Probed lists can miss tenders under selective filters; fall back to scanning all of them
+        if not exact and len(docs) < min(top_k, matching):
+            exact = True
+            scores, docs = self.score_rows(query, self.candidate_rows(query, row_mask, exact))
+        
+        # Every tender matching the filters is counted, like the Elasticsearch count search
+        order = np.argsort(-scores, kind="stable")[:top_k]
+        return docs[order], scores[order], matching
+    
+    def score_rows(self, query, rows):
+        """Best clamped cosine similarity per tender over the given vector rows"""
+        # Sorted rows read the memory-mapped matrix sequentially
+        rows = np.sort(rows)
+        row_scores = np.maximum(np.asarray(self.vectors[rows]) @ query, 0)
+        row_owners = self.owners[rows]
+        
+        doc_scores = np.full(len(self.documents), -1.0, dtype=np.float32)
+        np.maximum.at(doc_scores, row_owners, row_scores)
+        docs = np.flatnonzero(doc_scores >= 0)
+        return doc_scores[docs], docs
+    
+    def format_results(self, docs, scores, result_columns):
+        """Result dictionaries with the requested columns, like the Elasticsearch _source filtering"""
+        results = []
+        for doc, score in zip(docs, scores):
+            document = self.documents[doc]
+            result = {column: document[column] for column in result_columns if column in document}
+            result["_score"] = float(score)
+            results.append(result)
+        return results
+
+# Holds the current LocalVectorIndex and hot-swaps it when a new snapshot is published.
+# Snapshots are directories under path; the CURRENT file names the live one and is replaced
+# atomically by publish(), so every worker process picks up a new snapshot within
+# reload_interval seconds. Periodic checks run in a background thread: get() never reads
+# the disk, so it is safe to call from an event loop.
+class LocalIndexStore:
+    def __init__(self, path, reload_interval=30, nprobe=8):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.nprobe = nprobe
+        self.index = None
+        self.snapshot = None
+        self.checked_at = 0
+        self.lock = threading.Lock()
+        self.reloading = False
+        self.reloading_lock = threading.Lock()
+        self.reload()
+    
+    def current_snapshot(self):
+        """Name of the published snapshot, or None"""
+        try:
+            with open(os.path.join(self.path, "CURRENT"), encoding="utf-8") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+    
+    def reload(self):
+        """Load the published snapshot if it changed"""
+        with self.lock:
+            self.checked_at = time.monotonic()
+            snapshot = self.current_snapshot()
+            if snapshot is None or snapshot == self.snapshot:
+                return self.index
+            
+            try:
+                index = LocalVectorIndex(os.path.join(self.path, snapshot), self.nprobe)
+            except Exception as e:
+                print(f"Error loading local index: {e}")
+                return self.index
+            
+            # Swap the reference; searches in flight keep the previous index
+            self.index = index
+            self.snapshot = snapshot
+            return self.index
+    
+    def get(self):
+        """Return the current index (None until a snapshot is published), checking for a new one in the background"""
+        if time.monotonic() - self.checked_at >= self.reload_interval and not self.reloading:
+            # Only flags the reload: the main lock is held while a snapshot loads
+            with self.reloading_lock:
+                start = not self.reloading
+                self.reloading = True
+            if start:
+                threading.Thread(target=self.background_reload, daemon=True).start()
+        return self.index
+    
+    def background_reload(self):
+        """Reload in a worker thread; searches keep the current index meanwhile"""
+        try:
+            self.reload()
+        finally:
+            self.reloading = False
+    
+    def new_snapshot_path(self):
+        """Directory for a snapshot that is about to be built"""
+        return os.path.join(self.path, time.strftime("%Y%m%d%H%M%S") + f"-{os.getpid()}")
+    
+    def publish(self, snapshot_path):
+        """Make a built snapshot the live one and load it"""
+        temporary = os.path.join(self.path, f"CURRENT.{os.getpid()}")
+        with open(temporary, "w", encoding="utf-8") as f:
+            f.write(os.path.basename(snapshot_path))
+        os.replace(temporary, os.path.join(self.path, "CURRENT"))
+        index = self.reload()
+        self.prune(keep=2)
+        return index
+    
+    def prune(self, keep=2):
+        """Delete all but the newest snapshots (processes still mapping a deleted one keep reading it)"""
+        current = self.current_snapshot()
+        snapshots = sorted(
+            name for name in os.listdir(self.path) if os.path.isdir(os.path.join(self.path, name))
+        )
+        for name in snapshots[:-keep]:
+            if name != current:
+                shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
@@ -0,0 +1,184 @@
+import os
+import time
+import bisect
+import inspect
+import functools
+import threading
+import contextvars
+from collections import Counter, deque
+from contextlib import contextmanager
+import numpy as np
+
+DEFAULT_BUCKETS = "0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10"
+
+# Endpoint and stage durations of the request being served, and the stages currently timed
+# (contextvars follow both Flask request threads and Quart request tasks)
+current_request = contextvars.ContextVar("metrics_request", default=None)
+active_stages = contextvars.ContextVar("metrics_active_stages", default=frozenset())
+
+class Histogram:
+    def __init__(self, buckets, window_size):
+        self.buckets = buckets
+        self.bucket_counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        
+        # Recent observations for percentiles
+        self.window = deque(maxlen=window_size)
+    
+    def observe(self, seconds):
+        """Record one duration"""
+        self.bucket_counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+        self.window.append(seconds)
+    
+    def percentiles(self):
+        """p50/p95/p99 in milliseconds over the recent observations"""
+        if not self.window:
+            return {"p50": None, "p95": None, "p99": None}
+        p50, p95, p99 = np.percentile(np.fromiter(self.window, dtype=np.float64), [50, 95, 99]) * 1000
+        return {"p50": float(p50), "p95": float(p95), "p99": float(p99)}
+
+# Per-process latency and fallback metrics. Requests are timed by the app hooks
+# (start_request/finish_request); the components time their stages with timed() or stage()
+# and count degraded answers with count_fallback(). A stage nested in the same stage (e.g. a
+# search falling back to the local index) is only timed once.
+class Metrics:
+    def __init__(self):
+        self.buckets = [float(bound) for bound in os.getenv('METRICS_BUCKETS', DEFAULT_BUCKETS).split(",")]
+        self.window_size = int(os.getenv('METRICS_WINDOW_SIZE', '1024'))
+        self.server_timing = os.getenv('METRICS_SERVER_TIMING', 'false').lower() == 'true'
+        
+        self.lock = threading.Lock()
+        self.request_durations = {}
+        self.stage_durations = {}
+        self.responses = Counter()
+        self.fallbacks = Counter()
+    
+    def histogram(self, histograms, key):
+        """Return the histogram for a key, creating it on first use (lock held)"""
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = Histogram(self.buckets, self.window_size)
+        return histogram
+    
+    def start_request(self, endpoint):
+        """Start timing a request"""
+        current_request.set({"endpoint": endpoint or "other", "start": time.perf_counter(), "stages": {}})
+    
+    def finish_request(self, status):
+        """Record the request duration and return its stage durations in seconds, or None"""
+        state = current_request.get()
+        if state is None:
+            return None
+        current_request.set(None)
+        
+        duration = time.perf_counter() - state["start"]
+        with self.lock:
+            self.histogram(self.request_durations, state["endpoint"]).observe(duration)
+            self.responses[(state["endpoint"], str(status))] += 1
+        
+        timings = dict(state["stages"])
+        timings["total"] = duration
+        return timings
+    
+    @contextmanager
+    def stage(self, name):
+        """Time a stage of the current request"""
+        active = active_stages.get()
+        if name in active:
+            yield
+            return
+        
+        token = active_stages.set(active | {name})
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            active_stages.reset(token)
+            self.observe_stage(name, time.perf_counter() - start)
+    
+    def observe_stage(self, name, seconds):
+        """Record a stage duration for the current request's endpoint"""
+        state = current_request.get()
+        endpoint = state["endpoint"] if state else "none"
+        with self.lock:
+            self.histogram(self.stage_durations, (endpoint, name)).observe(seconds)
+        if state is not None:
+            state["stages"][name] = state["stages"].get(name, 0.0) + seconds
+    
+    def timed(self, name):
+        """Decorator timing every call of a function or coroutine function as a stage"""
+        def decorator(func):
+            if inspect.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    with self.stage(name):
+                        return await func(*args, **kwargs)
+                return async_wrapper
+            
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+    
+    def count_fallback(self, reason, count=1):
+        """Count degraded answers (zero-vector embeddings, failed searches, ...)"""
+        with self.lock:
+            self.fallbacks[reason] += count
+    
+    @staticmethod
+    def server_timing_header(timings):
+        """Server-Timing header value for the stage durations of a request"""
+        return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items())
+    
+    def render_histograms(self, lines, name, help_text, histograms, label_names):
+        """Append a histogram family in Prometheus text format"""
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        for key, histogram in sorted(histograms.items()):
+            values = key if isinstance(key, tuple) else (key,)
+            labels = ",".join(f'{label}="{value}"' for label, value in zip(label_names, values))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ["+Inf"], histogram.bucket_counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+            lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+    
+    def render_prometheus(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        with self.lock:
+            self.render_histograms(lines, "tender_request_duration_seconds", "Request duration by endpoint.",
+                                   self.request_durations, ["endpoint"])
+            self.render_histograms(lines, "tender_stage_duration_seconds", "Duration of each request stage by endpoint.",
+                                   self.stage_durations, ["endpoint", "stage"])
+            
+            lines.append("# HELP tender_responses_total Responses by endpoint and status code.")
+            lines.append("# TYPE tender_responses_total counter")
+            for (endpoint, status), count in sorted(self.responses.items()):
+                lines.append(f'tender_responses_total{{endpoint="{endpoint}",status="{status}"}} {count}')
+            
+            lines.append("# HELP tender_fallbacks_total Degraded answers by reason.")
+            lines.append("# TYPE tender_fallbacks_total counter")
+            for reason, count in sorted(self.fallbacks.items()):
+                lines.append(f'tender_fallbacks_total{{reason="{reason}"}} {count}')
+        return "\n".join(lines) + "\n"
+    
+    def stats(self):
+        """Return request and stage percentiles and fallback counters for monitoring"""
+        with self.lock:
+            requests = {
+                endpoint: {"count": histogram.count, **histogram.percentiles()} for endpoint, histogram in self.request_durations.items()
+            }
+            stages = {}
+            for (endpoint, stage), histogram in self.stage_durations.items():
+                stages.setdefault(endpoint, {})[stage] = {"count": histogram.count, **histogram.percentiles()}
+            return {"requests": requests, "stages": stages, "fallbacks": dict(self.fallbacks)}
+
+# Shared by the components of a worker process
+metrics = Metrics()
@@ -1,18 +1,44 @@
 import os
 import openai
 import numpy as np
+from app.utils.embedding_cache import EmbeddingCache
+from app.utils.feedback_combiner import FeedbackCombiner
+from app.utils.metrics import metrics
+from app.utils.openai_resilience import OpenAIResilience, OpenAIUnavailableError
+from app.utils.single_flight import SingleFlight
 
 class OpenAIEmbedding:
     def __init__(self):
         self.api_key = os.getenv('OPENAI_API_KEY')
         self.model = "gpt-4o-mini-2024-07-18"
+        self.embedding_model = "text-embedding-ada-002"  # This model outputs 1536-dimensional vectors
         openai.api_key = self.api_key
+        
+        # Retries, deadlines, rate limiting and circuit breaking are handled by OpenAIResilience
+        openai.max_retries = 0
+        self.resilience = OpenAIResilience()
+        
+        # Batching limits for the embeddings endpoint (2048 inputs per request, ~300k tokens per request)
+        self.embedding_batch_size = int(os.getenv('EMBEDDING_BATCH_SIZE', '2048'))
+        self.embedding_batch_max_tokens = int(os.getenv('EMBEDDING_BATCH_MAX_TOKENS', '250000'))
+        
+        # Content-addressed cache so repeated texts are only embedded once
+        self.embedding_cache = EmbeddingCache()
+        
+        # Concurrent requests for the same text share one embeddings call
+        self.single_flight = SingleFlight()
+        
+        # Vectorized Rocchio-style feedback combination
+        self.feedback_combiner = FeedbackCombiner()
     
     def get_categorized_response(self, prompt):
         """Get a categorized response from OpenAI based on the prompt"""
         try:
             # Create a chat completion
-            response = openai.chat.completions.create(
+            response = self.resilience.call(
+                "chat",
+                self.estimate_tokens(prompt) + 150,
+                openai.chat.completions.create,
                 model=self.model,
                 messages=[
                     {"role": "system", "content": "You are a helpful assistant that categorizes tender queries."},
@@ -26,90 +52,133 @@ class OpenAIEmbedding:
             return response.choices[0].message.content.strip()
             
         except Exception as e:
+            # Callers fall back to the local query rewrite
             print(f"Error getting categorized response: {e}")
             return ""
     
-    def generate_embedding(self, text):
-        """Generate a 1536-dimensional embedding for the given text"""
+    def estimate_tokens(self, text):
+        """Estimate the token count of a text (conservative, about 3 characters per token)"""
+        return len(text) // 3 + 1
+    
+    def pack_batches(self, texts):
+        """Split texts into consecutive batches within the embedding input and token limits"""
+        batches = []
+        batch = []
+        batch_tokens = 0
+        for text in texts:
+            tokens = self.estimate_tokens(text)
+            if batch and (len(batch) >= self.embedding_batch_size or batch_tokens + tokens > self.embedding_batch_max_tokens):
+                batches.append(batch)
+                batch = []
+                batch_tokens = 0
+            batch.append(text)
+            batch_tokens += tokens
+        if batch:
+            batches.append(batch)
+        return batches
+    
+    def embed_batch(self, texts):
+        """Embed one batch, splitting it to isolate inputs that OpenAI rejects"""
         try:
-            # Create an embedding
-            response = openai.embeddings.create(
-                input=[text],
-                model="text-embedding-ada-002"  # This model outputs 1536-dimensional vectors
+            response = self.resilience.call(
+                "embedding",
+                sum(self.estimate_tokens(text) for text in texts),
+                openai.embeddings.create,
+                input=texts,
+                model=self.embedding_model
             )
+            return self.response_embeddings(response, len(texts))
             
-            # Return the embedding vector
-            return response.data[0].embedding
-            
+        except OpenAIUnavailableError:
+            # Splitting does not help while OpenAI is down or throttling us
+            raise
         except Exception as e:
-            print(f"Error generating embedding: {e}")
-            return [0] * 1536  # Return a zero vector in case of error
+            halves = self.split_failed_batch(texts, e)
+        
+        if halves is None:
+            return [[0] * 1536]  # Return a zero vector for an input that OpenAI rejects
+        return self.embed_batch(halves[0]) + self.embed_batch(halves[1])
+    
+    @staticmethod
+    def response_embeddings(response, count):
+        """Embeddings of a response in input order (the API reports the input position of each)"""
+        embeddings = [None] * count
+        for item in response.data:
+            embeddings[item.index] = item.embedding
+        return embeddings
     
-    def combine_with_feedback(self, query_embedding, positive_embeddings, negative_embeddings, alpha=1.0, beta=0.5):
+    def split_failed_batch(self, texts, error):
+        """Log a rejected batch and return its halves to retry separately, or None for a single input
+        
+        Shared with the async path so that only the failing inputs get zero vectors.
+        """
+        print(f"Error generating embeddings for a batch of {len(texts)}: {error}")
+        if len(texts) == 1:
+            metrics.count_fallback("zero_embedding")
+            return None
+        middle = len(texts) // 2
+        return texts[:middle], texts[middle:]
+    
+    @metrics.timed("embedding")
+    def generate_embeddings(self, texts):
+        """Generate 1536-dimensional embeddings for many texts, preserving their order (raises OpenAIUnavailableError when OpenAI is down)"""
+        embeddings = [None] * len(texts)
+        
+        # Serve cached texts and embed each distinct missing text once
+        missing = {}
+        for position, text in enumerate(texts):
+            cached_embedding = self.embedding_cache.get(self.embedding_model, text)
+            if cached_embedding is not None:
+                embeddings[position] = cached_embedding
+            else:
+                missing.setdefault(text, []).append(position)
+        
+        for batch in self.pack_batches(list(missing)):
+            for text, embedding in zip(batch, self.embed_batch(batch)):
+                # Zero vectors come from failed inputs and must not be cached
+                if any(embedding):
+                    self.embedding_cache.put(self.embedding_model, text, embedding)
+                for position in missing[text]:
+                    embeddings[position] = embedding
+        
+        return embeddings
+    
+    @metrics.timed("embedding")
+    def generate_embedding(self, text):
+        """Generate a 1536-dimensional embedding for the given text"""
+        return self.single_flight.do((self.embedding_model, text), self.generate_embeddings, [text])[0]
+    
+    def combine_with_feedback(self, query_embedding, positive_embeddings, negative_embeddings, alpha=1.0, beta=0.5,
+                              positive_weights=None, negative_weights=None):
         """Combine query embedding with feedback embeddings using weighted sum"""
         try:
-            # If no query embedding, start with a zero vector
-            if query_embedding is None:
-                query_embedding = [0] * 1536
-            
-            # Convert to numpy arrays for easier math
-            query_embedding = np.array(query_embedding)
-            
-            # Process positive feedback
-            positive_vector = np.zeros(1536)
-            if positive_embeddings:
-                for embedding in positive_embeddings:
-                    positive_vector += np.array(embedding)
-                positive_vector = positive_vector / len(positive_embeddings)
-            
-            # Process negative feedback
-            negative_vector = np.zeros(1536)
-            if negative_embeddings:
-                for embedding in negative_embeddings:
-                    negative_vector += np.array(embedding)
-                negative_vector = negative_vector / len(negative_embeddings)
-            
-            # Combine embeddings: query * alpha + positive - negative * beta
-            combined_embedding = (query_embedding * alpha) + positive_vector - (negative_vector * beta)
-            
-            # Normalize the combined embedding
-            norm = np.linalg.norm(combined_embedding)
-            if norm > 0:
-                combined_embedding = combined_embedding / norm
-            
-            return combined_embedding.tolist()
+            return self.feedback_combiner.combine(
+                query_embedding,
+                positive_embeddings,
+                negative_embeddings,
+                alpha=alpha,
+                beta=beta,
+                positive_weights=positive_weights,
+                negative_weights=negative_weights
+            )
             
         except Exception as e:
             print(f"Error combining embeddings: {e}")
-            return query_embedding.tolist() if query_embedding is not None else [0] * 1536
+            return np.asarray(query_embedding, dtype=np.float32) if query_embedding is not None else np.zeros(1536, dtype=np.float32)
     
-    def combine_feedback_only(self, positive_embeddings, negative_embeddings, beta=0.5):
+    def combine_feedback_only(self, positive_embeddings, negative_embeddings, beta=0.5,
+                              positive_weights=None, negative_weights=None):
         """Combine only feedback embeddings (no query)"""
         try:
-            # Process positive feedback
-            positive_vector = np.zeros(1536)
-            if positive_embeddings:
-                for embedding in positive_embeddings:
-                    positive_vector += np.array(embedding)
-                positive_vector = positive_vector / len(positive_embeddings)
-            
-            # Process negative feedback
-            negative_vector = np.zeros(1536)
-            if negative_embeddings:
-                for embedding in negative_embeddings:
-                    negative_vector += np.array(embedding)
-                negative_vector = negative_vector / len(negative_embeddings)
-            
-            # Combine embeddings: positive - negative * beta
-            combined_embedding = positive_vector - (negative_vector * beta)
-            
-            # Normalize the combined embedding
-            norm = np.linalg.norm(combined_embedding)
-            if norm > 0:
-                combined_embedding = combined_embedding / norm
-            
-            return combined_embedding.tolist()
+            return self.feedback_combiner.combine(
+                None,
+                positive_embeddings,
+                negative_embeddings,
+                beta=beta,
+                positive_weights=positive_weights,
+                negative_weights=negative_weights
+            )
             
         except Exception as e:
             print(f"Error combining feedback embeddings: {e}")
-            return [0] * 1536 
\ No newline at end of file
+            return np.zeros(1536, dtype=np.float32)
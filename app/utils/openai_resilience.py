@@ -0,0 +1,387 @@
+import os
+import math
+import time
+import random
+import asyncio
+import sqlite3
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import openai
+
+KINDS = ("chat", "embedding")
+
+# Raised when an OpenAI call cannot complete within its deadline: the circuit is open, the
+# rate limit would make it wait too long, or the retries are used up. The apps answer 503.
+class OpenAIUnavailableError(Exception):
+    def __init__(self, message, retry_after=1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+# Token buckets for the OpenAI request and token limits, kept in a SQLite file so that all
+# worker processes on a host draw from the same budget. A 429 with Retry-After pauses the
+# kind for every worker. Limits of 0 are not enforced; with OPENAI_RATE_LIMIT_PATH empty
+# the buckets are per process.
+class RateLimiter:
+    def __init__(self, path=None):
+        self.path = os.getenv('OPENAI_RATE_LIMIT_PATH', '.cache/openai_rate_limit.sqlite3') if path is None else path
+        self.limits = {
+            "chat": (
+                float(os.getenv('OPENAI_CHAT_REQUESTS_PER_MINUTE', '0')),
+                float(os.getenv('OPENAI_CHAT_TOKENS_PER_MINUTE', '0'))
+            ),
+            "embedding": (
+                float(os.getenv('OPENAI_EMBEDDING_REQUESTS_PER_MINUTE', '0')),
+                float(os.getenv('OPENAI_EMBEDDING_TOKENS_PER_MINUTE', '0'))
+            )
+        }
+        
+        self.lock = threading.Lock()
+        self.connection = None
+        self.open_database()
+        
+        # Metrics
+        self.waits = Counter()
+        self.wait_seconds = Counter()
+    
+    def open_database(self):
+        """Open (and create if needed) the SQLite file holding the buckets"""
+        try:
+            path = self.path or ":memory:"
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            
+            # Autocommit mode, transactions are opened explicitly with BEGIN IMMEDIATE
+            self.connection = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+            if self.path:
+                self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS rate_limits (
+                kind TEXT PRIMARY KEY,
+                request_tokens REAL NOT NULL,
+                token_tokens REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                paused_until REAL NOT NULL DEFAULT 0
+            )
+            """)
+        except sqlite3.Error as e:
+            print(f"Error opening OpenAI rate limiter: {e}")
+            self.connection = None
+    
+    def reserve(self, kind, tokens, max_wait):
+        """Reserve one request and `tokens` tokens; return the seconds to wait before sending, or None if that exceeds max_wait"""
+        if self.connection is None:
+            return 0.0
+        
+        request_limit, token_limit = self.limits[kind]
+        try:
+            with self.lock:
+                now = time.time()
+                
+                # Without limits only a Retry-After pause can delay the call
+                if not request_limit and not token_limit:
+                    row = self.connection.execute("SELECT paused_until FROM rate_limits WHERE kind = ?", (kind,)).fetchone()
+                    wait = max(0.0, row[0] - now) if row else 0.0
+                    return self.record_wait(kind, wait) if wait <= max_wait else None
+                
+                self.connection.execute("BEGIN IMMEDIATE")
+                try:
+                    row = self.connection.execute(
+                        "SELECT request_tokens, token_tokens, updated_at, paused_until FROM rate_limits WHERE kind = ?", (kind,)
+                    ).fetchone()
+                    if row is None:
+                        row = (request_limit, token_limit, now, 0.0)
+                    
+                    # Refill both buckets for the elapsed time, then take this call's cost (balances may go
+                    # negative: the call waits until they are paid back)
+                    elapsed = max(0.0, now - row[2])
+                    wait = max(0.0, row[3] - now)
+                    balances = []
+                    for balance, limit, cost in [(row[0], request_limit, 1), (row[1], token_limit, tokens)]:
+                        if not limit:
+                            balances.append(balance)
+                            continue
+                        balance = min(limit, balance + elapsed * limit / 60) - min(cost, limit)
+                        wait = max(wait, -balance * 60 / limit)
+                        balances.append(balance)
+                    
+                    if wait > max_wait:
+                        self.connection.execute("ROLLBACK")
+                        return None
+                    
+                    self.connection.execute(
+                        "INSERT OR REPLACE INTO rate_limits (kind, request_tokens, token_tokens, updated_at, paused_until) VALUES (?, ?, ?, ?, ?)",
+                        (kind, balances[0], balances[1], now, row[3])
+                    )
+                    self.connection.execute("COMMIT")
+                except Exception:
+                    self.connection.execute("ROLLBACK")
+                    raise
+                return self.record_wait(kind, wait)
+        except sqlite3.Error as e:
+            print(f"Error reading OpenAI rate limiter: {e}")
+            return 0.0
+    
+    def record_wait(self, kind, wait):
+        """Count a throttled call (lock held)"""
+        if wait > 0:
+            self.waits[kind] += 1
+            self.wait_seconds[kind] += wait
+        return wait
+    
+    def pause(self, kind, seconds):
+        """Hold back all calls of a kind, in every worker, for the Retry-After of a 429"""
+        if self.connection is None:
+            return
+        
+        request_limit, token_limit = self.limits[kind]
+        try:
+            with self.lock:
+                now = time.time()
+                self.connection.execute(
+                    """
+                    INSERT INTO rate_limits (kind, request_tokens, token_tokens, updated_at, paused_until) VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(kind) DO UPDATE SET paused_until = MAX(paused_until, excluded.paused_until)
+                    """,
+                    (kind, request_limit, token_limit, now, now + seconds)
+                )
+        except sqlite3.Error as e:
+            print(f"Error writing OpenAI rate limiter: {e}")
+    
+    def stats(self):
+        """Return the configured limits and how often calls were throttled"""
+        with self.lock:
+            return {
+                "shared": bool(self.path) and self.connection is not None,
+                "limits": {
+                    kind: {"requests_per_minute": limits[0], "tokens_per_minute": limits[1]} for kind, limits in self.limits.items()
+                },
+                "waits": dict(self.waits),
+                "wait_seconds": dict(self.wait_seconds)
+            }
+
+# Per-process circuit breaker: after `failure_threshold` consecutive failed calls it opens
+# and calls fail fast for `reset_timeout` seconds; then a single trial call decides whether
+# it closes again.
+class CircuitBreaker:
+    def __init__(self, failure_threshold=None, reset_timeout=None):
+        self.failure_threshold = int(os.getenv('OPENAI_CIRCUIT_FAILURE_THRESHOLD', '5')) if failure_threshold is None else failure_threshold
+        self.reset_timeout = float(os.getenv('OPENAI_CIRCUIT_RESET_TIMEOUT', '30')) if reset_timeout is None else reset_timeout
+        
+        self.lock = threading.Lock()
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_started_at = None
+        
+        # Metrics
+        self.opened = 0
+        self.rejected = 0
+    
+    def allow(self):
+        """Whether a call may be sent now"""
+        with self.lock:
+            if self.state == "closed":
+                return True
+            
+            now = time.monotonic()
+            if self.state == "open" and now >= self.opened_at + self.reset_timeout:
+                self.state = "half_open"
+                self.trial_started_at = None
+            
+            # One trial call at a time; a trial that never reported back is replaced
+            if self.state == "half_open" and (self.trial_started_at is None or now >= self.trial_started_at + self.reset_timeout):
+                self.trial_started_at = now
+                return True
+            
+            self.rejected += 1
+            return False
+    
+    def record_success(self):
+        """Close the circuit after a call that reached OpenAI"""
+        with self.lock:
+            self.state = "closed"
+            self.failures = 0
+    
+    def record_failure(self):
+        """Count a failed call and open the circuit when needed"""
+        with self.lock:
+            self.failures += 1
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= self.failure_threshold):
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self.opened += 1
+    
+    def retry_after(self):
+        """Seconds until the circuit lets a trial call through"""
+        with self.lock:
+            if self.state != "open":
+                return 1.0
+            return max(1.0, self.opened_at + self.reset_timeout - time.monotonic())
+    
+    def stats(self):
+        """Return the circuit state and counters"""
+        with self.lock:
+            return {"state": self.state, "failures": self.failures, "opened": self.opened, "rejected": self.rejected}
+
+# Deadlines, retries, rate limiting and circuit breaking around the OpenAI SDK calls (whose
+# own retries are turned off). Every call gets a total deadline per kind; each attempt is
+# bounded by the kind's timeout and the time left. Connection errors, timeouts, 408, 409,
+# 429 and 5xx are retried with full-jitter exponential backoff, waiting at least the
+# Retry-After of the response. Other errors (e.g. 400 for an oversized input) mean OpenAI is
+# up and are raised to the caller as they are.
+class OpenAIResilience:
+    def __init__(self):
+        self.max_retries = int(os.getenv('OPENAI_MAX_RETRIES', '2'))
+        self.backoff_base = float(os.getenv('OPENAI_BACKOFF_BASE', '0.5'))
+        self.backoff_max = float(os.getenv('OPENAI_BACKOFF_MAX', '30'))
+        self.timeouts = {
+            "chat": float(os.getenv('OPENAI_CHAT_TIMEOUT', '10')),
+            "embedding": float(os.getenv('OPENAI_EMBEDDING_TIMEOUT', '60'))
+        }
+        self.deadlines = {
+            "chat": float(os.getenv('OPENAI_CHAT_DEADLINE', '20')),
+            "embedding": float(os.getenv('OPENAI_EMBEDDING_DEADLINE', '120'))
+        }
+        
+        self.rate_limiter = RateLimiter()
+        self.breakers = {kind: CircuitBreaker() for kind in KINDS}
+        
+        # Metrics
+        self.lock = threading.Lock()
+        self.calls = Counter()
+        self.retries = Counter()
+        self.unavailable = Counter()
+    
+    @staticmethod
+    def is_retryable(error):
+        """Whether an error says OpenAI is unreachable or overloaded"""
+        if isinstance(error, openai.APIConnectionError):
+            return True
+        status = getattr(error, "status_code", None)
+        return status in (408, 409, 429) or (status is not None and status >= 500)
+    
+    @staticmethod
+    def retry_after(error):
+        """Seconds requested by the Retry-After(-ms) header of an error response, or None"""
+        headers = getattr(getattr(error, "response", None), "headers", None)
+        if not headers:
+            return None
+        
+        try:
+            if headers.get("retry-after-ms"):
+                return float(headers["retry-after-ms"]) / 1000
+            value = headers.get("retry-after")
+            if not value:
+                return None
+            try:
+                return float(value)
+            except ValueError:
+                return (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds()
+        except Exception:
+            return None
+    
+    def unavailable_error(self, kind, reason, retry_after):
+        """Count an unavailable call and build its error"""
+        with self.lock:
+            self.unavailable[(kind, reason)] += 1
+        return OpenAIUnavailableError(f"OpenAI {kind} service unavailable ({reason})", retry_after)
+    
+    def admit(self, kind, tokens, deadline):
+        """Check the circuit and reserve rate limit budget; return the seconds to wait before sending"""
+        breaker = self.breakers[kind]
+        if not breaker.allow():
+            raise self.unavailable_error(kind, "circuit open", breaker.retry_after())
+        
+        wait = self.rate_limiter.reserve(kind, tokens, deadline - time.monotonic())
+        if wait is None:
+            raise self.unavailable_error(kind, "rate limited", 1.0)
+        
+        with self.lock:
+            self.calls[kind] += 1
+        return wait
+    
+    def attempt_timeout(self, kind, deadline):
+        """Timeout of the next attempt: the kind's timeout, cut to the time left"""
+        return max(0.1, min(self.timeouts[kind], deadline - time.monotonic()))
+    
+    def retry_delay(self, kind, error, attempt, deadline):
+        """Seconds to back off before retrying a failed attempt; re-raises errors that must not be retried"""
+        breaker = self.breakers[kind]
+        if not self.is_retryable(error):
+            breaker.record_success()
+            raise error
+        
+        breaker.record_failure()
+        retry_after = self.retry_after(error)
+        if retry_after is not None and getattr(error, "status_code", None) == 429:
+            self.rate_limiter.pause(kind, retry_after)
+        
+        if attempt >= self.max_retries:
+            raise self.unavailable_error(kind, "retries exhausted", retry_after or breaker.retry_after()) from error
+        
+        # Full jitter, but never sooner than the server asked for
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        if time.monotonic() + delay >= deadline:
+            raise self.unavailable_error(kind, "deadline exceeded", max(1.0, delay)) from error
+        
+        print(f"Retrying OpenAI {kind} call in {delay:.2f}s (attempt {attempt + 1}): {error}")
+        with self.lock:
+            self.retries[kind] += 1
+        return delay
+    
+    def call(self, kind, tokens, function, **kwargs):
+        """Call an OpenAI SDK method with a deadline, retries, rate limiting and circuit breaking"""
+        deadline = time.monotonic() + self.deadlines[kind]
+        attempt = 0
+        while True:
+            time.sleep(self.admit(kind, tokens, deadline))
+            try:
+                response = function(timeout=self.attempt_timeout(kind, deadline), **kwargs)
+            except Exception as e:
+                time.sleep(self.retry_delay(kind, e, attempt, deadline))
+                attempt += 1
+                continue
+            
+            self.breakers[kind].record_success()
+            return response
+    
+    async def acall(self, kind, tokens, function, **kwargs):
+        """Async variant of call for the AsyncOpenAI client"""
+        deadline = time.monotonic() + self.deadlines[kind]
+        attempt = 0
+        while True:
+            # The shared buckets live in SQLite, so they are read off the event loop
+            await asyncio.sleep(await asyncio.to_thread(self.admit, kind, tokens, deadline))
+            try:
+                response = await function(timeout=self.attempt_timeout(kind, deadline), **kwargs)
+            except Exception as e:
+                await asyncio.sleep(self.retry_delay(kind, e, attempt, deadline))
+                attempt += 1
+                continue
+            
+            self.breakers[kind].record_success()
+            return response
+    
+    def stats(self):
+        """Return call, retry and unavailability counters, the circuit states and the rate limiter counters"""
+        with self.lock:
+            stats = {
+                kind: {
+                    "calls": self.calls[kind],
+                    "retries": self.retries[kind],
+                    "unavailable": {reason: count for (call_kind, reason), count in self.unavailable.items() if call_kind == kind}
+                } for kind in KINDS
+            }
+        for kind in KINDS:
+            stats[kind]["circuit"] = self.breakers[kind].stats()
+        stats["rate_limiter"] = self.rate_limiter.stats()
+        return stats
+
+def retry_after_header(error):
+    """Retry-After header for a 503 answer to an OpenAIUnavailableError"""
+    return {"Retry-After": str(math.ceil(error.retry_after))}
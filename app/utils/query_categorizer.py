@@ -0,0 +1,164 @@
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from app.utils.cache import LRUCache
+from app.utils.single_flight import SingleFlight
+
+class QueryCategorizer:
+    def __init__(self, openai_embedding, prompt_generator):
+        self.openai_embedding = openai_embedding
+        self.prompt_generator = prompt_generator
+        self.ttl = int(os.getenv('CATEGORIZATION_CACHE_TTL', '86400'))
+        self.cache_size = int(os.getenv('CATEGORIZATION_CACHE_SIZE', '10000'))
+        self.persist_path = os.getenv('CATEGORIZATION_CACHE_PATH', '')
+        self.batch_workers = int(os.getenv('CATEGORIZATION_BATCH_WORKERS', '8'))
+        
+        # In-process TTL + LRU tier
+        self.cache = LRUCache(max_size=self.cache_size, ttl=self.ttl)
+        
+        # Concurrent misses for the same query share one LLM call
+        self.single_flight = SingleFlight()
+        
+        # Optional persistence across restarts
+        self.lock = threading.Lock()
+        self.connection = None
+        self.persisted_hits = 0
+        if self.persist_path:
+            self.open_persistent_cache()
+    
+    def open_persistent_cache(self):
+        """Open (and create if needed) the SQLite file used to persist categorized responses"""
+        try:
+            directory = os.path.dirname(self.persist_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            
+            self.connection = sqlite3.connect(self.persist_path, timeout=30, check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS categorized_queries (
+                query_key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """)
+            self.connection.commit()
+        except sqlite3.Error as e:
+            print(f"Error opening categorization cache: {e}")
+            self.connection = None
+    
+    @staticmethod
+    def normalize_query(query):
+        """Fold case and whitespace so trivially different queries share a cache entry"""
+        return " ".join((query or "").casefold().split())
+    
+    def has_persistent_cache(self):
+        """Whether cache misses and stores touch the SQLite file"""
+        return self.connection is not None
+    
+    def load_persisted(self, key):
+        """Return a non-expired persisted response, or None"""
+        if self.connection is None:
+            return None
+        
+        try:
+            with self.lock:
+                row = self.connection.execute(
+                    "SELECT response, created_at FROM categorized_queries WHERE query_key = ?", (key,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            print(f"Error reading categorization cache: {e}")
+            return None
+        
+        if row is None or row[1] + self.ttl < time.time():
+            return None
+        
+        # Keep the remaining lifetime when promoting to memory
+        self.cache.put(key, row[0], ttl=max(1, row[1] + self.ttl - time.time()))
+        self.persisted_hits += 1
+        return row[0]
+    
+    def store(self, key, response):
+        """Store a categorized response in memory and, if enabled, on disk"""
+        self.cache.put(key, response)
+        
+        if self.connection is None:
+            return
+        
+        try:
+            with self.lock:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO categorized_queries (query_key, response, created_at) VALUES (?, ?, ?)",
+                    (key, response, time.time())
+                )
+                self.connection.commit()
+        except sqlite3.Error as e:
+            print(f"Error writing categorization cache: {e}")
+    
+    def categorize(self, query):
+        """Return the categorized response for a query, calling the LLM only on a cache miss"""
+        key = self.normalize_query(query)
+        
+        response = self.cache.get(key)
+        if response is not None:
+            return response
+        
+        response = self.load_persisted(key)
+        if response is not None:
+            return response
+        
+        return self.single_flight.do(key, self.fetch, query, key)
+    
+    def fetch(self, query, key):
+        """Call the LLM for a cache miss and cache the response"""
+        # A concurrent call may have filled the cache in the meantime
+        response = self.cache.get(key)
+        if response is not None:
+            return response
+        
+        # The prompt only depends on the query, so the normalized query is a safe key
+        categorization_prompt = self.prompt_generator.generate_categorization_prompt(query.strip())
+        response = self.openai_embedding.get_categorized_response(categorization_prompt)
+        
+        # An empty response means the call failed; do not cache it
+        if response:
+            self.store(key, response)
+        return response
+    
+    def categorize_many(self, queries):
+        """Categorize many queries in input order, calling the LLM concurrently once per distinct normalized query"""
+        distinct = {}
+        for query in queries:
+            distinct.setdefault(self.normalize_query(query), query)
+        
+        # Chat completions take one prompt each, so cache misses are sent in parallel
+        workers = max(1, min(self.batch_workers, len(distinct)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            responses = dict(zip(distinct, executor.map(self.categorize, distinct.values())))
+        
+        return [responses[self.normalize_query(query)] for query in queries]
+    
+    def warm(self, queries):
+        """Pre-populate the cache for the given queries and return how many were fetched"""
+        fetched = 0
+        for query in queries:
+            key = self.normalize_query(query)
+            if not key or self.cache.contains(key) or self.load_persisted(key) is not None:
+                continue
+            if self.categorize(query):
+                fetched += 1
+        return fetched
+    
+    def warm_from_database(self, db_operation, limit=1000):
+        """Pre-populate the cache with the most frequent queries from the search_queries table"""
+        return self.warm(db_operation.get_popular_search_queries(limit))
+    
+    def stats(self):
+        """Return cache counters for sizing the cache"""
+        stats = self.cache.stats()
+        stats["ttl"] = self.ttl
+        stats["persistent"] = self.connection is not None
+        stats["persisted_hits"] = self.persisted_hits
+        return stats
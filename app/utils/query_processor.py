@@ -0,0 +1,83 @@
+import os
+import threading
+from app.utils.metrics import metrics
+
+MODES = ["llm", "raw", "rewrite", "auto"]
+
+# Chooses how a query is turned into the text that is embedded (QUERY_PROCESSING_MODE):
+# "llm" always asks the LLM to categorize it, "raw" embeds the query as typed, "rewrite"
+# appends matching category names with the local QueryRewriter, and "auto" only calls the
+# LLM for long queries or queries mostly made of words outside the category vocabulary.
+# An empty LLM response (a failed call) falls back to the rewritten query instead of
+# embedding an empty string.
+class QueryProcessor:
+    def __init__(self, query_categorizer, query_rewriter, mode=None):
+        self.query_categorizer = query_categorizer
+        self.query_rewriter = query_rewriter
+        self.mode = os.getenv('QUERY_PROCESSING_MODE', 'llm') if mode is None else mode
+        if self.mode not in MODES:
+            raise ValueError(f"Unknown query processing mode: {self.mode}")
+        
+        # auto mode heuristic
+        self.auto_max_words = int(os.getenv('QUERY_AUTO_MAX_WORDS', '6'))
+        self.auto_min_coverage = float(os.getenv('QUERY_AUTO_MIN_COVERAGE', '0.5'))
+        
+        # Number of queries that took each path
+        self.lock = threading.Lock()
+        self.paths = {"llm": 0, "llm_failed": 0, "raw": 0, "rewrite": 0}
+    
+    def needs_llm(self, query):
+        """auto mode: long queries and queries mostly outside the vocabulary go to the LLM"""
+        if len(query.split()) > self.auto_max_words:
+            return True
+        return self.query_rewriter.coverage(query) < self.auto_min_coverage
+    
+    def plan(self, query):
+        """Return (path, local text) for a query; the local text is embedded unless the LLM answers"""
+        query = (query or "").strip()
+        if self.mode == "raw":
+            return "raw", query
+        
+        rewritten = self.query_rewriter.rewrite(query)
+        if self.mode == "llm" or (self.mode == "auto" and self.needs_llm(query)):
+            return "llm", rewritten
+        return "rewrite", rewritten
+    
+    def complete(self, path, local_text, llm_response=None):
+        """Record the path taken and return the text to embed"""
+        if path == "llm" and not llm_response:
+            path = "llm_failed"
+            metrics.count_fallback("categorization_failed")
+        with self.lock:
+            self.paths[path] += 1
+        return llm_response if path == "llm" else local_text
+    
+    @metrics.timed("categorization")
+    def process(self, query):
+        """Return the text to embed for a query"""
+        path, local_text = self.plan(query)
+        llm_response = self.query_categorizer.categorize(query) if path == "llm" else None
+        return self.complete(path, local_text, llm_response)
+    
+    @metrics.timed("categorization")
+    def process_many(self, queries):
+        """Texts to embed for many queries, categorizing the ones that need the LLM concurrently"""
+        plans = [self.plan(query) for query in queries]
+        llm_responses = iter(self.query_categorizer.categorize_many([
+            query for query, (path, _) in zip(queries, plans) if path == "llm"
+        ]))
+        return [
+            self.complete(path, local_text, next(llm_responses) if path == "llm" else None) for path, local_text in plans
+        ]
+    
+    def stats(self):
+        """Return how often each path was taken"""
+        with self.lock:
+            paths = dict(self.paths)
+        total = sum(paths.values())
+        return {
+            "mode": self.mode,
+            "vocabulary_size": len(self.query_rewriter.categories),
+            "paths": paths,
+            "llm_fraction": (paths["llm"] + paths["llm_failed"]) / total if total else 0.0
+        }
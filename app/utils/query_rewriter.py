@@ -0,0 +1,116 @@
+import os
+import re
+import json
+import math
+from collections import Counter
+
+TOKEN_PATTERN = re.compile(r"[0-9a-z]+")
+
+STOPWORDS = {
+    "a", "an", "and", "any", "are", "as", "at", "be", "by", "for", "from", "in", "into", "is", "it", "of",
+    "on", "or", "the", "to", "with", "without", "all", "new", "need", "needed", "looking", "find", "me",
+    "tender", "tenders", "contract", "contracts", "bid", "bids"
+}
+
+# Local stand-in for the LLM categorization step: the query is matched against the category
+# vocabulary of the index (eMainCategoryName1..3, collected by build_query_vocabulary.py)
+# and the best matching category names are appended to it before embedding. Categories are
+# scored by the IDF-weighted share of their tokens found in the query.
+class QueryRewriter:
+    def __init__(self, vocabulary_path=None, max_categories=None, min_score=None):
+        self.vocabulary_path = os.getenv('QUERY_VOCABULARY_PATH', '.cache/category_vocabulary.json') if vocabulary_path is None else vocabulary_path
+        self.max_categories = int(os.getenv('QUERY_REWRITE_MAX_CATEGORIES', '3')) if max_categories is None else max_categories
+        self.min_score = float(os.getenv('QUERY_REWRITE_MIN_SCORE', '0.5')) if min_score is None else min_score
+        
+        # Category names, their token sets and the inverted index token -> categories
+        self.categories = []
+        self.category_tokens = []
+        self.token_index = {}
+        self.idf = {}
+        if self.vocabulary_path and os.path.exists(self.vocabulary_path):
+            self.load()
+    
+    @staticmethod
+    def tokenize(text):
+        """Lowercase word tokens without stopwords, with a crude plural folding"""
+        tokens = []
+        for token in TOKEN_PATTERN.findall((text or "").lower()):
+            if token in STOPWORDS:
+                continue
+            if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+                token = token[:-1]
+            tokens.append(token)
+        return tokens
+    
+    def load(self, path=None):
+        """Load a vocabulary saved by save_vocabulary"""
+        try:
+            with open(path or self.vocabulary_path, encoding="utf-8") as f:
+                self.set_categories(json.load(f)["categories"])
+        except Exception as e:
+            print(f"Error loading query vocabulary: {e}")
+    
+    def set_categories(self, categories):
+        """Index category names (a list, or a name -> tender count mapping, most frequent first)"""
+        # Names differing only in case or plurals collapse to their first spelling
+        self.categories = []
+        self.category_tokens = []
+        seen = set()
+        for name in categories:
+            tokens = frozenset(self.tokenize(name))
+            if tokens and tokens not in seen:
+                seen.add(tokens)
+                self.categories.append(name)
+                self.category_tokens.append(tokens)
+        
+        self.token_index = {}
+        for position, tokens in enumerate(self.category_tokens):
+            for token in tokens:
+                self.token_index.setdefault(token, []).append(position)
+        self.idf = {
+            token: math.log(1 + len(self.categories) / len(positions)) for token, positions in self.token_index.items()
+        }
+    
+    @staticmethod
+    def save_vocabulary(path, category_names):
+        """Count category names (e.g. from ElasticHandler.scan_category_names) and save them for the rewriter"""
+        counts = Counter(name.strip() for name in category_names if name and name.strip())
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"categories": dict(counts.most_common())}, f)
+        return len(counts)
+    
+    def coverage(self, query):
+        """Fraction of the query tokens that occur in the vocabulary (1.0 for a query without tokens)"""
+        tokens = self.tokenize(query)
+        if not tokens:
+            return 1.0
+        return sum(token in self.token_index for token in tokens) / len(tokens)
+    
+    def match_categories(self, query):
+        """Best matching category names for a query"""
+        query_tokens = set(self.tokenize(query))
+        shared = Counter()
+        for token in query_tokens:
+            for position in self.token_index.get(token, ()):
+                shared[position] += self.idf[token]
+        
+        scored = []
+        for position, shared_idf in shared.items():
+            category_idf = sum(self.idf[token] for token in self.category_tokens[position])
+            score = shared_idf / category_idf
+            if score >= self.min_score:
+                scored.append((score, shared_idf, self.categories[position]))
+        
+        scored.sort(key=lambda item: (item[0], item[1]), reverse=True)
+        return [name for _, _, name in scored[:self.max_categories]]
+    
+    def rewrite(self, query):
+        """The query followed by its matching categories, or the bare query without a match"""
+        query = (query or "").strip()
+        categories = self.match_categories(query)
+        if not categories:
+            return query
+        return f"{query}\nCategories: {', '.join(categories)}"
@@ -0,0 +1,94 @@
+import os
+import json
+import hashlib
+import threading
+from app.utils.cache import LRUCache
+from app.utils.query_categorizer import QueryCategorizer
+
+class SearchResultCache:
+    # Elasticsearch refuses to page past index.max_result_window
+    MAX_DEPTH = 10000
+    
+    def __init__(self, max_size=None, ttl=None, top_k=None):
+        self.max_size = int(os.getenv('SEARCH_RESULT_CACHE_SIZE', '1000')) if max_size is None else max_size
+        self.ttl = int(os.getenv('SEARCH_RESULT_CACHE_TTL', '300')) if ttl is None else ttl
+        self.top_k = int(os.getenv('SEARCH_RESULT_CACHE_TOP_K', '100')) if top_k is None else top_k
+        
+        # Ranked results per search: (results, total_results)
+        self.cache = LRUCache(max_size=self.max_size, ttl=self.ttl)
+        
+        # Bumped on every invalidation so that searches started before it are not cached
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.invalidations = 0
+        self.depth_misses = 0
+    
+    @property
+    def enabled(self):
+        return self.max_size > 0 and self.ttl > 0
+    
+    @staticmethod
+    def make_key(query, result_columns=None, country_code=None, date_from=None, date_to=None, search_mode=None, lexical_weight=None):
+        """Key a search by its normalized query text, filters, columns, search mode and hybrid weight"""
+        key = [
+            QueryCategorizer.normalize_query(query),
+            sorted(result_columns or []),
+            country_code,
+            date_from,
+            date_to,
+            search_mode
+        ]
+        if lexical_weight is not None:
+            key.append(float(lexical_weight))
+        return hashlib.sha256(json.dumps(key, default=str).encode("utf-8")).hexdigest()
+    
+    def depth(self, page, page_size):
+        """Number of ranked results to retrieve so that the requested page is covered"""
+        return min(max(self.top_k, page * page_size), self.MAX_DEPTH)
+    
+    def get_page(self, key, page, page_size):
+        """Return (results, total_results) for one page of a cached ranking, or None on a miss"""
+        if not self.enabled:
+            return None
+        
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        
+        results, total_results = entry
+        start = (page - 1) * page_size
+        end = start + page_size
+        
+        # Pages past the cached depth need a deeper search
+        if end > len(results) and len(results) < total_results:
+            with self.lock:
+                self.depth_misses += 1
+            return None
+        
+        return results[start:end], total_results
+    
+    def put(self, key, results, total_results, generation=None):
+        """Cache a ranking unless the index changed since generation was read"""
+        if not self.enabled:
+            return
+        
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return
+            self.cache.put(key, (results, total_results))
+    
+    def invalidate(self):
+        """Drop every cached ranking (called when the index is modified)"""
+        with self.lock:
+            self.generation += 1
+            self.invalidations += 1
+            self.cache.clear()
+    
+    def stats(self):
+        """Return cache counters for monitoring"""
+        stats = self.cache.stats()
+        stats["ttl"] = self.ttl
+        stats["top_k"] = self.top_k
+        stats["invalidations"] = self.invalidations
+        stats["depth_misses"] = self.depth_misses
+        return stats
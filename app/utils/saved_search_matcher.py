@@ -0,0 +1,158 @@
+import os
+import threading
+import time
+import numpy as np
+from app.utils.elastic_handler import ElasticHandler
+from app.utils.local_index import MISSING_DATE, to_epoch_seconds
+from app.utils.vector_codec import decode_vectors
+
+# Open bounds of a saved search without a date filter
+NO_DATE_FROM = np.iinfo(np.int64).min + 1
+NO_DATE_TO = np.iinfo(np.int64).max
+
+# Percolator-style matching of saved searches against newly indexed tenders. The saved
+# search embeddings are held as one unit-vector matrix; each ingested batch of tenders is
+# scored against all of them with a single matrix multiply (best category vector per tender,
+# like the Elasticsearch queries), the country and date filters are applied as masks, and
+# matches above the threshold are queued in the saved_search_matches table. Work grows with
+# new tenders x saved searches, independently of the corpus size.
+class SavedSearchMatcher:
+    def __init__(self, db_operation, threshold=None, reload_interval=None, batch_size=1024):
+        self.db_operation = db_operation
+        # ada-002 cosines are compressed into roughly 0.7-1.0 (unrelated texts already score
+        # 0.7-0.8), so the default sits where related tender categories start
+        self.threshold = float(os.getenv('SAVED_SEARCH_MATCH_THRESHOLD', '0.88')) if threshold is None else threshold
+        self.reload_interval = float(os.getenv('SAVED_SEARCH_RELOAD_INTERVAL', '60')) if reload_interval is None else reload_interval
+        self.batch_size = batch_size
+        
+        # Saved searches as columns: ids, unit vectors (m, dims), filters and thresholds
+        self.lock = threading.Lock()
+        self.search_ids = []
+        self.vectors = np.empty((0, 1536), dtype=np.float32)
+        self.countries = np.empty(0, dtype=np.int32)
+        self.country_codes = {}
+        self.dates_from = np.empty(0, dtype=np.int64)
+        self.dates_to = np.empty(0, dtype=np.int64)
+        self.thresholds = np.empty(0, dtype=np.float32)
+        self.loaded_at = None
+        
+        # Metrics
+        self.tenders_matched = 0
+        self.matches = 0
+        self.match_seconds = 0.0
+    
+    def reload(self):
+        """Read the saved searches from the database"""
+        try:
+            rows = self.db_operation.get_saved_search_vectors()
+        except Exception as e:
+            print(f"Error loading saved searches: {e}")
+            rows = None
+        
+        with self.lock:
+            self.loaded_at = time.monotonic()
+            if rows is None:
+                return
+            
+            vectors = decode_vectors([row[1] for row in rows])
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            np.divide(vectors, norms, out=vectors, where=norms > 0)
+            
+            dates_from = [to_epoch_seconds(row[3]) for row in rows]
+            dates_to = [to_epoch_seconds(row[4]) for row in rows]
+            
+            # Countries as integer codes (-1 without a country filter) for vectorized comparison
+            country_codes = {}
+            countries = [country_codes.setdefault(row[2], len(country_codes)) if row[2] else -1 for row in rows]
+            
+            self.search_ids = [row[0] for row in rows]
+            self.vectors = vectors
+            self.countries = np.asarray(countries, dtype=np.int32)
+            self.country_codes = country_codes
+            self.dates_from = np.asarray([NO_DATE_FROM if value is None else value for value in dates_from], dtype=np.int64)
+            self.dates_to = np.asarray([NO_DATE_TO if value is None else value for value in dates_to], dtype=np.int64)
+            self.thresholds = np.asarray([self.threshold if row[5] is None else row[5] for row in rows], dtype=np.float32)
+    
+    def invalidate(self):
+        """Reload the saved searches on the next match (called when one is saved or deleted)"""
+        with self.lock:
+            self.loaded_at = None
+    
+    def ensure_loaded(self):
+        """Reload the saved searches when they are missing or older than reload_interval"""
+        if self.loaded_at is None or time.monotonic() - self.loaded_at >= self.reload_interval:
+            self.reload()
+    
+    def match(self, tenders):
+        """Return (search_id, tender_id, score) for every tender matching a saved search"""
+        self.ensure_loaded()
+        with self.lock:
+            search_ids = self.search_ids
+            vectors = self.vectors
+            countries = self.countries
+            country_codes = self.country_codes
+            dates_from = self.dates_from
+            dates_to = self.dates_to
+            thresholds = self.thresholds
+        
+        if not search_ids:
+            return []
+        
+        has_country = countries >= 0
+        has_dates = (dates_from != NO_DATE_FROM) | (dates_to != NO_DATE_TO)
+        
+        matches = []
+        for start in range(0, len(tenders), self.batch_size):
+            batch = tenders[start:start + self.batch_size]
+            
+            # Best clamped cosine similarity per (tender, saved search) over the category vectors;
+            # a missing category is a zero row and scores 0
+            scores = np.zeros((len(batch), len(search_ids)), dtype=np.float32)
+            for field in ElasticHandler.VECTOR_FIELDS:
+                rows = np.zeros((len(batch), vectors.shape[1]), dtype=np.float32)
+                for position, tender in enumerate(batch):
+                    if tender.get(field) is not None:
+                        rows[position] = tender[field]
+                norms = np.linalg.norm(rows, axis=1, keepdims=True)
+                np.divide(rows, norms, out=rows, where=norms > 0)
+                np.maximum(scores, rows @ vectors.T, out=scores)
+            
+            # Filters as (tenders, saved searches) masks
+            tender_countries = np.asarray([country_codes.get(tender.get("ePublisherCountryName"), -2) for tender in batch], dtype=np.int32)
+            published = [to_epoch_seconds(tender.get("ePublicationDate")) for tender in batch]
+            published = np.asarray([MISSING_DATE if value is None else value for value in published], dtype=np.int64)[:, np.newaxis]
+            
+            mask = (scores >= thresholds) & (scores > 0)
+            mask &= ~has_country | (tender_countries[:, np.newaxis] == countries)
+            mask &= ~has_dates | ((published != MISSING_DATE) & (published >= dates_from) & (published <= dates_to))
+            
+            for tender_row, search_column in zip(*np.nonzero(mask)):
+                matches.append((search_ids[search_column], batch[tender_row]["ID"], float(scores[tender_row, search_column])))
+        
+        return matches
+    
+    def on_tenders_indexed(self, tenders):
+        """Ingest listener: queue the saved-search matches of newly indexed tenders"""
+        start = time.perf_counter()
+        matches = self.match(tenders)
+        self.db_operation.store_saved_search_matches(matches)
+        
+        with self.lock:
+            self.tenders_matched += len(tenders)
+            self.matches += len(matches)
+            self.match_seconds += time.perf_counter() - start
+        return len(matches)
+    
+    def attach(self, elastic_handler):
+        """Match every batch of tenders the handler indexes"""
+        elastic_handler.add_ingest_listener(self.on_tenders_indexed)
+    
+    def stats(self):
+        """Return matching counters for monitoring"""
+        return {
+            "saved_searches": len(self.search_ids),
+            "threshold": self.threshold,
+            "tenders_matched": self.tenders_matched,
+            "matches": self.matches,
+            "match_seconds": self.match_seconds
+        }
@@ -0,0 +1,83 @@
+import os
+import asyncio
+import threading
+
+# Request coalescing ("single flight"): while a call for a key is in flight, identical calls
+# wait for it and share its result (or exception) instead of repeating the work. Nothing is
+# kept once the call returns; caching stays with the caches. REQUEST_COALESCING=false turns
+# it off.
+class SingleFlight:
+    def __init__(self, enabled=None):
+        self.enabled = os.getenv('REQUEST_COALESCING', 'true').lower() == 'true' if enabled is None else enabled
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        
+        # Metrics
+        self.calls = 0
+        self.collapsed = 0
+    
+    def do(self, key, function, *args, **kwargs):
+        """Run function(*args, **kwargs), or wait for the identical call already running for key"""
+        if not self.enabled:
+            return function(*args, **kwargs)
+        
+        with self.lock:
+            self.calls += 1
+            call = self.in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = self.in_flight[key] = {"done": threading.Event(), "result": None, "error": None}
+            else:
+                self.collapsed += 1
+        
+        if not leader:
+            call["done"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["result"]
+        
+        try:
+            call["result"] = function(*args, **kwargs)
+            return call["result"]
+        except Exception as e:
+            call["error"] = e
+            raise
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+            call["done"].set()
+    
+    def stats(self):
+        """Return how many calls were made and how many of them waited on another one"""
+        with self.lock:
+            return {
+                "enabled": self.enabled,
+                "calls": self.calls,
+                "collapsed": self.collapsed,
+                "in_flight": len(self.in_flight)
+            }
+
+# Single flight for coroutines on one event loop: the first caller's coroutine runs as a
+# task that every identical caller awaits (shielded, so one cancelled request does not
+# cancel the others).
+class AsyncSingleFlight(SingleFlight):
+    async def do(self, key, function, *args, **kwargs):
+        """Await function(*args, **kwargs), or the identical call already running for key"""
+        if not self.enabled:
+            return await function(*args, **kwargs)
+        
+        with self.lock:
+            self.calls += 1
+            task = self.in_flight.get(key)
+            if task is None:
+                task = self.in_flight[key] = asyncio.ensure_future(function(*args, **kwargs))
+                task.add_done_callback(lambda _: self.forget(key))
+            else:
+                self.collapsed += 1
+        
+        return await asyncio.shield(task)
+    
+    def forget(self, key):
+        """Drop a finished call"""
+        with self.lock:
+            self.in_flight.pop(key, None)
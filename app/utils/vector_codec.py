@@ -0,0 +1,82 @@
+import struct
+import numpy as np
+
+# Binary embedding format: one format byte followed by the little-endian vector data.
+# int8 vectors store a float32 scale before the quantized values (value = q * scale).
+# float64 is used for running sums (feedback aggregates), where float32 would drift.
+FORMAT_FLOAT32 = 1
+FORMAT_FLOAT16 = 2
+FORMAT_INT8 = 3
+FORMAT_FLOAT64 = 4
+
+FORMATS = {"float32": FORMAT_FLOAT32, "float16": FORMAT_FLOAT16, "int8": FORMAT_INT8, "float64": FORMAT_FLOAT64}
+
+def encode_vector(vector, dtype="float32"):
+    """Pack an embedding into the binary storage format"""
+    if dtype == "float64":
+        return bytes([FORMAT_FLOAT64]) + np.asarray(vector, dtype='<f8').tobytes()
+    
+    vector = np.asarray(vector, dtype=np.float32)
+    
+    if dtype == "float32":
+        return bytes([FORMAT_FLOAT32]) + vector.astype('<f4').tobytes()
+    
+    if dtype == "float16":
+        return bytes([FORMAT_FLOAT16]) + vector.astype('<f2').tobytes()
+    
+    if dtype == "int8":
+        # Symmetric per-vector quantization
+        max_abs = float(np.abs(vector).max()) if vector.size else 0.0
+        scale = max_abs / 127 if max_abs > 0 else 1.0
+        quantized = np.clip(np.rint(vector / scale), -127, 127).astype(np.int8)
+        return bytes([FORMAT_INT8]) + struct.pack('<f', scale) + quantized.tobytes()
+    
+    raise ValueError(f"Unknown embedding dtype: {dtype}")
+
+def decode_vector(blob):
+    """Unpack a binary embedding into a float32 array (float64 for float64 blobs)"""
+    format_tag = blob[0]
+    
+    if format_tag == FORMAT_FLOAT32:
+        return np.frombuffer(blob, dtype='<f4', offset=1)
+    
+    if format_tag == FORMAT_FLOAT16:
+        return np.frombuffer(blob, dtype='<f2', offset=1).astype(np.float32)
+    
+    if format_tag == FORMAT_INT8:
+        scale = struct.unpack_from('<f', blob, 1)[0]
+        return np.frombuffer(blob, dtype=np.int8, offset=5).astype(np.float32) * np.float32(scale)
+    
+    if format_tag == FORMAT_FLOAT64:
+        return np.frombuffer(blob, dtype='<f8', offset=1)
+    
+    raise ValueError(f"Unknown embedding format: {format_tag}")
+
+def vector_dims(blob):
+    """Number of dimensions stored in a binary embedding"""
+    format_tag = blob[0]
+    if format_tag == FORMAT_FLOAT32:
+        return (len(blob) - 1) // 4
+    if format_tag == FORMAT_FLOAT16:
+        return (len(blob) - 1) // 2
+    if format_tag == FORMAT_INT8:
+        return len(blob) - 5
+    if format_tag == FORMAT_FLOAT64:
+        return (len(blob) - 1) // 8
+    raise ValueError(f"Unknown embedding format: {format_tag}")
+
+def decode_vectors(blobs, dims=None):
+    """Decode binary embeddings into one contiguous (n, dims) float32 matrix, skipping empty ones"""
+    blobs = [blob for blob in blobs if blob]
+    if dims is None:
+        dims = vector_dims(blobs[0]) if blobs else 1536
+    matrix = np.empty((len(blobs), dims), dtype=np.float32)
+    
+    for row, blob in enumerate(blobs):
+        if blob[0] == FORMAT_FLOAT32:
+            # Copy straight from the buffer without an intermediate array
+            matrix[row] = np.frombuffer(blob, dtype='<f4', offset=1)
+        else:
+            matrix[row] = decode_vector(blob)
+    
+    return matrix
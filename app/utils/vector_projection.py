@@ -0,0 +1,100 @@
+import os
+import base64
+import numpy as np
+
+# Reduces embeddings to fewer dimensions before they are indexed or searched.
+# "truncate" keeps the leading dimensions (Matryoshka-style, only meaningful for models
+# trained that way), "pca" projects on principal components fitted on the corpus and stored
+# with the index (to_document, kept in the profile index by ElasticHandler). Projected vectors are re-normalized so that cosine scores stay in range.
+METHODS = ["none", "truncate", "pca"]
+
+class VectorProjection:
+    def __init__(self, method="none", dims=1536, mean=None, components=None, path=None):
+        if method not in METHODS:
+            raise ValueError(f"Unknown projection method: {method}")
+        if method == "pca" and components is None:
+            raise ValueError("PCA projection needs fitted components")
+        
+        self.method = method
+        self.dims = dims
+        self.mean = mean
+        self.components = components
+        self.path = path
+    
+    @classmethod
+    def fit_pca(cls, vectors, dims, path=None):
+        """Fit a PCA projection to dims components on a sample of embeddings"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.shape[0] < dims:
+            raise ValueError(f"Need at least {dims} sample vectors to fit {dims} components, got {vectors.shape[0]}")
+        
+        mean = vectors.mean(axis=0)
+        
+        # Principal axes are the right singular vectors of the centered sample
+        _, _, vt = np.linalg.svd(vectors - mean, full_matrices=False)
+        return cls("pca", dims, mean.astype(np.float32), np.ascontiguousarray(vt[:dims], dtype=np.float32), path)
+    
+    def project(self, vectors):
+        """Project one (dims,) embedding or an (n, dims) matrix, returning float32 unit vectors"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.method == "none":
+            return vectors
+        
+        if self.method == "truncate":
+            projected = vectors[..., :self.dims].copy()
+        else:
+            projected = (vectors - self.mean) @ self.components.T
+        
+        norms = np.linalg.norm(projected, axis=-1, keepdims=True)
+        np.divide(projected, norms, out=projected, where=norms > 0)
+        return projected
+    
+    def save(self, path=None):
+        """Store the fitted PCA components in an .npz file"""
+        path = path or self.path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        np.savez(path, mean=self.mean, components=self.components)
+        self.path = path
+    
+    @classmethod
+    def load(cls, path):
+        """Load PCA components saved with save()"""
+        with np.load(path) as data:
+            components = data["components"]
+            return cls("pca", components.shape[0], data["mean"], components, path)
+    
+    def to_meta(self):
+        """Description stored in the index mapping _meta (the PCA components go in to_document)"""
+        return {"method": self.method, "dims": self.dims}
+    
+    def to_document(self):
+        """Description with the PCA components, for the profile index and local index snapshots"""
+        document = self.to_meta()
+        if self.method == "pca":
+            document["mean"] = base64.b64encode(np.asarray(self.mean, dtype="<f4").tobytes()).decode("ascii")
+            document["components"] = base64.b64encode(np.asarray(self.components, dtype="<f4").tobytes()).decode("ascii")
+        return document
+    
+    @classmethod
+    def from_meta(cls, meta, document=None):
+        """Rebuild the projection described in an index mapping _meta, with the PCA components from document
+        
+        The components are read from document, from meta itself (to_document output) or, for
+        indices created before they were stored with the index, from the .npz file in meta["path"].
+        Raises ValueError when they cannot be found.
+        """
+        if meta.get("method") != "pca":
+            return cls(meta.get("method", "none"), int(meta.get("dims", 1536)))
+        
+        source = document if document is not None else meta
+        if "components" in source:
+            mean = np.frombuffer(base64.b64decode(source["mean"]), dtype="<f4")
+            components = np.frombuffer(base64.b64decode(source["components"]), dtype="<f4").reshape(int(meta["dims"]), -1)
+            return cls("pca", int(meta["dims"]), mean, components)
+        
+        path = meta.get("path")
+        if path and os.path.exists(path):
+            return cls.load(path)
+        raise ValueError(f"PCA components of the index profile are missing (file: {path or 'none'})")
@@ -0,0 +1,419 @@
+import asyncio
+import uuid
+from quart import Quart, request, jsonify, render_template
+from quart_cors import cors
+from app.utils.async_search import AsyncSearchService
+from app.utils.batch_search import BatchSearch
+from app.utils.database_operation import DatabaseOperation
+from app.utils.elastic_handler import ElasticHandler
+from app.utils.metrics import metrics
+from app.utils.openai_embedding import OpenAIEmbedding
+from app.utils.openai_resilience import OpenAIUnavailableError, retry_after_header
+from app.utils.prompt import Prompt
+from app.utils.query_categorizer import QueryCategorizer
+from app.utils.query_processor import QueryProcessor
+from app.utils.query_rewriter import QueryRewriter
+from app.utils.result_cache import SearchResultCache
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# ASGI variant of app.py: run with an ASGI server, e.g. `hypercorn asgi_app:app`
+app = Quart(__name__, 
+            static_folder='app/static',
+            template_folder='app/templates')
+app = cors(app)
+
+# Initialize components
+db_operation = DatabaseOperation()
+elastic_handler = ElasticHandler()
+openai_embedding = OpenAIEmbedding()
+prompt_generator = Prompt()
+query_categorizer = QueryCategorizer(openai_embedding, prompt_generator)
+query_processor = QueryProcessor(query_categorizer, QueryRewriter())
+search_service = AsyncSearchService(db_operation, elastic_handler, openai_embedding, query_categorizer, query_processor)
+search_result_cache = SearchResultCache()
+
+# Cached rankings are dropped whenever tenders are indexed or deleted
+elastic_handler.add_index_listener(search_result_cache.invalidate)
+
+# Read the vector profile of the index now: missing PCA components stop the app here
+elastic_handler.load_vector_profile(strict=True)
+
+# Authentication middleware
+def authenticate(request):
+    auth_token = request.headers.get('Authorization')
+    expected_token = "Bearer T#nde0o43kl^4opkSD"
+    
+    if not auth_token or auth_token != expected_token:
+        return False
+    return True
+
+# Time every request and its stages; optionally report them in a Server-Timing header
+@app.before_request
+async def start_request_metrics():
+    metrics.start_request(request.endpoint)
+
+@app.after_request
+async def finish_request_metrics(response):
+    timings = metrics.finish_request(response.status_code)
+    if timings and metrics.server_timing:
+        response.headers['Server-Timing'] = metrics.server_timing_header(timings)
+    return response
+
+@app.after_serving
+async def shutdown():
+    await search_service.close()
+
+@app.route('/')
+async def index():
+    """Serve the main application page"""
+    return await render_template('index.html')
+
+@app.route('/tenders_search', methods=['POST'])
+async def tenders_search():
+    # Authenticate request
+    if not authenticate(request):
+        return jsonify({"error": "Unauthorized access"}), 401
+    
+    try:
+        data = await request.get_json()
+        query = data.get('query', '')
+        result_columns = data.get('result_columns', [])
+        country_code = data.get('country_code')
+        date_from = data.get('date_from')
+        date_to = data.get('date_to')
+        page = data.get('page', 1)
+        page_size = data.get('page_size', 10)
+        search_mode = data.get('search_mode')
+        lexical_weight = data.get('lexical_weight')
+        pagination_mode = data.get('pagination_mode')
+        cursor = data.get('cursor')
+        
+        # Cursor pagination: a point-in-time search continued with search_after
+        if cursor or pagination_mode == 'cursor':
+            query_embedding = await search_service.embed_query(query)
+            search_results = await search_service.search_tenders_after(
+                query_embedding, 
+                result_columns, 
+                country_code, 
+                date_from, 
+                date_to, 
+                page_size, 
+                cursor
+            )
+            return jsonify(search_results)
+        
+        # Serve pages of a recent identical search from its cached ranking, once index changes
+        # made by other processes have been picked up
+        await search_service.ensure_vector_profile()
+        cache_key = search_result_cache.make_key(query, result_columns, country_code, date_from, date_to, search_mode, lexical_weight)
+        cached_page = search_result_cache.get_page(cache_key, page, page_size)
+        if cached_page is not None:
+            return jsonify(elastic_handler.paginate(*cached_page, page, page_size))
+        generation = search_result_cache.generation
+        
+        # Categorize and embed the query
+        query_embedding = await search_service.embed_query(query)
+        
+        # Search in Elasticsearch, ranking enough results to serve the following pages
+        ranked_results = await search_service.search_ranked_tenders(
+            query_embedding, 
+            result_columns, 
+            country_code, 
+            date_from, 
+            date_to, 
+            search_result_cache.depth(page, page_size),
+            search_mode,
+            query,
+            lexical_weight
+        )
+        if ranked_results is None:
+            # Elasticsearch failed: answer from the local index (if any) without caching
+            search_results = await asyncio.to_thread(
+                elastic_handler.search_local_page,
+                query_embedding, result_columns, country_code, date_from, date_to, page, page_size, search_mode
+            )
+            return jsonify(search_results)
+        
+        results, total_results = ranked_results
+        search_result_cache.put(cache_key, results, total_results, generation)
+        
+        start = (page - 1) * page_size
+        return jsonify(elastic_handler.paginate(results[start:start + page_size], total_results, page, page_size))
+    
+    except OpenAIUnavailableError as e:
+        return jsonify({"error": str(e)}), 503, retry_after_header(e)
+    
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/tenders_search_batch', methods=['POST'])
+async def tenders_search_batch():
+    # Authenticate request
+    if not authenticate(request):
+        return jsonify({"error": "Unauthorized access"}), 401
+    
+    try:
+        data = await request.get_json()
+        await search_service.ensure_vector_profile()
+        batch = BatchSearch(data.get('searches'), search_result_cache)
+        
+        # Process the distinct queries (LLM calls run concurrently) and embed them in one batched call
+        processed_queries = await search_service.process_many(batch.queries())
+        query_embeddings = await search_service.generate_embeddings(processed_queries)
+        
+        # Rank every distinct search in a single multi-search round-trip
+        searches = batch.ranked_searches(query_embeddings)
+        failed = batch.resolve(searches, await search_service.search_ranked_tenders_batch(searches))
+        
+        # Failed searches are answered from the local index (if any) without caching
+        for position, search, page, page_size in failed:
+            batch.results[position] = await asyncio.to_thread(
+                elastic_handler.search_local_page,
+                search["query_embedding"], search["result_columns"], search["country_code"], search["date_from"], 
+                search["date_to"], page, page_size, search["search_mode"]
+            )
+        
+        return jsonify({"results": batch.results})
+    
+    except OpenAIUnavailableError as e:
+        return jsonify({"error": str(e)}), 503, retry_after_header(e)
+    
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/customer_feedback', methods=['POST'])
+async def customer_feedback():
+    # Authenticate request
+    if not authenticate(request):
+        return jsonify({"error": "Unauthorized access"}), 401
+    
+    try:
+        data = await request.get_json()
+        query_id = data.get('query_id')
+        search_query = data.get('search_query')
+        feedback_list = data.get('feedback_list', [])
+        client_id = data.get('client_id')
+        
+        # Validate required fields
+        if not query_id or not search_query or not feedback_list:
+            return jsonify({"error": "Missing required fields"}), 400
+        
+        # Validate feedback list format
+        for feedback in feedback_list:
+            if 'ID' not in feedback or 'feedback' not in feedback:
+                return jsonify({"error": "Invalid feedback format"}), 400
+        
+        # Store feedback in database (write path, kept on the sync client in a worker thread)
+        await asyncio.to_thread(db_operation.store_feedback, query_id, search_query, feedback_list, client_id)
+        
+        return jsonify({"success": True, "message": "Feedback submitted successfully"})
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/tenders_search_with_feedback', methods=['POST'])
+async def tenders_search_with_feedback():
+    # Authenticate request
+    if not authenticate(request):
+        return jsonify({"error": "Unauthorized access"}), 401
+    
+    try:
+        data = await request.get_json()
+        query_id = data.get('query_id')
+        query = data.get('query', '')
+        result_columns = data.get('result_columns', [])
+        
+        # Fetch the feedback from database while the query is categorized and embedded
+        if query:
+            (positive_feedback, negative_feedback, positive_weights, negative_weights), final_embedding = await asyncio.gather(
+                search_service.get_feedback('query', query_id),
+                search_service.embed_query(query)
+            )
+        else:
+            positive_feedback, negative_feedback, positive_weights, negative_weights = await search_service.get_feedback('query', query_id)
+            final_embedding = None
+        
+        # Combine with feedback embeddings (alpha=1.0, beta=0.5)
+        final_embedding = openai_embedding.combine_with_feedback(
+            final_embedding, 
+            positive_feedback, 
+            negative_feedback, 
+            alpha=1.0, 
+            beta=0.5,
+            positive_weights=positive_weights,
+            negative_weights=negative_weights
+        )
+        
+        # Search with combined embedding
+        search_results = await search_service.search_tenders(
+            final_embedding, 
+            result_columns
+        )
+        
+        return jsonify(search_results)
+    
+    except OpenAIUnavailableError as e:
+        return jsonify({"error": str(e)}), 503, retry_after_header(e)
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/tenders_search_by_feedback', methods=['POST'])
+async def tenders_search_by_feedback():
+    # Authenticate request
+    if not authenticate(request):
+        return jsonify({"error": "Unauthorized access"}), 401
+    
+    try:
+        data = await request.get_json()
+        client_id = data.get('client_id')
+        result_columns = data.get('result_columns', [])
+        
+        # Fetch the feedback from database based on client ID
+        positive_feedback, negative_feedback, positive_weights, negative_weights = await search_service.get_feedback('client', client_id)
+        
+        # Generate final embedding from feedback
+        final_embedding = openai_embedding.combine_feedback_only(
+            positive_feedback, 
+            negative_feedback, 
+            beta=0.5,
+            positive_weights=positive_weights,
+            negative_weights=negative_weights
+        )
+        
+        # Search with feedback embedding
+        search_results = await search_service.search_tenders(
+            final_embedding, 
+            result_columns
+        )
+        
+        return jsonify(search_results)
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/saved_searches', methods=['POST'])
+async def create_saved_search():
+    # Authenticate request
+    if not authenticate(request):
+        return jsonify({"error": "Unauthorized access"}), 401
+    
+    try:
+        data = await request.get_json()
+        client_id = data.get('client_id')
+        query = data.get('query')
+        
+        # Validate required fields
+        if not client_id or not query:
+            return jsonify({"error": "Missing required fields"}), 400
+        
+        # Embed the query like /tenders_search so that alerts match what a search would return
+        query_embedding = await search_service.embed_query(query)
+        
+        # Write path, kept on the sync client in a worker thread
+        search_id = data.get('search_id') or str(uuid.uuid4())
+        await asyncio.to_thread(
+            db_operation.store_saved_search,
+            search_id, client_id, query, query_embedding, data.get('country_code'), 
+            data.get('date_from'), data.get('date_to'), data.get('threshold')
+        )
+        
+        return jsonify({"success": True, "search_id": search_id})
+    
+    except OpenAIUnavailableError as e:
+        return jsonify({"error": str(e)}), 503, retry_after_header(e)
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/saved_searches', methods=['GET'])
+async def list_saved_searches():
+    # Authenticate request
+    if not authenticate(request):
+        return jsonify({"error": "Unauthorized access"}), 401
+    
+    try:
+        client_id = request.args.get('client_id')
+        if not client_id:
+            return jsonify({"error": "Missing required fields"}), 400
+        
+        columns = ["search_id", "client_id", "query", "country_code", "date_from", "date_to", "threshold"]
+        rows = await asyncio.to_thread(db_operation.get_saved_searches, client_id)
+        return jsonify({"saved_searches": [dict(zip(columns, row)) for row in rows]})
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/saved_searches/<search_id>', methods=['DELETE'])
+async def delete_saved_search(search_id):
+    # Authenticate request
+    if not authenticate(request):
+        return jsonify({"error": "Unauthorized access"}), 401
+    
+    try:
+        if not await asyncio.to_thread(db_operation.delete_saved_search, search_id):
+            return jsonify({"error": "Saved search not found"}), 404
+        return jsonify({"success": True})
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/saved_search_matches', methods=['GET'])
+async def saved_search_matches():
+    # Authenticate request
+    if not authenticate(request):
+        return jsonify({"error": "Unauthorized access"}), 401
+    
+    try:
+        client_id = request.args.get('client_id')
+        if not client_id:
+            return jsonify({"error": "Missing required fields"}), 400
+        after_id = request.args.get('after_id', 0, type=int)
+        limit = min(request.args.get('limit', 100, type=int), 1000)
+        
+        # Matches are queued by the ingest process; clients poll with the last id they saw
+        rows = await asyncio.to_thread(db_operation.get_saved_search_matches, client_id, after_id, limit)
+        matches = [
+            {"id": match_id, "search_id": search_id, "tender_id": tender_id, "score": score, "matched_at": str(matched_at)}
+            for match_id, search_id, tender_id, score, matched_at in rows
+        ]
+        return jsonify({"matches": matches, "last_id": matches[-1]["id"] if matches else after_id})
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/stats', methods=['GET'])
+async def stats():
+    # Authenticate request
+    if not authenticate(request):
+        return jsonify({"error": "Unauthorized access"}), 401
+    
+    return jsonify({
+        "latency": metrics.stats(),
+        "categorization_cache": query_categorizer.stats(),
+        "query_processing": query_processor.stats(),
+        "embedding_cache": openai_embedding.embedding_cache.stats(),
+        "openai": openai_embedding.resilience.stats(),
+        "coalescing": search_service.coalescing_stats(),
+        "search_result_cache": search_result_cache.stats()
+    })
+
+@app.route('/metrics', methods=['GET'])
+async def prometheus_metrics():
+    # Authenticate request
+    if not authenticate(request):
+        return jsonify({"error": "Unauthorized access"}), 401
+    
+    return metrics.render_prometheus(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+if __name__ == '__main__':
+    app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1 @@
+# This file makes the benchmarks directory a Python package 
\ No newline at end of file
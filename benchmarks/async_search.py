@@ -0,0 +1,133 @@
+"""Load test comparing the sync Flask search path with the async ASGI search path.
+
+Both apps run in-process against the stubs in benchmarks.stubs, so the numbers reflect how
+well each path overlaps network waits rather than real upstream latency. The sync app is
+driven the way one Flask worker serves traffic (one request at a time); the async app is
+driven with --concurrency requests in flight.
+
+Usage:
+    python -m benchmarks.async_search --requests 200 --concurrency 50
+"""
+import argparse
+import asyncio
+import importlib.util
+import os
+import time
+import numpy as np
+
+AUTH_HEADERS = {"Authorization": "Bearer T#nde0o43kl^4opkSD"}
+
+# Every query is unique and the caches are disabled, so each request pays for every stage
+os.environ["EMBEDDING_CACHE_PATH"] = ""
+os.environ["EMBEDDING_CACHE_MEMORY_SIZE"] = "0"
+os.environ["CATEGORIZATION_CACHE_PATH"] = ""
+os.environ["CATEGORIZATION_CACHE_SIZE"] = "0"
+os.environ["SEARCH_RESULT_CACHE_SIZE"] = "0"
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from benchmarks import stubs
+
+
+def load_module(name, filename):
+    """Import a top-level script by path (app.py is shadowed by the app package)"""
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), filename)
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def request_payload(workload, i):
+    """JSON body for the i-th request of a workload"""
+    if workload == "search":
+        return "/tenders_search", {"query": f"benchmark query {i}", "page_size": 10}
+    return "/tenders_search_with_feedback", {"query": f"benchmark query {i}", "query_id": f"query-{i}"}
+
+
+def install_sync_stubs(flask_app, args, feedback_store):
+    """Point the Flask app components at blocking stubs"""
+    openai_stub = stubs.StubOpenAI(args.chat_latency, args.embedding_latency)
+    module = flask_app.openai_embedding.__class__.__module__
+    openai_module = __import__(module, fromlist=["openai"]).openai
+    openai_module.chat = openai_stub.chat
+    openai_module.embeddings = openai_stub.embeddings
+    flask_app.elastic_handler.es = stubs.StubElasticsearch(args.es_latency)
+    flask_app.db_operation.get_feedback_centroids_by_query_id = feedback_store.get_feedback
+
+
+def install_async_stubs(asgi_app, args, feedback_store):
+    """Point the ASGI app components at non-blocking stubs"""
+    service = asgi_app.search_service
+    service.openai_client = stubs.StubAsyncOpenAI(args.chat_latency, args.embedding_latency)
+    service.es = stubs.StubAsyncElasticsearch(args.es_latency)
+    service.get_feedback_centroids_by_query_id = feedback_store.get_feedback_async
+
+
+def run_sync(flask_app, workload, requests):
+    """Serve requests one at a time, like a single sync Flask worker"""
+    client = flask_app.app.test_client()
+    latencies = []
+    start = time.perf_counter()
+    for i in range(requests):
+        path, payload = request_payload(workload, i)
+        request_start = time.perf_counter()
+        response = client.post(path, json=payload, headers=AUTH_HEADERS)
+        latencies.append(time.perf_counter() - request_start)
+        assert response.status_code == 200, response.get_data(as_text=True)
+    return time.perf_counter() - start, latencies
+
+
+async def run_async(asgi_app, workload, requests, concurrency):
+    """Serve requests with up to `concurrency` in flight on one event loop"""
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async with asgi_app.app.test_app() as test_app:
+        client = test_app.test_client()
+        
+        async def one_request(i):
+            path, payload = request_payload(workload, i)
+            async with semaphore:
+                request_start = time.perf_counter()
+                response = await client.post(path, json=payload, headers=AUTH_HEADERS)
+                latencies.append(time.perf_counter() - request_start)
+                assert response.status_code == 200, await response.get_data(as_text=True)
+        
+        start = time.perf_counter()
+        await asyncio.gather(*(one_request(i) for i in range(requests)))
+        return time.perf_counter() - start, latencies
+
+
+def report(label, elapsed, latencies):
+    """Print throughput and latency percentiles"""
+    latencies_ms = np.array(latencies) * 1000
+    print(f"{label:<36} {len(latencies) / elapsed:8.1f} req/s  "
+          f"p50={np.percentile(latencies_ms, 50):8.1f}ms  p99={np.percentile(latencies_ms, 99):8.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--workload", choices=["search", "search_with_feedback"], nargs="+", default=["search", "search_with_feedback"])
+    parser.add_argument("--chat-latency", type=float, default=0.3, help="Stub chat completion latency in seconds")
+    parser.add_argument("--embedding-latency", type=float, default=0.1, help="Stub embedding latency in seconds")
+    parser.add_argument("--es-latency", type=float, default=0.05, help="Stub Elasticsearch latency in seconds")
+    parser.add_argument("--mysql-latency", type=float, default=0.02, help="Stub feedback query latency in seconds")
+    args = parser.parse_args()
+    
+    feedback_store = stubs.StubFeedbackStore(args.mysql_latency)
+    
+    flask_app = load_module("flask_app", "app.py")
+    install_sync_stubs(flask_app, args, feedback_store)
+    
+    asgi_app = load_module("asgi_app", "asgi_app.py")
+    install_async_stubs(asgi_app, args, feedback_store)
+    
+    for workload in args.workload:
+        report(f"{workload} sync", *run_sync(flask_app, workload, args.requests))
+        report(f"{workload} async (c={args.concurrency})", *asyncio.run(run_async(asgi_app, workload, args.requests, args.concurrency)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Round-trips and wall time of many searches sent one by one or as one batch.
+
+Runs the Flask app in-process against the stubs in benchmarks.stubs and issues --searches
+saved searches (a --duplicates fraction of them repeating an earlier query) either as
+separate /tenders_search calls or as a single /tenders_search_batch call. Caches are
+disabled so that only the deduplication inside the batch is measured. Both paths must
+return the same tenders for every search.
+
+Usage:
+    python -m benchmarks.batch_search --searches 200 --duplicates 0.3
+"""
+import argparse
+import time
+import numpy as np
+from benchmarks import stubs
+from benchmarks.async_search import AUTH_HEADERS, install_sync_stubs, load_module
+
+
+def count_calls(counts, name, function):
+    """Wrap a stub call so that its invocations are counted"""
+    def counted(*args, **kwargs):
+        counts[name] += 1
+        return function(*args, **kwargs)
+    return counted
+
+
+def install_counters(flask_app, counts):
+    """Count the OpenAI and Elasticsearch round-trips made by the app"""
+    module = flask_app.openai_embedding.__class__.__module__
+    openai_module = __import__(module, fromlist=["openai"]).openai
+    openai_module.chat.completions.create = count_calls(counts, "chat", openai_module.chat.completions.create)
+    openai_module.embeddings.create = count_calls(counts, "embeddings", openai_module.embeddings.create)
+    es = flask_app.elastic_handler.es
+    es.search = count_calls(counts, "search", es.search)
+    es.msearch = count_calls(counts, "msearch", es.msearch)
+
+
+def saved_searches(rng, searches, duplicates):
+    """Search specs where a fraction of the queries repeat earlier ones"""
+    specs = []
+    for i in range(searches):
+        query_id = int(rng.integers(0, i)) if i and rng.random() < duplicates else i
+        specs.append({"query": f"saved search {query_id}", "page_size": 10})
+    return specs
+
+
+def run_sequential(client, specs):
+    """One /tenders_search call per search"""
+    results = []
+    for spec in specs:
+        response = client.post("/tenders_search", json=spec, headers=AUTH_HEADERS)
+        assert response.status_code == 200, response.get_data(as_text=True)
+        results.append(response.get_json())
+    return results
+
+
+def run_batch(client, specs):
+    """A single /tenders_search_batch call"""
+    response = client.post("/tenders_search_batch", json={"searches": specs}, headers=AUTH_HEADERS)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return response.get_json()["results"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--searches", type=int, default=200)
+    parser.add_argument("--duplicates", type=float, default=0.3, help="Fraction of searches repeating an earlier query")
+    parser.add_argument("--chat-latency", type=float, default=0.3, help="Stub chat completion latency in seconds")
+    parser.add_argument("--embedding-latency", type=float, default=0.1, help="Stub embedding latency in seconds")
+    parser.add_argument("--es-latency", type=float, default=0.05, help="Stub Elasticsearch latency in seconds")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    
+    flask_app = load_module("flask_app", "app.py")
+    install_sync_stubs(flask_app, args, stubs.StubFeedbackStore(0))
+    counts = {"chat": 0, "embeddings": 0, "search": 0, "msearch": 0}
+    install_counters(flask_app, counts)
+    client = flask_app.app.test_client()
+    specs = saved_searches(np.random.default_rng(args.seed), args.searches, args.duplicates)
+    
+    outcomes = {}
+    for label, run in [("sequential", run_sequential), ("batch", run_batch)]:
+        for name in counts:
+            counts[name] = 0
+        start = time.perf_counter()
+        outcomes[label] = run(client, specs)
+        elapsed = time.perf_counter() - start
+        print(f"{label:<12} {elapsed:8.2f}s  chat={counts['chat']:<5} embeddings={counts['embeddings']:<5} "
+              f"search={counts['search']:<5} msearch={counts['msearch']}")
+    
+    for sequential, batch in zip(outcomes["sequential"], outcomes["batch"]):
+        assert [tender["ID"] for tender in sequential["tenders"]] == [tender["ID"] for tender in batch["tenders"]]
+    print(f"{len(specs)} searches returned identical tenders on both paths")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Payload size and decode time of JSON vs binary tender embeddings.
+
+Simulates the rows returned by the feedback queries and compares the previous read path
+(json.loads per row, then np.array per row in the feedback combiner) with decoding the
+binary formats straight into one contiguous matrix.
+
+Usage:
+    python -m benchmarks.embedding_storage --rows 10 100 1000
+"""
+import argparse
+import json
+import time
+import numpy as np
+from app.utils.vector_codec import encode_vector, decode_vectors
+
+
+def best_of(function, repeat):
+    """Best wall time of several runs, in milliseconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--dims", type=int, default=1536)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    
+    rng = np.random.default_rng(0)
+    for rows in args.rows:
+        vectors = rng.normal(size=(rows, args.dims)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        
+        # Rows as MySQL returns them: JSON text (float64 repr) or binary blobs
+        json_rows = [(json.dumps(vector.astype(float).tolist()),) for vector in vectors]
+        
+        def decode_json():
+            return [np.array(json.loads(row[0])) for row in json_rows]
+        
+        print(f"{rows} rows")
+        json_bytes = sum(len(row[0]) for row in json_rows)
+        json_ms = best_of(decode_json, args.repeat)
+        print(f"  {'json':<8} {json_bytes / rows:9.0f} bytes/row  {json_ms:9.2f}ms")
+        
+        for dtype in ["float32", "float16", "int8"]:
+            binary_rows = [(encode_vector(vector, dtype),) for vector in vectors]
+            binary_bytes = sum(len(row[0]) for row in binary_rows)
+            binary_ms = best_of(lambda: decode_vectors(row[0] for row in binary_rows), args.repeat)
+            print(f"  {dtype:<8} {binary_bytes / rows:9.0f} bytes/row  {binary_ms:9.2f}ms  "
+                  f"({json_bytes / binary_bytes:.1f}x smaller, {json_ms / binary_ms:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
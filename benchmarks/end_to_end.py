@@ -0,0 +1,314 @@
+"""End-to-end throughput and latency of the Flask endpoints on local stand-ins.
+
+Serves app.py over HTTP in-process and drives it with --concurrency client threads through
+the search, paged (later pages of repeated searches), feedback_write and feedback_search
+workloads. OpenAI is replaced by FakeOpenAIServer (deterministic 1536-dim vectors with
+configurable latency) reached through OPENAI_BASE_URL, so the real OpenAI client runs.
+
+Searches go to --search-backend:
+    local          the in-process vector index, built from --tenders synthetic tenders
+    elasticsearch  a real Elasticsearch (ELASTICSEARCH_HOST), seeded into --index, e.g.
+                   docker run -p 9200:9200 -e discovery.type=single-node -e xpack.security.enabled=false elasticsearch:8.13.0
+    stub           benchmarks.stubs.StubElasticsearch
+
+Feedback goes to an in-memory store (--database memory) or to a dedicated MySQL database
+(MYSQL_HOST), seeded with the tender vectors, e.g.
+    docker run -p 3306:3306 -e MYSQL_ALLOW_EMPTY_PASSWORD=yes mysql:8
+
+--output writes a JSON report (configuration, per-workload throughput and latency
+percentiles, OpenAI call counts) and --compare prints the change against an earlier one.
+
+Usage:
+    python -m benchmarks.end_to_end --output e2e-current.json --compare e2e-previous.json
+    python -m benchmarks.end_to_end --search-backend elasticsearch --database tender_db_benchmark
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import numpy as np
+import pymysql
+from dotenv import load_dotenv
+from werkzeug.serving import WSGIRequestHandler, make_server
+from app.utils.elastic_handler import ElasticHandler
+from app.utils.local_index import LocalIndexStore, LocalVectorIndex
+from app.utils.vector_codec import encode_vector
+from benchmarks import stubs
+from benchmarks.async_search import AUTH_HEADERS, load_module
+
+WORKLOADS = ["search", "paged", "feedback_write", "feedback_search"]
+COUNTRIES = ["US", "GB", "DE", "FR", "CA"]
+CACHE_SIZE_SETTINGS = ["EMBEDDING_CACHE_MEMORY_SIZE", "CATEGORIZATION_CACHE_SIZE", "SEARCH_RESULT_CACHE_SIZE"]
+
+# Load environment variables
+load_dotenv()
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def generate_tenders(count, seed):
+    """Synthetic tenders with three unit category vectors each"""
+    rng = np.random.default_rng(seed)
+    start = datetime(2024, 1, 1)
+    tenders = []
+    for i in range(count):
+        vectors = rng.normal(size=(3, stubs.DIMS)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        tender = {
+            "ID": f"e2e-tender-{i}",
+            "eTitle": f"Synthetic tender {i}",
+            "eDescription": f"Supply and services lot {i % 97}",
+            "ePublisherCountryName": COUNTRIES[i % len(COUNTRIES)],
+            "ePublicationDate": (start + timedelta(days=i % 365)).strftime("%Y-%m-%d"),
+            "eDeadlineDate": (start + timedelta(days=i % 365 + 30)).strftime("%Y-%m-%d"),
+            "eMainCategoryName1": f"Category {i % 50}",
+            "eMainCategoryName2": f"Category {(i + 7) % 50}",
+            "eMainCategoryName3": f"Category {(i + 19) % 50}"
+        }
+        for field, vector in zip(ElasticHandler.VECTOR_FIELDS, vectors):
+            tender[field] = vector.tolist()
+        tenders.append(tender)
+    return tenders
+
+
+def configure_environment(args, openai_server, local_index_path):
+    """Point the app at the stand-ins; must run before app.py is loaded"""
+    os.environ["OPENAI_API_KEY"] = "benchmark"
+    os.environ["OPENAI_BASE_URL"] = openai_server.base_url
+    os.environ["EMBEDDING_CACHE_PATH"] = ""
+    os.environ["CATEGORIZATION_CACHE_PATH"] = ""
+    os.environ["QUERY_PROCESSING_MODE"] = args.query_processing
+    os.environ["SAVED_SEARCH_MATCHING"] = "false"
+    os.environ["SEARCH_BACKEND"] = "local" if args.search_backend == "local" else "elasticsearch"
+    os.environ["LOCAL_INDEX_PATH"] = local_index_path or ""
+    if args.search_backend == "elasticsearch":
+        os.environ["ELASTICSEARCH_INDEX"] = args.index
+    if args.database != "memory":
+        os.environ["MYSQL_DATABASE"] = args.database
+    
+    # benchmarks.async_search disables the in-memory caches on import; keep the app defaults unless asked
+    for name in CACHE_SIZE_SETTINGS:
+        if args.no_caches:
+            os.environ[name] = "0"
+        else:
+            os.environ.pop(name, None)
+
+
+def build_local_index(tenders, nlist):
+    """Publish a local index snapshot of the synthetic tenders in a temporary directory"""
+    path = tempfile.mkdtemp(prefix="e2e-local-index-")
+    store = LocalIndexStore(path)
+    snapshot_path = store.new_snapshot_path()
+    LocalVectorIndex.build(snapshot_path, (
+        ({name: value for name, value in tender.items() if name not in ElasticHandler.VECTOR_FIELDS},
+         [tender[field] for field in ElasticHandler.VECTOR_FIELDS])
+        for tender in tenders
+    ), nlist=nlist)
+    store.publish(snapshot_path)
+    return path
+
+
+def seed_elasticsearch(elastic_handler, tenders):
+    """Recreate the benchmark index with the synthetic tenders"""
+    if elastic_handler.es.indices.exists(index=elastic_handler.index_name):
+        elastic_handler.es.indices.delete(index=elastic_handler.index_name)
+    stats = elastic_handler.stream_index_tenders(tenders)
+    print(f"Indexed {stats['indexed']} tenders into {elastic_handler.index_name}")
+
+
+def seed_mysql(db_operation, tenders):
+    """Create the schema and replace the tenders and feedback of the benchmark database"""
+    db_operation.initialize_database()
+    with db_operation.pool.connection() as connection:
+        with connection.cursor() as cursor:
+            for table in ["feedback_aggregates", "feedback", "search_queries", "tenders"]:
+                cursor.execute(f"DELETE FROM {table}")
+            cursor.executemany(
+                "INSERT INTO tenders (id, tender_title, tender_description, tender_vector) VALUES (%s, %s, %s, %s)",
+                [(tender["ID"], tender["eTitle"], tender["eDescription"], encode_vector(tender["eMainCategoryName1_vector"])) for tender in tenders]
+            )
+        connection.commit()
+    print(f"Seeded {len(tenders)} tenders into MySQL database {db_operation.database}")
+
+
+def create_database(database):
+    """Create the dedicated MySQL database, refusing to touch the application one"""
+    if database == os.getenv('MYSQL_DATABASE', 'tender_db'):
+        sys.exit("Refusing to seed the application database, pass a dedicated --database")
+    connection = pymysql.connect(host=os.getenv('MYSQL_HOST', 'localhost'), user=os.getenv('MYSQL_USER', 'root'), password=os.getenv('MYSQL_PASSWORD', ''))
+    with connection.cursor() as cursor:
+        cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{database}`")
+    connection.close()
+
+
+def request_payload(workload, i, args, tenders):
+    """Path and JSON body of the i-th request of a workload"""
+    if workload == "search":
+        return "/tenders_search", {"query": f"e2e search query {i}", "page_size": args.page_size}
+    if workload == "paged":
+        # Page 1 of every query first, then the following pages of each in turn
+        query = i % args.paged_queries
+        page = i // args.paged_queries % args.pages + 1
+        return "/tenders_search", {"query": f"e2e paged query {query}", "page": page, "page_size": args.page_size}
+    
+    query_id = f"e2e-query-{i % args.feedback_queries}"
+    if workload == "feedback_write":
+        feedback_list = [
+            {"ID": tenders[(i * 5 + j) % len(tenders)]["ID"], "feedback": "positive" if j < 3 else "negative"} for j in range(5)
+        ]
+        return "/customer_feedback", {
+            "query_id": query_id, "search_query": f"e2e feedback query {query_id}", "client_id": f"e2e-client-{i % 10}", "feedback_list": feedback_list
+        }
+    return "/tenders_search_with_feedback", {"query_id": query_id, "query": f"e2e feedback query {query_id}"}
+
+
+def send(base_url, path, payload):
+    """POST a JSON body and return the status code"""
+    request = urllib.request.Request(
+        base_url + path, data=json.dumps(payload).encode("utf-8"), method="POST",
+        headers={"Content-Type": "application/json", **AUTH_HEADERS}
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=60) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def run_workload(base_url, workload, args, tenders):
+    """Send --warmup then --requests requests with --concurrency in flight, returning the measurements"""
+    def one_request(i):
+        path, payload = request_payload(workload, i, args, tenders)
+        start = time.perf_counter()
+        status = send(base_url, path, payload)
+        return time.perf_counter() - start, status
+    
+    with ThreadPoolExecutor(args.concurrency) as executor:
+        list(executor.map(one_request, range(args.warmup)))
+        start = time.perf_counter()
+        results = list(executor.map(one_request, range(args.warmup, args.warmup + args.requests)))
+        elapsed = time.perf_counter() - start
+    
+    latencies_ms = np.array([latency for latency, _ in results]) * 1000
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+    return {
+        "requests": len(results),
+        "errors": sum(status != 200 for _, status in results),
+        "throughput": len(results) / elapsed,
+        "mean_ms": float(latencies_ms.mean()),
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99)
+    }
+
+
+def git_revision():
+    """Commit of the working tree, for the report"""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(report, baseline):
+    """Print the relative change of every workload metric against a baseline report"""
+    print(f"\nChange against {baseline.get('revision') or 'baseline'} ({baseline.get('created_at')}):")
+    for workload, results in report["workloads"].items():
+        previous = baseline.get("workloads", {}).get(workload)
+        if not previous:
+            print(f"{workload:<16} not in baseline")
+            continue
+        changes = []
+        for metric in ["throughput", "p50_ms", "p95_ms", "p99_ms"]:
+            if previous.get(metric):
+                changes.append(f"{metric}={(results[metric] - previous[metric]) / previous[metric]:+7.1%}")
+        print(f"{workload:<16} " + "  ".join(changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workloads", nargs="+", choices=WORKLOADS, default=WORKLOADS)
+    parser.add_argument("--requests", type=int, default=500, help="Measured requests per workload")
+    parser.add_argument("--warmup", type=int, default=20, help="Unmeasured requests per workload")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--tenders", type=int, default=10000)
+    parser.add_argument("--page-size", type=int, default=10)
+    parser.add_argument("--pages", type=int, default=5, help="Pages requested per query by the paged workload")
+    parser.add_argument("--paged-queries", type=int, default=20)
+    parser.add_argument("--feedback-queries", type=int, default=50, help="Query IDs receiving feedback")
+    parser.add_argument("--chat-latency", type=float, default=0.3, help="Fake chat completion latency in seconds")
+    parser.add_argument("--embedding-latency", type=float, default=0.1, help="Fake embedding latency in seconds")
+    parser.add_argument("--search-backend", choices=["local", "elasticsearch", "stub"], default="local")
+    parser.add_argument("--es-latency", type=float, default=0.05, help="Stub Elasticsearch latency in seconds")
+    parser.add_argument("--index", default="tenders_e2e_benchmark", help="Elasticsearch index seeded with the synthetic tenders")
+    parser.add_argument("--nlist", type=int, help="IVF lists of the local index")
+    parser.add_argument("--database", default="memory", help="'memory' or a dedicated MySQL database to seed")
+    parser.add_argument("--query-processing", choices=["llm", "raw", "rewrite", "auto"], default="llm")
+    parser.add_argument("--no-caches", action="store_true", help="Disable the in-memory embedding, categorization and result caches")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--compare", help="Earlier JSON report to compare with")
+    args = parser.parse_args()
+    
+    tenders = generate_tenders(args.tenders, args.seed)
+    openai_server = stubs.FakeOpenAIServer(args.chat_latency, args.embedding_latency).start()
+    if args.database != "memory":
+        create_database(args.database)
+    local_index_path = build_local_index(tenders, args.nlist) if args.search_backend == "local" else None
+    configure_environment(args, openai_server, local_index_path)
+    
+    flask_app = load_module("flask_app", "app.py")
+    
+    if args.search_backend == "stub":
+        flask_app.elastic_handler.es = stubs.StubElasticsearch(args.es_latency)
+    elif args.search_backend == "elasticsearch":
+        seed_elasticsearch(flask_app.elastic_handler, tenders)
+    
+    if args.database == "memory":
+        stubs.InMemoryFeedbackStore({tender["ID"]: tender["eMainCategoryName1_vector"] for tender in tenders}).install(flask_app.db_operation)
+    else:
+        seed_mysql(flask_app.db_operation, tenders)
+    
+    server = make_server("127.0.0.1", 0, flask_app.app, threaded=True, request_handler=QuietRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    
+    report = {
+        "revision": git_revision(),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "config": vars(args),
+        "workloads": {},
+        "openai_requests": {}
+    }
+    for workload in args.workloads:
+        results = report["workloads"][workload] = run_workload(base_url, workload, args, tenders)
+        print(f"{workload:<16} {results['throughput']:8.1f} req/s  p50={results['p50_ms']:8.1f}ms  p95={results['p95_ms']:8.1f}ms  "
+              f"p99={results['p99_ms']:8.1f}ms  errors={results['errors']}")
+    report["openai_requests"] = dict(openai_server.requests)
+    
+    server.shutdown()
+    openai_server.stop()
+    
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
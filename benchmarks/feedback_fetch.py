@@ -0,0 +1,201 @@
+"""EXPLAIN check and timing of the feedback read path on a seeded database.
+
+Seeds a dedicated MySQL database (never the application database) with tenders, search
+queries and millions of feedback rows, verifies with EXPLAIN that the per-query and
+per-client feedback queries use indexes instead of full scans, and compares the previous
+two-queries-per-call read path with the single round-trip one and with reading the
+precomputed feedback aggregates.
+
+Usage:
+    python -m benchmarks.feedback_fetch --database tender_db_benchmark --feedback 2000000
+    python -m benchmarks.feedback_fetch --database tender_db_benchmark --skip-seed
+"""
+import argparse
+import random
+import sys
+import time
+import uuid
+import numpy as np
+import pymysql
+from dotenv import load_dotenv
+from app.utils.database_operation import DatabaseOperation
+from app.utils.vector_codec import encode_vector
+
+# Load environment variables
+load_dotenv()
+
+# The read path before it was merged into one round-trip, one query per polarity
+LEGACY_FEEDBACK_BY_QUERY_SQL = """
+SELECT t.tender_vector
+FROM feedback f
+JOIN tenders t ON f.tender_id = t.id
+WHERE f.query_id = %s AND f.feedback_value = %s
+"""
+
+LEGACY_FEEDBACK_BY_CLIENT_SQL = """
+SELECT t.tender_vector
+FROM feedback f
+JOIN tenders t ON f.tender_id = t.id
+JOIN search_queries sq ON f.query_id = sq.query_id
+WHERE sq.client_id = %s AND f.feedback_value = %s
+"""
+
+
+def seed(db_operation, args):
+    """Create the schema and insert synthetic tenders, queries and feedback"""
+    rng = np.random.default_rng(args.seed)
+    random.seed(args.seed)
+    db_operation.initialize_database()
+    
+    tender_ids = [str(uuid.UUID(int=i)) for i in range(args.tenders)]
+    query_ids = [str(uuid.UUID(int=(1 << 64) + i)) for i in range(args.queries)]
+    client_ids = [f"client-{i}" for i in range(args.clients)]
+    
+    with db_operation.pool.connection() as connection:
+        with connection.cursor() as cursor:
+            for table in ["feedback", "search_queries", "tenders"]:
+                cursor.execute(f"TRUNCATE TABLE {table}")
+            
+            for start in range(0, args.tenders, args.batch_size):
+                batch = tender_ids[start:start + args.batch_size]
+                vectors = rng.normal(size=(len(batch), args.dims)).astype(np.float32)
+                cursor.executemany(
+                    "INSERT INTO tenders (id, tender_title, tender_description, tender_vector) VALUES (%s, %s, %s, %s)",
+                    [(tender_id, "Synthetic tender", "", encode_vector(vector)) for tender_id, vector in zip(batch, vectors)]
+                )
+                connection.commit()
+            print(f"Seeded {args.tenders} tenders")
+            
+            for start in range(0, args.queries, args.batch_size):
+                cursor.executemany(
+                    "INSERT INTO search_queries (query_id, client_id, search_query) VALUES (%s, %s, %s)",
+                    [(query_id, random.choice(client_ids), "synthetic query") for query_id in query_ids[start:start + args.batch_size]]
+                )
+                connection.commit()
+            print(f"Seeded {args.queries} search queries for {args.clients} clients")
+            
+            # Spread feedback evenly over queries, each row for a distinct tender of that query
+            per_query = max(1, args.feedback // args.queries)
+            inserted = 0
+            rows = []
+            for query_id in query_ids:
+                for tender_id in random.sample(tender_ids, min(per_query, len(tender_ids))):
+                    rows.append((query_id, tender_id, random.choice(["positive", "negative"])))
+                if len(rows) >= args.batch_size:
+                    cursor.executemany("INSERT INTO feedback (query_id, tender_id, feedback_value) VALUES (%s, %s, %s)", rows)
+                    connection.commit()
+                    inserted += len(rows)
+                    rows = []
+            if rows:
+                cursor.executemany("INSERT INTO feedback (query_id, tender_id, feedback_value) VALUES (%s, %s, %s)", rows)
+                connection.commit()
+                inserted += len(rows)
+            print(f"Seeded {inserted} feedback rows")
+            
+            cursor.execute("ANALYZE TABLE tenders, search_queries, feedback")
+            cursor.fetchall()
+    
+    print(f"Rebuilt {db_operation.rebuild_feedback_aggregates()} feedback aggregates")
+    
+    return query_ids, client_ids
+
+
+def explain(cursor, label, sql, params):
+    """Print the plan of a query and return False if any table is fully scanned"""
+    cursor.execute("EXPLAIN " + sql, params)
+    columns = [column[0].lower() for column in cursor.description]
+    ok = True
+    print(f"EXPLAIN {label}")
+    for row in cursor.fetchall():
+        plan = dict(zip(columns, row))
+        full_scan = plan.get("type") == "ALL"
+        ok = ok and not full_scan
+        print(f"  table={plan.get('table')} type={plan.get('type')} key={plan.get('key')} rows={plan.get('rows')}"
+              + ("  <-- full scan" if full_scan else ""))
+    return ok
+
+
+def time_calls(function, keys):
+    """Latency percentiles of calling function for each key, in milliseconds"""
+    latencies = []
+    for key in keys:
+        start = time.perf_counter()
+        function(key)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.percentile(latencies, 50), np.percentile(latencies, 95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", default="tender_db_benchmark", help="Database to seed (created if missing)")
+    parser.add_argument("--tenders", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200000)
+    parser.add_argument("--clients", type=int, default=5000)
+    parser.add_argument("--feedback", type=int, default=2000000)
+    parser.add_argument("--dims", type=int, default=1536)
+    parser.add_argument("--samples", type=int, default=200, help="Queries and clients timed per path")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--skip-seed", action="store_true", help="Reuse an already seeded database")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    
+    db_operation = DatabaseOperation()
+    if args.database == db_operation.database:
+        sys.exit("Refusing to seed the application database, pass a dedicated --database")
+    
+    # Create the benchmark database and point the pool at it
+    connection = pymysql.connect(host=db_operation.host, user=db_operation.user, password=db_operation.password)
+    with connection.cursor() as cursor:
+        cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{args.database}`")
+    connection.close()
+    db_operation.database = args.database
+    
+    if args.skip_seed:
+        with db_operation.pool.connection() as connection:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT query_id FROM search_queries")
+                query_ids = [row[0] for row in cursor.fetchall()]
+                cursor.execute("SELECT DISTINCT client_id FROM search_queries")
+                client_ids = [row[0] for row in cursor.fetchall()]
+    else:
+        query_ids, client_ids = seed(db_operation, args)
+    
+    sample_queries = random.sample(query_ids, min(args.samples, len(query_ids)))
+    sample_clients = random.sample(client_ids, min(args.samples, len(client_ids)))
+    
+    with db_operation.pool.connection() as connection:
+        with connection.cursor() as cursor:
+            plans_ok = explain(cursor, "feedback by query", DatabaseOperation.FEEDBACK_BY_QUERY_SQL, (sample_queries[0],))
+            plans_ok = explain(cursor, "feedback by client", DatabaseOperation.FEEDBACK_BY_CLIENT_SQL, (sample_clients[0],)) and plans_ok
+    print("EXPLAIN check " + ("passed" if plans_ok else "FAILED"))
+    
+    def legacy_fetch(sql):
+        def fetch(key):
+            with db_operation.pool.connection() as connection:
+                with connection.cursor() as cursor:
+                    cursor.execute(sql, (key, 'positive'))
+                    positive = DatabaseOperation.split_feedback_rows([('positive', row[0]) for row in cursor.fetchall()])[0]
+                    cursor.execute(sql, (key, 'negative'))
+                    negative = DatabaseOperation.split_feedback_rows([('negative', row[0]) for row in cursor.fetchall()])[1]
+            return positive, negative
+        return fetch
+    
+    for label, legacy, current, centroids, keys in [
+        ("by query", legacy_fetch(LEGACY_FEEDBACK_BY_QUERY_SQL), db_operation.get_feedback_by_query_id,
+         db_operation.get_feedback_centroids_by_query_id, sample_queries),
+        ("by client", legacy_fetch(LEGACY_FEEDBACK_BY_CLIENT_SQL), db_operation.get_feedback_by_client_id,
+         db_operation.get_feedback_centroids_by_client_id, sample_clients),
+    ]:
+        legacy_p50, legacy_p95 = time_calls(legacy, keys)
+        current_p50, current_p95 = time_calls(current, keys)
+        centroids_p50, centroids_p95 = time_calls(centroids, keys)
+        print(f"{label:<10} two queries: p50={legacy_p50:7.2f}ms p95={legacy_p95:7.2f}ms   "
+              f"single query: p50={current_p50:7.2f}ms p95={current_p95:7.2f}ms   "
+              f"aggregates: p50={centroids_p50:7.2f}ms p95={centroids_p95:7.2f}ms")
+    
+    if not plans_ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Ranking quality and latency of hybrid (BM25 + kNN) search on feedback-derived judgments.
+
+Runs the held-out judged queries from the feedback table against the live tenders index with
+plain kNN, exact search and hybrid search for every fusion method and lexical weight given.
+Query embeddings are computed once and reused, so the latency differences come from the
+Elasticsearch request alone.
+
+Usage:
+    python -m benchmarks.hybrid_search --holdout 0.2
+    python -m benchmarks.hybrid_search --fusions rrf weighted --weights 0.2 0.5 0.8
+"""
+import argparse
+import time
+import numpy as np
+from dotenv import load_dotenv
+from app.utils.database_operation import DatabaseOperation
+from app.utils.elastic_handler import ElasticHandler
+from benchmarks.judgments import load_judgments, ndcg_at_k, negatives_at_k, recall_at_k, reciprocal_rank
+from benchmarks.vector_layouts import embed_queries
+
+# Load environment variables
+load_dotenv()
+
+
+def evaluate(elastic_handler, judgments, embeddings, search_mode, lexical_weight, k):
+    """Run the judged queries and return metrics and search latencies"""
+    metrics = {"ndcg": [], "recall": [], "mrr": [], "negatives": []}
+    latencies = []
+    for judgment, embedding in zip(judgments, embeddings):
+        start = time.perf_counter()
+        response = elastic_handler.search_tenders(
+            embedding, ["ID"], page_size=k, search_mode=search_mode, query_text=judgment["query"], lexical_weight=lexical_weight
+        )
+        latencies.append((time.perf_counter() - start) * 1000)
+        
+        ranked_ids = [tender["ID"] for tender in response["tenders"]]
+        metrics["ndcg"].append(ndcg_at_k(ranked_ids, judgment["relevant"], k))
+        metrics["recall"].append(recall_at_k(ranked_ids, judgment["relevant"], k))
+        metrics["mrr"].append(reciprocal_rank(ranked_ids, judgment["relevant"]))
+        metrics["negatives"].append(negatives_at_k(ranked_ids, judgment["non_relevant"], k))
+    return {name: float(np.mean(values)) for name, values in metrics.items()}, np.array(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fusions", nargs="+", choices=["rrf", "weighted"], default=["rrf", "weighted"])
+    parser.add_argument("--weights", nargs="+", type=float, default=[0.3, 0.5, 0.7], help="Lexical weights to compare")
+    parser.add_argument("--holdout", type=float, default=1.0, help="Fraction of judged queries evaluated (stable split on query_id)")
+    parser.add_argument("--limit", type=int, help="Maximum feedback rows read")
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+    
+    judgments = load_judgments(DatabaseOperation(), args.holdout, args.limit)
+    if not judgments:
+        print("No search queries with positive feedback to evaluate.")
+        return
+    print(f"{len(judgments)} judged queries")
+    
+    embeddings, _ = embed_queries(judgments)
+    elastic_handler = ElasticHandler()
+    
+    runs = [("knn", "knn", None, None), ("exact", "exact", None, None)]
+    for fusion in args.fusions:
+        for weight in args.weights:
+            runs.append((f"hybrid {fusion} {weight:.2f}", "hybrid", fusion, weight))
+    
+    for label, search_mode, fusion, weight in runs:
+        if fusion:
+            elastic_handler.hybrid_fusion = fusion
+        
+        # Warm up before timing
+        for judgment, embedding in list(zip(judgments, embeddings))[:5]:
+            elastic_handler.search_tenders(embedding, ["ID"], page_size=args.k, search_mode=search_mode, query_text=judgment["query"], lexical_weight=weight)
+        
+        metrics, latencies = evaluate(elastic_handler, judgments, embeddings, search_mode, weight, args.k)
+        print(f"{label:<22} p50={np.percentile(latencies, 50):8.1f}ms  p95={np.percentile(latencies, 95):8.1f}ms  "
+              f"nDCG@{args.k}={metrics['ndcg']:.3f}  recall@{args.k}={metrics['recall']:.3f}  MRR={metrics['mrr']:.3f}  "
+              f"negatives@{args.k}={metrics['negatives']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Footprint, latency and recall of vector index profiles (quantization and reduced dimensions).
+
+Indexes the same synthetic corpus once per profile, each into its own benchmark index, and
+reports the on-disk size of the vector fields, the estimated off-heap memory the HNSW graphs
+need, kNN query latency and recall@10 against exact full-dimension cosine search computed
+locally. Profiles are written as index_type:projection:dims, e.g. int8_hnsw:pca:256.
+
+Usage:
+    python -m benchmarks.index_profiles --docs 20000
+    python -m benchmarks.index_profiles --profiles hnsw:none:1536 int8_hnsw:none:1536 int4_hnsw:pca:512
+"""
+import argparse
+import time
+import numpy as np
+from dotenv import load_dotenv
+from app.utils.elastic_handler import ElasticHandler
+from app.utils.vector_projection import VectorProjection
+from benchmarks.knn_search import DIMS, generate_synthetic_tenders, random_unit_vectors
+
+# Load environment variables
+load_dotenv()
+
+# Bytes per dimension kept in memory for HNSW search, plus per-vector overhead
+# (float: 4 * (dims + 12), int8: dims + 4, int4: dims / 2 + 4, following the Elasticsearch sizing guide)
+MEMORY_PER_VECTOR = {
+    "hnsw": lambda dims: 4 * (dims + 12),
+    "int8_hnsw": lambda dims: dims + 4,
+    "int4_hnsw": lambda dims: dims / 2 + 4
+}
+
+
+def parse_profile(profile):
+    """Split index_type:projection:dims"""
+    index_type, method, dims = profile.split(":")
+    return index_type, method, int(dims)
+
+
+def build_corpus(rng, centers, docs, noise):
+    """Generate the corpus and keep its full-dimension vectors for exact ground truth"""
+    tenders = generate_synthetic_tenders(rng, centers, docs, noise)
+    vectors = np.stack([
+        np.asarray([tender[field] for tender in tenders], dtype=np.float32) for field in ElasticHandler.VECTOR_FIELDS
+    ])
+    return tenders, vectors
+
+
+def exact_top_k(vectors, ids, queries, k):
+    """Top-k tender IDs by maximum cosine similarity over the category vectors"""
+    scores = np.max(vectors @ queries.T, axis=0)
+    top = np.argsort(-scores, axis=0)[:k]
+    return [[ids[i] for i in top[:, q]] for q in range(queries.shape[0])]
+
+
+def vector_disk_bytes(elastic_handler):
+    """On-disk size of the vector fields (HNSW graph and vectors), from the disk usage API"""
+    usage = elastic_handler.es.indices.disk_usage(index=elastic_handler.index_name, run_expensive_tasks=True)
+    fields = usage[elastic_handler.index_name]["fields"]
+    return sum(fields.get(field, {}).get("total_in_bytes", 0) for field in ElasticHandler.VECTOR_FIELDS)
+
+
+def run_profile(args, profile, tenders, sample, queries, exact_results):
+    """Index the corpus with one profile and measure it"""
+    index_type, method, dims = parse_profile(profile)
+    if method == "pca":
+        projection = VectorProjection.fit_pca(sample, dims)
+        projection.path = f".cache/{args.index}_{index_type}_{dims}.npz"
+        projection.save()
+    else:
+        projection = VectorProjection(method, dims)
+    
+    elastic_handler = ElasticHandler()
+    elastic_handler.index_name = f"{args.index}_{index_type}_{method}_{dims}"
+    elastic_handler.knn_k = args.k
+    elastic_handler.knn_num_candidates = args.num_candidates
+    
+    if elastic_handler.es.indices.exists(index=elastic_handler.index_name):
+        elastic_handler.es.indices.delete(index=elastic_handler.index_name)
+    elastic_handler.es.indices.create(index=elastic_handler.index_name, body=elastic_handler.index_body(index_type, projection))
+    elastic_handler.projection = projection
+    
+    start = time.perf_counter()
+    stats = elastic_handler.stream_index_tenders(tenders)
+    if stats["failed"]:
+        raise RuntimeError(f"Bulk indexing failed for {stats['failed']} tenders: {stats['errors']}")
+    index_seconds = time.perf_counter() - start
+    elastic_handler.es.indices.forcemerge(index=elastic_handler.index_name, max_num_segments=1)
+    
+    # Warm up, then time the kNN queries
+    for query in queries[:5]:
+        elastic_handler.search_tenders(query, ["ID"], page_size=args.k, search_mode="knn")
+    
+    latencies = []
+    recalls = []
+    for query, exact in zip(queries, exact_results):
+        start = time.perf_counter()
+        response = elastic_handler.search_tenders(query, ["ID"], page_size=args.k, search_mode="knn")
+        latencies.append((time.perf_counter() - start) * 1000)
+        found = {tender["ID"] for tender in response["tenders"]}
+        recalls.append(len(found & set(exact)) / len(exact))
+    
+    memory = MEMORY_PER_VECTOR[index_type](projection.dims) * len(tenders) * len(ElasticHandler.VECTOR_FIELDS)
+    print(f"{profile:<24} memory~{memory / 2**20:8.1f}MiB  disk={vector_disk_bytes(elastic_handler) / 2**20:8.1f}MiB  "
+          f"index={index_seconds:6.1f}s  p50={np.percentile(latencies, 50):7.1f}ms  p95={np.percentile(latencies, 95):7.1f}ms  "
+          f"recall@{args.k}={np.mean(recalls):.3f}")
+    
+    if not args.keep:
+        elastic_handler.es.indices.delete(index=elastic_handler.index_name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index", default="tenders_profile_benchmark", help="Prefix of the benchmark indices")
+    parser.add_argument("--profiles", nargs="+", default=["hnsw:none:1536", "int8_hnsw:none:1536", "int4_hnsw:none:1536", "int8_hnsw:pca:512", "int8_hnsw:pca:256"])
+    parser.add_argument("--docs", type=int, default=20000, help="Number of synthetic tenders")
+    parser.add_argument("--queries", type=int, default=200, help="Number of benchmark queries")
+    parser.add_argument("--topics", type=int, default=500, help="Number of topic clusters in the corpus")
+    parser.add_argument("--noise", type=float, default=0.03, help="Per-dimension noise around topic centers")
+    parser.add_argument("--k", type=int, default=10, help="Results compared against the exact top-k")
+    parser.add_argument("--num-candidates", type=int, default=500, help="kNN num_candidates")
+    parser.add_argument("--pca-sample", type=int, default=10000, help="Vectors used to fit PCA projections")
+    parser.add_argument("--keep", action="store_true", help="Keep the benchmark indices")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    
+    rng = np.random.default_rng(args.seed)
+    centers = rng.normal(size=(args.topics, DIMS)).astype(np.float32)
+    centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+    
+    tenders, vectors = build_corpus(rng, centers, args.docs, args.noise)
+    sample = vectors.reshape(-1, DIMS)[rng.choice(vectors.shape[0] * vectors.shape[1], min(args.pca_sample, vectors.shape[0] * vectors.shape[1]), replace=False)]
+    queries = random_unit_vectors(rng, centers, args.queries, args.noise)
+    exact_results = exact_top_k(vectors, [tender["ID"] for tender in tenders], queries, args.k)
+    
+    for profile in args.profiles:
+        run_profile(args, profile, tenders, sample, queries, exact_results)
+
+
+if __name__ == "__main__":
+    main()
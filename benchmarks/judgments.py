@@ -0,0 +1,52 @@
+"""Held-out relevance judgments built from the feedback table, and ranking metrics.
+
+Every search query with at least one positive feedback item becomes a judged query: tenders
+marked positive are relevant, tenders marked negative are judged non-relevant and any other
+tender is unjudged (treated as non-relevant). The held-out split is a stable hash of the
+query ID, so the same queries are held out on every run.
+"""
+import hashlib
+import math
+
+
+def load_judgments(db_operation, holdout_fraction=1.0, limit=None):
+    """Return [{"query_id", "query", "relevant", "non_relevant"}] for the held-out queries"""
+    judged = {}
+    for query_id, search_query, tender_id, feedback_value in db_operation.get_feedback_judgments(limit):
+        entry = judged.setdefault(query_id, {"query_id": query_id, "query": search_query, "relevant": set(), "non_relevant": set()})
+        (entry["relevant"] if feedback_value == "positive" else entry["non_relevant"]).add(tender_id)
+    
+    return [entry for entry in judged.values() if entry["relevant"] and is_held_out(entry["query_id"], holdout_fraction)]
+
+
+def is_held_out(query_id, fraction):
+    """Stable split on the query ID hash"""
+    if fraction >= 1:
+        return True
+    bucket = int(hashlib.sha256(str(query_id).encode("utf-8")).hexdigest()[:8], 16) / 0xFFFFFFFF
+    return bucket < fraction
+
+
+def ndcg_at_k(ranked_ids, relevant, k=10):
+    """Binary-gain nDCG@k"""
+    dcg = sum(1 / math.log2(rank + 2) for rank, tender_id in enumerate(ranked_ids[:k]) if tender_id in relevant)
+    ideal = sum(1 / math.log2(rank + 2) for rank in range(min(len(relevant), k)))
+    return dcg / ideal if ideal else 0.0
+
+
+def recall_at_k(ranked_ids, relevant, k=10):
+    """Fraction of the relevant tenders found in the top k"""
+    return len(set(ranked_ids[:k]) & relevant) / len(relevant) if relevant else 0.0
+
+
+def reciprocal_rank(ranked_ids, relevant):
+    """1 / rank of the first relevant tender (0 if none is retrieved)"""
+    for rank, tender_id in enumerate(ranked_ids):
+        if tender_id in relevant:
+            return 1 / (rank + 1)
+    return 0.0
+
+
+def negatives_at_k(ranked_ids, non_relevant, k=10):
+    """Number of tenders judged non-relevant in the top k"""
+    return len(set(ranked_ids[:k]) & non_relevant)
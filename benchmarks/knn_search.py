@@ -0,0 +1,150 @@
+"""Recall vs latency benchmark for approximate kNN search against the exact script_score path.
+
+Indexes a synthetic corpus of tenders into a dedicated benchmark index and runs the same
+queries through both search modes of ElasticHandler.search_tenders.
+
+Usage:
+    python -m benchmarks.knn_search --docs 100000 --queries 200
+    python -m benchmarks.knn_search --skip-index --num-candidates 100 500 2000
+"""
+import argparse
+import time
+import uuid
+from datetime import datetime, timedelta
+import numpy as np
+from dotenv import load_dotenv
+from app.utils.elastic_handler import ElasticHandler
+
+# Load environment variables
+load_dotenv()
+
+DIMS = 1536
+
+
+def random_unit_vectors(rng, centers, count, noise):
+    """Sample unit vectors scattered around randomly chosen topic centers"""
+    topics = rng.integers(0, len(centers), size=count)
+    vectors = centers[topics] + rng.normal(scale=noise, size=(count, centers.shape[1])).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def generate_synthetic_tenders(rng, centers, count, noise):
+    """Generate synthetic tenders with three category vectors each"""
+    countries = ["US", "GB", "CA", "DE", "FR"]
+    today = datetime.now()
+    vectors = [random_unit_vectors(rng, centers, count, noise) for _ in ElasticHandler.VECTOR_FIELDS]
+    
+    tenders = []
+    for i in range(count):
+        tender = {
+            "ID": str(uuid.uuid4()),
+            "eTitle": f"Synthetic tender {i}",
+            "eDescription": "Synthetic tender generated for the kNN benchmark",
+            "ePublisherCountryName": countries[i % len(countries)],
+            "ePublicationDate": (today - timedelta(days=int(rng.integers(0, 365)))).strftime("%Y-%m-%d")
+        }
+        for field, field_vectors in zip(ElasticHandler.VECTOR_FIELDS, vectors):
+            tender[field] = field_vectors[i].tolist()
+        tenders.append(tender)
+    
+    return tenders
+
+
+def index_corpus(elastic_handler, rng, centers, docs, batch_size, noise):
+    """Index the synthetic corpus in batches"""
+    if elastic_handler.es.indices.exists(index=elastic_handler.index_name):
+        elastic_handler.es.indices.delete(index=elastic_handler.index_name)
+    elastic_handler.create_index()
+    
+    def synthetic_feed():
+        for offset in range(0, docs, batch_size):
+            yield from generate_synthetic_tenders(rng, centers, min(batch_size, docs - offset), noise)
+    
+    stats = elastic_handler.stream_index_tenders(synthetic_feed())
+    if stats["failed"]:
+        raise RuntimeError(f"Bulk indexing failed for {stats['failed']} tenders: {stats['errors']}")
+    print(f"Indexed {stats['indexed']} tenders at {stats['docs_per_second']:.0f} docs/sec")
+    
+    # Merge segments so that HNSW search does not visit one graph per small segment
+    elastic_handler.es.indices.forcemerge(index=elastic_handler.index_name, max_num_segments=1)
+
+
+def run_queries(elastic_handler, queries, search_mode, page_size, country_code=None):
+    """Run every query in the given mode and return result IDs and latencies"""
+    results = []
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        response = elastic_handler.search_tenders(
+            query.tolist(),
+            ["ID"],
+            country_code=country_code,
+            page_size=page_size,
+            search_mode=search_mode
+        )
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append([tender["ID"] for tender in response["tenders"]])
+    return results, np.array(latencies)
+
+
+def recall_at_k(exact_results, approximate_results):
+    """Average fraction of exact top-k IDs found by the approximate search"""
+    recalls = []
+    for exact, approximate in zip(exact_results, approximate_results):
+        if exact:
+            recalls.append(len(set(exact) & set(approximate)) / len(exact))
+    return float(np.mean(recalls)) if recalls else 0.0
+
+
+def report(label, latencies, recall=None):
+    """Print a single result line"""
+    line = f"{label:<28} p50={np.percentile(latencies, 50):8.1f}ms  p95={np.percentile(latencies, 95):8.1f}ms"
+    if recall is not None:
+        line += f"  recall@k={recall:.3f}"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index", default="tenders_knn_benchmark", help="Benchmark index name")
+    parser.add_argument("--docs", type=int, default=100000, help="Number of synthetic tenders")
+    parser.add_argument("--queries", type=int, default=200, help="Number of benchmark queries")
+    parser.add_argument("--topics", type=int, default=500, help="Number of topic clusters in the corpus")
+    parser.add_argument("--noise", type=float, default=0.03, help="Per-dimension noise around topic centers")
+    parser.add_argument("--page-size", type=int, default=10, help="Top-k compared between modes")
+    parser.add_argument("--num-candidates", type=int, nargs="+", default=[100, 500, 1000], help="kNN num_candidates values to sweep")
+    parser.add_argument("--country", help="Optional country filter applied to every query")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Synthetic tenders generated at a time")
+    parser.add_argument("--skip-index", action="store_true", help="Reuse an already indexed corpus")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    
+    rng = np.random.default_rng(args.seed)
+    centers = rng.normal(size=(args.topics, DIMS)).astype(np.float32)
+    centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+    
+    elastic_handler = ElasticHandler()
+    elastic_handler.index_name = args.index
+    
+    if not args.skip_index:
+        index_corpus(elastic_handler, rng, centers, args.docs, args.batch_size, args.noise)
+    
+    queries = random_unit_vectors(rng, centers, args.queries, args.noise)
+    
+    # Warm up both paths so that the first query does not pay for loading vectors
+    run_queries(elastic_handler, queries[:5], "exact", args.page_size, args.country)
+    run_queries(elastic_handler, queries[:5], "knn", args.page_size, args.country)
+    
+    exact_results, exact_latencies = run_queries(elastic_handler, queries, "exact", args.page_size, args.country)
+    report("exact (script_score)", exact_latencies)
+    
+    for num_candidates in args.num_candidates:
+        elastic_handler.knn_num_candidates = num_candidates
+        elastic_handler.knn_k = args.page_size
+        knn_results, knn_latencies = run_queries(elastic_handler, queries, "knn", args.page_size, args.country)
+        report(f"knn num_candidates={num_candidates}", knn_latencies, recall_at_k(exact_results, knn_results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Ranking quality and latency of the query processing modes on feedback-derived judgments.
+
+Processes the held-out judged queries from the feedback table with every QueryProcessor mode
+(llm, raw, rewrite, auto), embeds the results and ranks the live tenders index with them.
+Reports the processing latency (the LLM call, or the local rewrite), the share of queries
+that went to the LLM and the ranking metrics of each mode. Every mode gets its own in-memory
+categorization cache; unset CATEGORIZATION_CACHE_PATH to time uncached LLM calls.
+
+Usage:
+    python -m benchmarks.query_processing --holdout 0.2
+    python -m benchmarks.query_processing --modes raw rewrite auto --search-mode exact
+"""
+import argparse
+import time
+import numpy as np
+from dotenv import load_dotenv
+from app.utils.database_operation import DatabaseOperation
+from app.utils.elastic_handler import ElasticHandler
+from app.utils.openai_embedding import OpenAIEmbedding
+from app.utils.prompt import Prompt
+from app.utils.query_categorizer import QueryCategorizer
+from app.utils.query_processor import MODES, QueryProcessor
+from app.utils.query_rewriter import QueryRewriter
+from benchmarks.judgments import load_judgments
+from benchmarks.vector_layouts import evaluate
+
+# Load environment variables
+load_dotenv()
+
+
+def process_queries(query_processor, judgments):
+    """Process every judged query, returning the texts to embed and per-query latency"""
+    texts = []
+    latencies = []
+    for judgment in judgments:
+        start = time.perf_counter()
+        texts.append(query_processor.process(judgment["query"]))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return texts, np.array(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--search-mode", choices=["knn", "exact"], default="knn")
+    parser.add_argument("--holdout", type=float, default=1.0, help="Fraction of judged queries evaluated (stable split on query_id)")
+    parser.add_argument("--limit", type=int, help="Maximum feedback rows read")
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+    
+    judgments = load_judgments(DatabaseOperation(), args.holdout, args.limit)
+    if not judgments:
+        print("No search queries with positive feedback to evaluate.")
+        return
+    
+    query_rewriter = QueryRewriter()
+    if not query_rewriter.categories:
+        print(f"No category vocabulary at {query_rewriter.vocabulary_path}; run build_query_vocabulary.py first. "
+              f"The rewrite mode embeds the raw queries.")
+    print(f"{len(judgments)} judged queries, {len(query_rewriter.categories)} vocabulary categories")
+    
+    openai_embedding = OpenAIEmbedding()
+    elastic_handler = ElasticHandler()
+    
+    for mode in args.modes:
+        query_processor = QueryProcessor(QueryCategorizer(openai_embedding, Prompt()), query_rewriter, mode)
+        texts, processing_latencies = process_queries(query_processor, judgments)
+        embeddings = openai_embedding.generate_embeddings(texts)
+        metrics, search_latencies = evaluate(elastic_handler, judgments, embeddings, args.search_mode, args.k)
+        
+        stats = query_processor.stats()
+        print(f"{mode:<8} processing p50={np.percentile(processing_latencies, 50):7.1f}ms  p95={np.percentile(processing_latencies, 95):7.1f}ms  "
+              f"llm={stats['llm_fraction']:5.1%}  search p50={np.percentile(search_latencies, 50):6.1f}ms  "
+              f"nDCG@{args.k}={metrics['ndcg']:.3f}  recall@{args.k}={metrics['recall']:.3f}  MRR={metrics['mrr']:.3f}  "
+              f"negatives@{args.k}={metrics['negatives']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Upstream calls and latency of bursts of identical concurrent searches, with and without coalescing.
+
+Runs the Flask app in-process against the stubs in benchmarks.stubs and sends --bursts
+bursts of --burst-size identical /tenders_search requests at once (one thread per request,
+a new query per burst), like a team running the same search in the same second. Caches are
+disabled so that only request coalescing removes repeated work. Reports the OpenAI and
+Elasticsearch calls made, the burst latency and the collapsed calls from /stats.
+
+Usage:
+    python -m benchmarks.request_coalescing --bursts 20 --burst-size 16
+"""
+import argparse
+import threading
+import time
+import numpy as np
+from benchmarks import stubs
+from benchmarks.async_search import AUTH_HEADERS, install_sync_stubs, load_module
+from benchmarks.batch_search import install_counters
+
+
+def run_burst(flask_app, query, burst_size):
+    """Send burst_size identical searches at once and return the slowest response time"""
+    barrier = threading.Barrier(burst_size)
+    latencies = []
+    
+    def one_request():
+        client = flask_app.app.test_client()
+        barrier.wait()
+        start = time.perf_counter()
+        response = client.post("/tenders_search", json={"query": query, "page_size": 10}, headers=AUTH_HEADERS)
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.get_data(as_text=True)
+    
+    threads = [threading.Thread(target=one_request) for _ in range(burst_size)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return max(latencies)
+
+
+def set_coalescing(flask_app, enabled):
+    """Turn coalescing on or off at every layer and reset its counters"""
+    for component in (flask_app.query_categorizer, flask_app.openai_embedding, flask_app.elastic_handler):
+        component.single_flight.enabled = enabled
+        component.single_flight.calls = 0
+        component.single_flight.collapsed = 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bursts", type=int, default=20)
+    parser.add_argument("--burst-size", type=int, default=16, help="Identical requests sent at once")
+    parser.add_argument("--chat-latency", type=float, default=0.3, help="Stub chat completion latency in seconds")
+    parser.add_argument("--embedding-latency", type=float, default=0.1, help="Stub embedding latency in seconds")
+    parser.add_argument("--es-latency", type=float, default=0.05, help="Stub Elasticsearch latency in seconds")
+    args = parser.parse_args()
+    
+    flask_app = load_module("flask_app", "app.py")
+    install_sync_stubs(flask_app, args, stubs.StubFeedbackStore(0))
+    counts = {"chat": 0, "embeddings": 0, "search": 0, "msearch": 0}
+    install_counters(flask_app, counts)
+    client = flask_app.app.test_client()
+    
+    for label, enabled in [("without coalescing", False), ("with coalescing", True)]:
+        set_coalescing(flask_app, enabled)
+        for name in list(counts):
+            counts[name] = 0
+        
+        burst_latencies = [run_burst(flask_app, f"{label} burst {i}", args.burst_size) for i in range(args.bursts)]
+        
+        collapsed = client.get("/stats", headers=AUTH_HEADERS).get_json()["coalescing"]
+        print(f"{label:<20} burst p50={np.percentile(burst_latencies, 50) * 1000:8.1f}ms  chat={counts['chat']:<5} "
+              f"embeddings={counts['embeddings']:<5} msearch={counts['msearch']:<5} collapsed: "
+              + "  ".join(f"{layer}={stats['collapsed']}" for layer, stats in collapsed.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Latency of paging through /tenders_search with and without the search result cache.
+
+Runs the Flask app in-process against the stubs in benchmarks.stubs (categorization,
+embedding and Elasticsearch latencies are simulated) and requests pages 1..--pages of
+--queries distinct searches, the way the UI re-POSTs the search on every page click.
+
+Usage:
+    python -m benchmarks.result_cache --queries 20 --pages 5
+"""
+import argparse
+import time
+import numpy as np
+from benchmarks import stubs
+from benchmarks.async_search import AUTH_HEADERS, install_sync_stubs, load_module
+from app.utils.result_cache import SearchResultCache
+
+
+def page_through(flask_app, queries, pages, page_size):
+    """Request every page of every query and return (first page, later pages) latencies"""
+    client = flask_app.app.test_client()
+    first_pages = []
+    later_pages = []
+    for i in range(queries):
+        for page in range(1, pages + 1):
+            payload = {"query": f"benchmark query {i}", "page": page, "page_size": page_size}
+            start = time.perf_counter()
+            response = client.post("/tenders_search", json=payload, headers=AUTH_HEADERS)
+            elapsed = time.perf_counter() - start
+            assert response.status_code == 200, response.get_data(as_text=True)
+            assert len(response.get_json()["tenders"]) == page_size
+            (first_pages if page == 1 else later_pages).append(elapsed)
+    return first_pages, later_pages
+
+
+def report(label, latencies):
+    """Print latency percentiles"""
+    latencies_ms = np.array(latencies) * 1000
+    print(f"{label:<28} p50={np.percentile(latencies_ms, 50):8.2f}ms  p99={np.percentile(latencies_ms, 99):8.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--page-size", type=int, default=10)
+    parser.add_argument("--top-k", type=int, default=100)
+    parser.add_argument("--chat-latency", type=float, default=0.3, help="Stub chat completion latency in seconds")
+    parser.add_argument("--embedding-latency", type=float, default=0.1, help="Stub embedding latency in seconds")
+    parser.add_argument("--es-latency", type=float, default=0.05, help="Stub Elasticsearch latency in seconds")
+    args = parser.parse_args()
+    args.mysql_latency = 0
+    
+    flask_app = load_module("flask_app", "app.py")
+    install_sync_stubs(flask_app, args, stubs.StubFeedbackStore(0))
+    flask_app.elastic_handler.es = stubs.StubElasticsearch(args.es_latency, hits_per_search=args.top_k)
+    
+    for label, cache in [("no cache", SearchResultCache(max_size=0)), ("result cache", SearchResultCache(max_size=1000, ttl=300, top_k=args.top_k))]:
+        flask_app.search_result_cache = cache
+        first_pages, later_pages = page_through(flask_app, args.queries, args.pages, args.page_size)
+        report(f"{label} page 1", first_pages)
+        report(f"{label} pages 2..{args.pages}", later_pages)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Throughput of saved-search matching on newly indexed tenders.
+
+Generates --searches saved searches (some with country and date filters) and --tenders new
+tenders around shared topic centers, matches them with SavedSearchMatcher (matrix
+multiplies per batch) and with a per-(tender, search) loop, checks that both find the same
+matches and reports tender x search pairs per second.
+
+Usage:
+    python -m benchmarks.saved_search_matcher --searches 10000 --tenders 1000
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from app.utils.elastic_handler import ElasticHandler
+from app.utils.local_index import to_epoch_seconds
+from app.utils.saved_search_matcher import SavedSearchMatcher
+from app.utils.vector_codec import encode_vector
+from benchmarks.knn_search import DIMS, random_unit_vectors
+
+COUNTRIES = ["US", "GB", "DE", "FR", "CA"]
+
+
+class StubSavedSearchStore:
+    def __init__(self, rows):
+        self.rows = rows
+        self.stored = []
+    
+    def get_saved_search_vectors(self):
+        return self.rows
+    
+    def store_saved_search_matches(self, matches):
+        self.stored.extend(matches)
+        return len(matches)
+
+
+def generate_saved_searches(rng, centers, count, noise):
+    """Saved search rows as returned by DatabaseOperation.get_saved_search_vectors"""
+    vectors = random_unit_vectors(rng, centers, count, noise)
+    rows = []
+    for i, vector in enumerate(vectors):
+        country = COUNTRIES[i % len(COUNTRIES)] if i % 3 == 0 else None
+        date_from = "2024-01-01" if i % 4 == 0 else None
+        rows.append((f"search-{i}", encode_vector(vector), country, date_from, None, None))
+    return rows
+
+
+def generate_tenders(rng, centers, count, noise):
+    """New tenders with three category vectors, a country and a publication date"""
+    start = datetime(2023, 6, 1)
+    tenders = []
+    for i in range(count):
+        tender = {
+            "ID": f"tender-{i}",
+            "ePublisherCountryName": COUNTRIES[int(rng.integers(len(COUNTRIES)))],
+            "ePublicationDate": (start + timedelta(days=int(rng.integers(365)))).strftime("%Y-%m-%d")
+        }
+        for field, vector in zip(ElasticHandler.VECTOR_FIELDS, random_unit_vectors(rng, centers, 3, noise)):
+            tender[field] = vector.tolist()
+        tenders.append(tender)
+    return tenders
+
+
+def loop_match(rows, tenders, threshold):
+    """Reference matcher scoring one (tender, saved search) pair at a time"""
+    matches = set()
+    for tender in tenders:
+        published = to_epoch_seconds(tender["ePublicationDate"])
+        vectors = [np.asarray(tender[field], dtype=np.float32) for field in ElasticHandler.VECTOR_FIELDS]
+        for search_id, blob, country, date_from, _, _ in rows:
+            if country and tender["ePublisherCountryName"] != country:
+                continue
+            if date_from and published < to_epoch_seconds(date_from):
+                continue
+            query = np.frombuffer(blob, dtype="<f4", offset=1)
+            score = max(max(float(np.dot(vector, query)) for vector in vectors), 0)
+            if score >= threshold:
+                matches.add((search_id, tender["ID"]))
+    return matches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--searches", type=int, default=10000)
+    parser.add_argument("--tenders", type=int, default=1000)
+    parser.add_argument("--topics", type=int, default=200, help="Number of topic clusters")
+    parser.add_argument("--noise", type=float, default=0.02, help="Per-dimension noise around topic centers")
+    parser.add_argument("--threshold", type=float, default=0.5)
+    parser.add_argument("--loop-tenders", type=int, default=20, help="Tenders checked with the per-pair loop")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    
+    rng = np.random.default_rng(args.seed)
+    centers = rng.normal(size=(args.topics, DIMS)).astype(np.float32)
+    centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+    rows = generate_saved_searches(rng, centers, args.searches, args.noise)
+    tenders = generate_tenders(rng, centers, args.tenders, args.noise)
+    
+    store = StubSavedSearchStore(rows)
+    matcher = SavedSearchMatcher(store, threshold=args.threshold)
+    matcher.reload()
+    
+    start = time.perf_counter()
+    matcher.on_tenders_indexed(tenders)
+    elapsed = time.perf_counter() - start
+    print(f"vectorized  {elapsed * 1000:9.1f}ms  {args.searches * args.tenders / elapsed:14,.0f} pairs/sec  {len(store.stored)} matches")
+    
+    sample = tenders[:args.loop_tenders]
+    start = time.perf_counter()
+    expected = loop_match(rows, sample, args.threshold)
+    elapsed = time.perf_counter() - start
+    print(f"loop        {elapsed * 1000:9.1f}ms  {args.searches * len(sample) / elapsed:14,.0f} pairs/sec  ({len(sample)} tenders)")
+    
+    sample_ids = {tender["ID"] for tender in sample}
+    found = {(search_id, tender_id) for search_id, tender_id, _ in store.stored if tender_id in sample_ids}
+    assert found == expected, f"{len(found ^ expected)} matches differ"
+    print(f"Both matchers found the same {len(expected)} matches on the sampled tenders")
+
+
+if __name__ == "__main__":
+    main()
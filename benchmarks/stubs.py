@@ -0,0 +1,261 @@
+"""Local stand-ins for OpenAI, Elasticsearch and MySQL with configurable latency.
+
+The stubs only implement the calls the application makes and return deterministic data,
+so benchmark runs are reproducible and need no credentials or servers. FakeOpenAIServer
+serves the same data over HTTP, so that the real OpenAI client can be pointed at it with
+OPENAI_BASE_URL.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+import numpy as np
+
+DIMS = 1536
+
+
+def deterministic_vector(text, dims=DIMS):
+    """Unit vector derived from a hash of the text"""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).normal(size=dims).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def chat_completion(messages):
+    """Deterministic chat completion echoing a digest of the prompt"""
+    digest = hashlib.sha256(messages[-1]["content"].encode("utf-8")).hexdigest()[:16]
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f"Categories for {digest}"))])
+
+
+def embeddings_response(texts):
+    """Embeddings response with one deterministic vector per input"""
+    return SimpleNamespace(data=[
+        SimpleNamespace(index=i, embedding=deterministic_vector(text)) for i, text in enumerate(texts)
+    ])
+
+
+def search_hits(count):
+    """Fake hits with just enough fields for result formatting"""
+    return [
+        {"_id": f"tender-{i}", "_score": 1.0 - i / 1000, "_source": {"ID": f"tender-{i}", "eTitle": f"Tender {i}"}}
+        for i in range(count)
+    ]
+
+
+def search_response(body, hits_per_search=10):
+    """Response matching either a search body or a list of multi-search lines"""
+    if isinstance(body, list):
+        return {"responses": [
+            {"hits": {"hits": search_hits(min(search.get("size", 10), hits_per_search)), "total": {"value": hits_per_search}}}
+            for search in body[1::2]
+        ]}
+    return {"hits": {"hits": search_hits(min(body.get("size", 10), hits_per_search)), "total": {"value": hits_per_search}}}
+
+
+class StubOpenAI:
+    def __init__(self, chat_latency=0.3, embedding_latency=0.1):
+        self.chat_latency = chat_latency
+        self.embedding_latency = embedding_latency
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create_chat_completion))
+        self.embeddings = SimpleNamespace(create=self.create_embeddings)
+    
+    def create_chat_completion(self, model, messages, **kwargs):
+        time.sleep(self.chat_latency)
+        return chat_completion(messages)
+    
+    def create_embeddings(self, input, model, **kwargs):
+        time.sleep(self.embedding_latency)
+        return embeddings_response(input)
+
+
+class StubAsyncOpenAI(StubOpenAI):
+    async def create_chat_completion(self, model, messages, **kwargs):
+        await asyncio.sleep(self.chat_latency)
+        return chat_completion(messages)
+    
+    async def create_embeddings(self, input, model, **kwargs):
+        await asyncio.sleep(self.embedding_latency)
+        return embeddings_response(input)
+    
+    async def close(self):
+        pass
+
+
+class StubElasticsearch:
+    def __init__(self, latency=0.05, hits_per_search=10):
+        self.latency = latency
+        self.hits_per_search = hits_per_search
+        # Index without a vector profile: queries are sent unprojected
+        self.indices = SimpleNamespace(get_mapping=lambda index: {})
+    
+    def search(self, index=None, body=None, **kwargs):
+        time.sleep(self.latency)
+        return search_response(body, self.hits_per_search)
+    
+    def msearch(self, index=None, body=None, **kwargs):
+        time.sleep(self.latency)
+        return search_response(body, self.hits_per_search)
+
+
+class StubAsyncElasticsearch(StubElasticsearch):
+    async def search(self, index=None, body=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        return search_response(body, self.hits_per_search)
+    
+    async def msearch(self, index=None, body=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        return search_response(body, self.hits_per_search)
+    
+    async def close(self):
+        pass
+
+
+class StubFeedbackStore:
+    def __init__(self, latency=0.02, feedback_items=20):
+        self.latency = latency
+        self.positive = [deterministic_vector(f"positive {i}") for i in range(feedback_items)]
+        self.negative = [deterministic_vector(f"negative {i}") for i in range(feedback_items // 2)]
+    
+    def get_feedback(self, key):
+        time.sleep(self.latency)
+        return self.positive, self.negative
+    
+    async def get_feedback_async(self, key):
+        await asyncio.sleep(self.latency)
+        return self.positive, self.negative
+
+
+class FakeOpenAIServer:
+    """OpenAI-compatible HTTP server for the chat completions and embeddings endpoints"""
+    
+    def __init__(self, chat_latency=0.3, embedding_latency=0.1, host="127.0.0.1", port=0):
+        self.chat_latency = chat_latency
+        self.embedding_latency = embedding_latency
+        self.requests = {"chat": 0, "embeddings": 0, "embedded_inputs": 0}
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self.handler_class())
+        self.server.daemon_threads = True
+        self.thread = None
+    
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+    
+    def handler_class(self):
+        fake = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if self.path.endswith("/embeddings"):
+                    payload = fake.embeddings(body)
+                elif self.path.endswith("/chat/completions"):
+                    payload = fake.chat_completion(body)
+                else:
+                    self.send_error(404)
+                    return
+                
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            
+            def log_message(self, format, *args):
+                pass
+        
+        return Handler
+    
+    def chat_completion(self, body):
+        time.sleep(self.chat_latency)
+        with self.lock:
+            self.requests["chat"] += 1
+        content = chat_completion(body["messages"]).choices[0].message.content
+        return {
+            "id": "chatcmpl-benchmark",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", ""),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        }
+    
+    def embeddings(self, body):
+        time.sleep(self.embedding_latency)
+        texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        with self.lock:
+            self.requests["embeddings"] += 1
+            self.requests["embedded_inputs"] += len(texts)
+        
+        data = []
+        for i, text in enumerate(texts):
+            vector = deterministic_vector(text)
+            if body.get("encoding_format") == "base64":
+                vector = base64.b64encode(np.asarray(vector, dtype="<f4").tobytes()).decode("ascii")
+            data.append({"object": "embedding", "index": i, "embedding": vector})
+        return {"object": "list", "data": data, "model": body.get("model", ""), "usage": {"prompt_tokens": 0, "total_tokens": 0}}
+    
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+    
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class InMemoryFeedbackStore:
+    """Feedback writes and reads of DatabaseOperation kept in memory, with running centroids"""
+    
+    def __init__(self, tender_vectors, latency=0.0):
+        self.tender_vectors = tender_vectors
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.query_clients = {}
+        self.feedback = {}
+        self.sums = {}
+    
+    def install(self, db_operation):
+        """Replace the feedback methods of a DatabaseOperation"""
+        db_operation.store_feedback = self.store_feedback
+        db_operation.get_feedback_centroids_by_query_id = lambda query_id: self.get_centroids("query", query_id)
+        db_operation.get_feedback_centroids_by_client_id = lambda client_id: self.get_centroids("client", client_id)
+    
+    def store_feedback(self, query_id, search_query, feedback_list, client_id=None):
+        time.sleep(self.latency)
+        with self.lock:
+            client_id = self.query_clients.setdefault(query_id, client_id) or client_id
+            for feedback in feedback_list:
+                vector = self.tender_vectors.get(feedback["ID"])
+                previous_value = self.feedback.get((query_id, feedback["ID"]))
+                self.feedback[(query_id, feedback["ID"])] = feedback["feedback"]
+                if vector is None or previous_value == feedback["feedback"]:
+                    continue
+                for scope_id in [("query", query_id)] + ([("client", client_id)] if client_id else []):
+                    for value, sign in ((previous_value, -1), (feedback["feedback"], 1)):
+                        if value is None:
+                            continue
+                        vector_sum, count = self.sums.get(scope_id + (value,), (np.zeros(DIMS), 0))
+                        self.sums[scope_id + (value,)] = (vector_sum + sign * np.asarray(vector), count + sign)
+        return True
+    
+    def get_centroids(self, scope, scope_id):
+        time.sleep(self.latency)
+        centroids = []
+        with self.lock:
+            for value in ("positive", "negative"):
+                vector_sum, count = self.sums.get((scope, scope_id, value), (None, 0))
+                if count > 0:
+                    centroids.append((vector_sum / count).astype(np.float32)[np.newaxis, :])
+                else:
+                    centroids.append(np.empty((0, DIMS), dtype=np.float32))
+        return tuple(centroids)
@@ -0,0 +1,110 @@
+"""Ranking quality and latency of the category vector layouts on feedback-derived judgments.
+
+Copies the live tenders index (separate full-dimension category vectors) into one benchmark
+index per layout, then runs the held-out judged queries from the feedback table through each
+of them. Query embeddings are computed once (categorization, then embedding) and reused, so
+the search latency differences come from the layout alone; the embedding time is reported
+separately to give the end-to-end figure.
+
+Usage:
+    python -m benchmarks.vector_layouts --layouts separate nested pooled --holdout 0.2
+    python -m benchmarks.vector_layouts --skip-copy --search-mode exact
+"""
+import argparse
+import time
+import numpy as np
+from dotenv import load_dotenv
+from app.utils.database_operation import DatabaseOperation
+from app.utils.elastic_handler import ElasticHandler
+from app.utils.openai_embedding import OpenAIEmbedding
+from app.utils.prompt import Prompt
+from app.utils.query_categorizer import QueryCategorizer
+from app.utils.vector_projection import VectorProjection
+from benchmarks.judgments import load_judgments, ndcg_at_k, negatives_at_k, recall_at_k, reciprocal_rank
+
+# Load environment variables
+load_dotenv()
+
+
+def embed_queries(judgments):
+    """Categorize and embed every judged query, returning embeddings and per-query latency"""
+    openai_embedding = OpenAIEmbedding()
+    query_categorizer = QueryCategorizer(openai_embedding, Prompt())
+    embeddings = []
+    latencies = []
+    for judgment in judgments:
+        start = time.perf_counter()
+        embeddings.append(openai_embedding.generate_embedding(query_categorizer.categorize(judgment["query"])))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return embeddings, np.array(latencies)
+
+
+def layout_handler(source, prefix, layout, skip_copy):
+    """Handler of the benchmark index for a layout, copying the live index into it if needed"""
+    elastic_handler = ElasticHandler()
+    elastic_handler.index_name = f"{prefix}_{layout}"
+    
+    if not skip_copy:
+        if elastic_handler.es.indices.exists(index=elastic_handler.index_name):
+            elastic_handler.es.indices.delete(index=elastic_handler.index_name)
+        stats = source.copy_to_index(elastic_handler.index_name, "hnsw", VectorProjection(), layout)
+        print(f"Copied {stats['indexed']} tenders into {elastic_handler.index_name}")
+        elastic_handler.es.indices.forcemerge(index=elastic_handler.index_name, max_num_segments=1)
+    
+    return elastic_handler
+
+
+def evaluate(elastic_handler, judgments, embeddings, search_mode, k):
+    """Run the judged queries and return metrics and search latencies"""
+    metrics = {"ndcg": [], "recall": [], "mrr": [], "negatives": []}
+    latencies = []
+    for judgment, embedding in zip(judgments, embeddings):
+        start = time.perf_counter()
+        response = elastic_handler.search_tenders(embedding, ["ID"], page_size=k, search_mode=search_mode)
+        latencies.append((time.perf_counter() - start) * 1000)
+        
+        ranked_ids = [tender["ID"] for tender in response["tenders"]]
+        metrics["ndcg"].append(ndcg_at_k(ranked_ids, judgment["relevant"], k))
+        metrics["recall"].append(recall_at_k(ranked_ids, judgment["relevant"], k))
+        metrics["mrr"].append(reciprocal_rank(ranked_ids, judgment["relevant"]))
+        metrics["negatives"].append(negatives_at_k(ranked_ids, judgment["non_relevant"], k))
+    return {name: float(np.mean(values)) for name, values in metrics.items()}, np.array(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index", default="tenders_layout_benchmark", help="Prefix of the benchmark indices")
+    parser.add_argument("--layouts", nargs="+", choices=ElasticHandler.VECTOR_LAYOUTS, default=ElasticHandler.VECTOR_LAYOUTS)
+    parser.add_argument("--search-mode", choices=["knn", "exact"], default="knn")
+    parser.add_argument("--holdout", type=float, default=1.0, help="Fraction of judged queries evaluated (stable split on query_id)")
+    parser.add_argument("--limit", type=int, help="Maximum feedback rows read")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--skip-copy", action="store_true", help="Reuse the benchmark indices from a previous run")
+    args = parser.parse_args()
+    
+    judgments = load_judgments(DatabaseOperation(), args.holdout, args.limit)
+    if not judgments:
+        print("No search queries with positive feedback to evaluate.")
+        return
+    print(f"{len(judgments)} judged queries")
+    
+    embeddings, embedding_latencies = embed_queries(judgments)
+    print(f"{'categorize + embed':<12} p50={np.percentile(embedding_latencies, 50):8.1f}ms  p95={np.percentile(embedding_latencies, 95):8.1f}ms")
+    
+    source = ElasticHandler()
+    for layout in args.layouts:
+        elastic_handler = layout_handler(source, args.index, layout, args.skip_copy)
+        
+        # Warm up before timing
+        for embedding in embeddings[:5]:
+            elastic_handler.search_tenders(embedding, ["ID"], page_size=args.k, search_mode=args.search_mode)
+        
+        metrics, latencies = evaluate(elastic_handler, judgments, embeddings, args.search_mode, args.k)
+        print(f"{layout:<12} p50={np.percentile(latencies, 50):8.1f}ms  p95={np.percentile(latencies, 95):8.1f}ms  "
+              f"end-to-end p50={np.percentile(latencies + embedding_latencies, 50):8.1f}ms  "
+              f"nDCG@{args.k}={metrics['ndcg']:.3f}  recall@{args.k}={metrics['recall']:.3f}  MRR={metrics['mrr']:.3f}  "
+              f"negatives@{args.k}={metrics['negatives']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
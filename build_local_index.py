@@ -0,0 +1,28 @@
+import argparse
+import sys
+from dotenv import load_dotenv
+from app.utils.elastic_handler import ElasticHandler
+
+# Load environment variables
+load_dotenv()
+
+def build_local_index():
+    """Snapshot the Elasticsearch tenders index into the local vector index and publish it"""
+    parser = argparse.ArgumentParser(description="Build the in-process vector index (LOCAL_INDEX_PATH) from Elasticsearch")
+    parser.add_argument("--nlist", type=int, help="Number of IVF lists (default: square root of the number of vectors)")
+    args = parser.parse_args()
+    
+    try:
+        elastic_handler = ElasticHandler()
+        local_index = elastic_handler.build_local_index(args.nlist)
+        
+        print(f"Published local index {local_index.path}: {local_index.meta['tenders']} tenders, "
+              f"{local_index.meta['vectors']} vectors in {local_index.meta['nlist']} lists. "
+              f"Running workers switch to it within LOCAL_INDEX_RELOAD_INTERVAL seconds.")
+            
+    except Exception as e:
+        print(f"Error building local index: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    build_local_index()
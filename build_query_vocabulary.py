@@ -0,0 +1,27 @@
+import os
+import sys
+from dotenv import load_dotenv
+from app.utils.elastic_handler import ElasticHandler
+from app.utils.query_rewriter import QueryRewriter
+
+# Load environment variables
+load_dotenv()
+
+def build_query_vocabulary():
+    """Collect the category names of the indexed tenders for the local query rewriter"""
+    try:
+        # Scan the category names from Elasticsearch
+        elastic_handler = ElasticHandler()
+        path = sys.argv[1] if len(sys.argv) > 1 else os.getenv('QUERY_VOCABULARY_PATH', '.cache/category_vocabulary.json')
+        
+        # Count and save them where the app loads them from (QUERY_VOCABULARY_PATH)
+        count = QueryRewriter.save_vocabulary(path, elastic_handler.scan_category_names())
+        
+        print(f"Saved {count} category names to {path}. Restart the app to use them.")
+    
+    except Exception as e:
+        print(f"Error building query vocabulary: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    build_query_vocabulary()
@@ -0,0 +1,48 @@
+import sys
+from dotenv import load_dotenv
+from app.utils.database_operation import DatabaseOperation
+
+# Load environment variables
+load_dotenv()
+
+def rebuild_feedback_aggregates():
+    """Backfill the per-query and per-client feedback aggregates from the feedback table"""
+    try:
+        db_op = DatabaseOperation()
+        rebuilt = db_op.rebuild_feedback_aggregates()
+        print(f"Rebuilt {rebuilt} feedback aggregates.")
+            
+    except Exception as e:
+        print(f"Error rebuilding feedback aggregates: {e}")
+
+def check_feedback_aggregates():
+    """Compare the stored feedback aggregates with the feedback table"""
+    try:
+        db_op = DatabaseOperation()
+        report = db_op.check_feedback_aggregates()
+        
+        print(f"Checked {report['checked']} aggregates: {len(report['missing'])} missing, "
+              f"{len(report['count_mismatch'])} with wrong counts, {len(report['sum_mismatch'])} with wrong sums, "
+              f"{report['unexpected']} unexpected.")
+        for label in ["missing", "count_mismatch", "sum_mismatch"]:
+            for key in report[label][:10]:
+                print(f"  {label}: {key}")
+        
+        if not report["consistent"]:
+            print("Feedback aggregates are inconsistent, run `python feedback_aggregates.py rebuild`.")
+            sys.exit(1)
+        print("Feedback aggregates are consistent.")
+            
+    except Exception as e:
+        print(f"Error checking feedback aggregates: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2 or sys.argv[1] not in ("rebuild", "check"):
+        print("Usage: python feedback_aggregates.py rebuild|check")
+        sys.exit(2)
+    
+    if sys.argv[1] == "rebuild":
+        rebuild_feedback_aggregates()
+    else:
+        check_feedback_aggregates()
@@ -1,11 +1,17 @@
 import os
+import sys
 import json
+import time
 import uuid
+import hashlib
+import numpy as np
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
+from app.utils.database_operation import DatabaseOperation
 from app.utils.elastic_handler import ElasticHandler
 from app.utils.openai_embedding import OpenAIEmbedding
 from app.utils.prompt import Prompt
+from app.utils.saved_search_matcher import SavedSearchMatcher
 
 # Load environment variables
 load_dotenv()
@@ -73,40 +79,237 @@ def generate_sample_tenders():
     
     return sample_tenders
 
-def generate_embeddings_for_tenders(tenders):
+def tender_embedding_prompts(tender, prompt_generator):
+    """One embedding prompt per category of the tender, as (vector field, prompt) pairs"""
+    prompts = []
+    for category_field in ["eMainCategoryName1", "eMainCategoryName2", "eMainCategoryName3"]:
+        if tender.get(category_field):
+            prompts.append((f"{category_field}_vector", prompt_generator.generate_tender_embedding_prompt({
+                "eTitle": tender["eTitle"],
+                "eDescription": tender["eDescription"],
+                category_field: tender[category_field]
+            })))
+    return prompts
+
+def fingerprint(parts):
+    """Short hash of a sequence of strings"""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+def embedding_fingerprint(prompts, embedding_model):
+    """Hash of everything the category vectors depend on: the model and the prompts (title, description, categories)"""
+    return fingerprint([embedding_model] + [prompt for _, prompt in prompts])
+
+def document_fingerprint(tender):
+    """Hash of the tender fields other than vectors and fingerprints"""
+    fields = {
+        field: value for field, value in tender.items()
+        if field not in ElasticHandler.VECTOR_FIELDS and field not in ElasticHandler.FINGERPRINT_MAPPINGS
+    }
+    return fingerprint([json.dumps(fields, sort_keys=True, default=str)])
+
+def generate_embeddings_for_tenders(tenders, openai_embedding=None):
     """Generate embeddings for the tender categories"""
     
-    openai_embedding = OpenAIEmbedding()
+    openai_embedding = openai_embedding or OpenAIEmbedding()
     prompt_generator = Prompt()
     
+    # Create one prompt per tender category
+    targets = []
+    prompts = []
     for tender in tenders:
-        # Create category prompts
-        if tender.get("eMainCategoryName1"):
-            category1_prompt = prompt_generator.generate_tender_embedding_prompt({
-                "eTitle": tender["eTitle"],
-                "eDescription": tender["eDescription"],
-                "eMainCategoryName1": tender["eMainCategoryName1"]
-            })
-            tender["eMainCategoryName1_vector"] = openai_embedding.generate_embedding(category1_prompt)
+        tender_prompts = tender_embedding_prompts(tender, prompt_generator)
+        for vector_field, prompt in tender_prompts:
+            prompts.append(prompt)
+            targets.append((tender, vector_field))
         
-        if tender.get("eMainCategoryName2"):
-            category2_prompt = prompt_generator.generate_tender_embedding_prompt({
-                "eTitle": tender["eTitle"],
-                "eDescription": tender["eDescription"],
-                "eMainCategoryName2": tender["eMainCategoryName2"]
-            })
-            tender["eMainCategoryName2_vector"] = openai_embedding.generate_embedding(category2_prompt)
+        # Stored with the document so that incremental syncs can skip unchanged tenders
+        tender["document_fingerprint"] = document_fingerprint(tender)
+        tender["embedding_fingerprint"] = embedding_fingerprint(tender_prompts, openai_embedding.embedding_model)
+    
+    # Embed all prompts in batched requests
+    embeddings = openai_embedding.generate_embeddings(prompts)
+    for (tender, vector_field), embedding in zip(targets, embeddings):
+        tender[vector_field] = embedding
         
-        if tender.get("eMainCategoryName3"):
-            category3_prompt = prompt_generator.generate_tender_embedding_prompt({
-                "eTitle": tender["eTitle"],
-                "eDescription": tender["eDescription"],
-                "eMainCategoryName3": tender["eMainCategoryName3"]
-            })
-            tender["eMainCategoryName3_vector"] = openai_embedding.generate_embedding(category3_prompt)
+        # A zero vector comes from a rejected input, so the next sync embeds the tender again
+        if not any(embedding):
+            tender.pop("embedding_fingerprint", None)
     
     return tenders
 
+def read_tender_feed(path):
+    """Lazily read tenders from a JSON lines feed file"""
+    with open(path, encoding="utf-8") as feed:
+        for line in feed:
+            if line.strip():
+                yield json.loads(line)
+
+def stream_tenders_with_embeddings(tenders, batch_size=500, openai_embedding=None):
+    """Embed tenders batch by batch so that only one batch is held in memory"""
+    openai_embedding = openai_embedding or OpenAIEmbedding()
+    
+    batch = []
+    for tender in tenders:
+        batch.append(tender)
+        if len(batch) >= batch_size:
+            yield from generate_embeddings_for_tenders(batch, openai_embedding)
+            batch = []
+    
+    if batch:
+        yield from generate_embeddings_for_tenders(batch, openai_embedding)
+
+def attach_saved_search_matcher(elastic_handler):
+    """Queue saved-search alerts for the tenders being indexed (disable with SAVED_SEARCH_MATCHING=false)"""
+    if os.getenv('SAVED_SEARCH_MATCHING', 'true').lower() == 'false':
+        return None
+    
+    matcher = SavedSearchMatcher(DatabaseOperation())
+    matcher.attach(elastic_handler)
+    return matcher
+
+def tender_vector(tender):
+    """Single vector of a tender for the feedback tables: the mean of its non-zero category vectors"""
+    vectors = [tender[field] for field in ElasticHandler.VECTOR_FIELDS if tender.get(field) is not None and any(tender[field])]
+    if not vectors:
+        return None
+    return np.mean(np.asarray(vectors, dtype=np.float32), axis=0)
+
+def attach_tender_store(elastic_handler, db_operation=None):
+    """Write every indexed tender and its vector to the MySQL tenders table (disable with MYSQL_STORE_TENDERS=false)
+    
+    Feedback on search results joins the tenders table for tender_vector, so tenders must be
+    stored there as they are indexed.
+    """
+    if os.getenv('MYSQL_STORE_TENDERS', 'true').lower() == 'false':
+        return None
+    
+    db_operation = db_operation or DatabaseOperation()
+    
+    def store(tenders):
+        rows = []
+        for tender in tenders:
+            vector = tender_vector(tender)
+            if vector is not None:
+                rows.append((str(tender["ID"]), tender.get("eTitle"), tender.get("eDescription"), vector))
+        db_operation.store_tenders(rows)
+    
+    elastic_handler.add_ingest_listener(store)
+    return db_operation
+
+def index_tender_feed(path):
+    """Stream a (possibly multi-GB) JSON lines tender feed into Elasticsearch"""
+    try:
+        elastic_handler = ElasticHandler()
+        attach_tender_store(elastic_handler)
+        matcher = attach_saved_search_matcher(elastic_handler)
+        
+        # Embed and index the feed with constant memory
+        stats = elastic_handler.stream_index_tenders(stream_tenders_with_embeddings(read_tender_feed(path)))
+        
+        print(f"Indexed {stats['indexed']} tenders ({stats['failed']} failed, {stats['retried']} retried) "
+              f"in {stats['seconds']:.1f}s, {stats['docs_per_second']:.0f} docs/sec.")
+        if matcher is not None:
+            matcher_stats = matcher.stats()
+            print(f"Queued {matcher_stats['matches']} saved-search matches against {matcher_stats['saved_searches']} saved searches "
+                  f"in {matcher_stats['match_seconds']:.2f}s.")
+        for error in stats["errors"]:
+            print(f"  {error}")
+            
+    except Exception as e:
+        print(f"Error indexing tender feed: {e}")
+
+def sync_tender_feed(path, delete_missing=True):
+    """Bring the index in line with a complete JSON lines tender feed, embedding and indexing only what changed
+    
+    Tenders whose embedding fingerprint changed (or that are new) are embedded and indexed,
+    tenders with only other fields changed are updated in place without embedding, and
+    indexed tenders missing from the feed are deleted (unless delete_missing is False), from
+    Elasticsearch and from the MySQL tenders table.
+    """
+    try:
+        start = time.perf_counter()
+        elastic_handler = ElasticHandler()
+        tender_store = attach_tender_store(elastic_handler)
+        matcher = attach_saved_search_matcher(elastic_handler)
+        elastic_handler.create_index()
+        elastic_handler.ensure_fingerprint_mapping()
+        openai_embedding = OpenAIEmbedding()
+        prompt_generator = Prompt()
+        
+        # Fingerprints of the indexed tenders; the IDs left at the end are no longer in the feed
+        indexed = {
+            str(tender_id): (embedding_fp, document_fp)
+            for tender_id, embedding_fp, document_fp in elastic_handler.scan_fingerprints()
+        }
+        
+        counts = {"feed": 0, "unchanged": 0, "embedded": 0, "updated": 0, "update_failed": 0}
+        updates = []
+        
+        def flush_updates():
+            stats = elastic_handler.bulk_update_tenders(updates)
+            counts["updated"] += stats["updated"]
+            counts["update_failed"] += stats["failed"]
+            for error in stats["errors"]:
+                print(f"  {error}")
+            updates.clear()
+        
+        def changed_tenders():
+            for tender in read_tender_feed(path):
+                counts["feed"] += 1
+                previous = indexed.pop(str(tender["ID"]), None)
+                embedding_fp = embedding_fingerprint(tender_embedding_prompts(tender, prompt_generator), openai_embedding.embedding_model)
+                document_fp = document_fingerprint(tender)
+                
+                if previous is None or previous[0] != embedding_fp:
+                    counts["embedded"] += 1
+                    yield tender
+                elif previous[1] != document_fp:
+                    # Same vectors: send the other fields as a partial update
+                    updates.append(dict(tender, document_fingerprint=document_fp))
+                    if len(updates) >= elastic_handler.bulk_chunk_size:
+                        flush_updates()
+                else:
+                    counts["unchanged"] += 1
+        
+        stats = elastic_handler.stream_index_tenders(stream_tenders_with_embeddings(changed_tenders(), openai_embedding=openai_embedding))
+        flush_updates()
+        
+        # An empty feed is more likely a broken export than an empty market
+        deleted = 0
+        if delete_missing and indexed and counts["feed"]:
+            delete_stats = elastic_handler.bulk_delete_tenders(list(indexed))
+            deleted = delete_stats["deleted"]
+            for error in delete_stats["errors"]:
+                print(f"  {error}")
+            
+            # Keep MySQL in line: the rows go, and so does their share of the feedback aggregates
+            if tender_store is not None:
+                missing_ids = list(indexed)
+                try:
+                    for position in range(0, len(missing_ids), elastic_handler.bulk_chunk_size):
+                        tender_store.delete_tenders(missing_ids[position:position + elastic_handler.bulk_chunk_size])
+                except Exception as e:
+                    print(f"Error deleting tenders from MySQL: {e}")
+        
+        # Index, update and delete changes of this run share one published index version
+        elastic_handler.flush_index_version()
+        
+        print(f"Synced {counts['feed']} tenders in {time.perf_counter() - start:.1f}s: {counts['unchanged']} unchanged, "
+              f"{stats['indexed']} of {counts['embedded']} new or changed embedded and indexed ({stats['failed']} failed), "
+              f"{counts['updated']} updated without embedding ({counts['update_failed']} failed), {deleted} deleted.")
+        if matcher is not None:
+            matcher_stats = matcher.stats()
+            print(f"Queued {matcher_stats['matches']} saved-search matches against {matcher_stats['saved_searches']} saved searches.")
+        for error in stats["errors"]:
+            print(f"  {error}")
+            
+    except Exception as e:
+        print(f"Error syncing tender feed: {e}")
+
 def index_tenders():
     """Index sample tender data in Elasticsearch"""
     try:
@@ -118,6 +321,8 @@ def index_tenders():
         
         # Create ElasticHandler instance
         elastic_handler = ElasticHandler()
+        attach_tender_store(elastic_handler)
+        attach_saved_search_matcher(elastic_handler)
         
         # Create the index if it doesn't exist
         elastic_handler.create_index()
@@ -134,4 +339,9 @@ def index_tenders():
         print(f"Error indexing sample tenders: {e}")
 
 if __name__ == "__main__":
-    index_tenders() 
\ No newline at end of file
+    if len(sys.argv) > 2 and sys.argv[1] == "--sync":
+        sync_tender_feed(sys.argv[2], delete_missing="--keep-missing" not in sys.argv[3:])
+    elif len(sys.argv) > 1:
+        index_tender_feed(sys.argv[1])
+    else:
+        index_tenders() 
\ No newline at end of file
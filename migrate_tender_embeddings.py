@@ -0,0 +1,29 @@
+import argparse
+from dotenv import load_dotenv
+from app.utils.database_operation import DatabaseOperation
+
+# Load environment variables
+load_dotenv()
+
+def migrate_tender_embeddings():
+    """Convert JSON tender embeddings into packed binary vectors"""
+    parser = argparse.ArgumentParser(description="Migrate tenders.tender_embedding (JSON) to tenders.tender_vector (BLOB)")
+    parser.add_argument("--dtype", choices=["float32", "float16", "int8"], help="Storage type (default: MYSQL_EMBEDDING_DTYPE or float32)")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Rows converted per transaction")
+    parser.add_argument("--drop-json", action="store_true", help="Drop the JSON column once all rows are converted")
+    args = parser.parse_args()
+    
+    try:
+        # Create an instance of DatabaseOperation
+        db_op = DatabaseOperation()
+        
+        # Convert the existing rows
+        converted = db_op.migrate_tender_embeddings(args.dtype, args.batch_size, args.drop_json)
+        
+        print(f"Migration finished, {converted} tender embeddings converted.")
+            
+    except Exception as e:
+        print(f"Error migrating tender embeddings: {e}")
+
+if __name__ == "__main__":
+    migrate_tender_embeddings()
@@ -0,0 +1,56 @@
+import argparse
+import sys
+import time
+from dotenv import load_dotenv
+from app.utils.elastic_handler import ElasticHandler
+from app.utils.vector_projection import VectorProjection
+
+# Load environment variables
+load_dotenv()
+
+def reindex_tenders():
+    """Migrate the tenders index to another vector profile (quantization, fewer dimensions or another layout)"""
+    parser = argparse.ArgumentParser(description="Reindex tenders into a new index with another vector profile and swap the alias")
+    parser.add_argument("--index-type", choices=["hnsw", "int8_hnsw", "int4_hnsw"], default="int8_hnsw", help="HNSW vector storage of the new index")
+    parser.add_argument("--projection", choices=["none", "truncate", "pca"], default="none", help="Dimensionality reduction of the category vectors")
+    parser.add_argument("--dims", type=int, default=1536, help="Dimensions kept by the projection")
+    parser.add_argument("--projection-path", help="Where to save the fitted PCA components (default: ELASTICSEARCH_VECTOR_PROJECTION_PATH)")
+    parser.add_argument("--pca-sample", type=int, default=20000, help="Category vectors used to fit the PCA projection")
+    parser.add_argument("--layout", choices=["separate", "nested", "pooled"], default="separate", help="Document layout of the category vectors")
+    parser.add_argument("--target", help="Name of the new index (default: <index>_<timestamp>)")
+    parser.add_argument("--delete-source", action="store_true", help="Delete the old index once the alias points at the new one")
+    args = parser.parse_args()
+    
+    try:
+        elastic_handler = ElasticHandler()
+        target = args.target or f"{elastic_handler.index_name}_{time.strftime('%Y%m%d%H%M%S')}"
+        
+        # Build the projection, fitting PCA on vectors from the current index
+        if args.projection == "pca":
+            sample = elastic_handler.sample_vectors(args.pca_sample)
+            print(f"Fitting a {args.dims}-dimension PCA projection on {len(sample)} vectors...")
+            projection = VectorProjection.fit_pca(sample, args.dims, args.projection_path or elastic_handler.vector_projection_path)
+            projection.save()
+        else:
+            projection = VectorProjection(args.projection, args.dims if args.projection == "truncate" else 1536)
+        
+        stats = elastic_handler.reindex_with_profile(target, args.index_type, projection, args.delete_source, args.layout)
+        
+        print(f"Reindexed {stats['indexed']} tenders into {target} ({args.index_type}, {args.layout}, {projection.method}, {projection.dims} dims) "
+              f"at {stats['docs_per_second']:.0f} docs/sec; {elastic_handler.index_name} now points at {target}.")
+        
+        # Rebuild the local index from the new one so that workers hot-swap to it
+        if elastic_handler.local_index_store is not None:
+            local_index = elastic_handler.build_local_index()
+            print(f"Published local index {local_index.path}.")
+        
+        print(f"Set ELASTICSEARCH_VECTOR_INDEX_TYPE={args.index_type}, ELASTICSEARCH_VECTOR_LAYOUT={args.layout}, "
+              f"ELASTICSEARCH_VECTOR_PROJECTION={projection.method} and ELASTICSEARCH_VECTOR_DIMS={projection.dims} "
+              f"so that new indices are created with the same profile.")
+    
+    except Exception as e:
+        print(f"Error reindexing tenders: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    reindex_tenders()
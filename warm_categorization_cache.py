@@ -0,0 +1,31 @@
+import os
+import sys
+from dotenv import load_dotenv
+from app.utils.database_operation import DatabaseOperation
+from app.utils.openai_embedding import OpenAIEmbedding
+from app.utils.prompt import Prompt
+from app.utils.query_categorizer import QueryCategorizer
+
+# Load environment variables
+load_dotenv()
+
+def warm_categorization_cache(limit=1000):
+    """Pre-warm the persistent categorization cache with the most frequent search queries"""
+    try:
+        if not os.getenv('CATEGORIZATION_CACHE_PATH'):
+            print("CATEGORIZATION_CACHE_PATH is not set; the warmed cache would not be shared with the app.")
+            return
+        
+        # Create the categorizer backed by the persistent cache
+        query_categorizer = QueryCategorizer(OpenAIEmbedding(), Prompt())
+        
+        # Categorize the most popular queries that are not cached yet
+        fetched = query_categorizer.warm_from_database(DatabaseOperation(), limit)
+        
+        print(f"Warmed categorization cache with {fetched} new queries.")
+            
+    except Exception as e:
+        print(f"Error warming categorization cache: {e}")
+
+if __name__ == "__main__":
+    warm_categorization_cache(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)